@@ -11,20 +11,28 @@ Startet:
 Run: python START_SYSTEM.py
 """
 
-import subprocess
 import time
 import sys
 from pathlib import Path
+from logistik_config import CONFIG
 from logistik_db import LogisticsDB
+from logistik_migrations import (migrate, schema_version, is_ready, start_background_indexes,
+                                 LATEST_VERSION)
+from logistik_supervisor import EngineSupervisor, ManagedProcess, Supervisor, http_probe
 
 # ============================================
 # CONFIG
 # ============================================
 
 PROJECT_ROOT = Path(__file__).parent
-DB_FILE = PROJECT_ROOT / "logistik.db"
+DB_FILE = Path(CONFIG['db_path'])  # LOGISTIK_DB_PATH / logistik.json
 API_FILE = PROJECT_ROOT / "logistik_api.py"
-WORKFLOW_FILE = PROJECT_ROOT / "workflow_engine.py"
+DISPATCH_FILE = PROJECT_ROOT / "logistik_dispatch.py"
+GATEWAY_FILE = PROJECT_ROOT / "logistik_gateway.py"
+INGEST_FILE = PROJECT_ROOT / "logistik_ingest.py"
+API_PORT = 5000
+READY_TIMEOUT = 15  # seconds to wait for a service's readiness probe
+REPORT_INTERVAL = 60  # seconds between process reports (CPU, memory, restarts)
 
 # ============================================
 # STARTUP SEQUENCE
@@ -34,8 +42,10 @@ class SystemOrchestrator:
     """Master controller for entire system"""
     
     def __init__(self):
-        self.processes = {}
+        self.services = Supervisor()  # API, gateway, dispatcher (logs in CONFIG['log_dir'])
         self.db = LogisticsDB()
+        self.last_report = time.time()
+        self.engines = EngineSupervisor(self.db, workers=CONFIG['engine_workers'] or None)
     
     def print_banner(self):
         """Print startup banner"""
@@ -48,19 +58,25 @@ class SystemOrchestrator:
         print("=" * 60 + "\n")
     
     def verify_database(self):
-        """Verify SQLite database exists and is ready"""
+        """Verify database schema is current (constant time, no table scans)"""
         print("1️⃣  Verifying Database...")
         
         if not DB_FILE.exists():
-            print("   ❌ Database not found!")
-            print("   Run: python init_logistik_db.py")
-            return False
+            print("   ⚠️  Database not found, creating new one")
         
         try:
-            summary = self.db.get_summary()
-            print(f"   ✅ Database OK")
-            print(f"      - Customers: {summary.get('pending_orders', 0)}")  # Just show pending
-            print(f"      - Active Drivers: {summary['active_drivers']}")
+            applied = migrate(self.db)
+            if applied:
+                print(f"   🔧 Applied migrations: {applied}")
+            
+            if not is_ready(self.db):
+                print(f"   ❌ Schema version {schema_version(self.db)}, expected {LATEST_VERSION}")
+                return False
+            
+            # Large-table indexes build while the system is already running
+            start_background_indexes(self.db)
+            
+            print(f"   ✅ Database OK (schema v{schema_version(self.db)})")
             return True
         except Exception as e:
             print(f"   ❌ Database error: {e}")
@@ -74,17 +90,12 @@ class SystemOrchestrator:
             # Check if Flask is installed
             import flask
             
-            proc = subprocess.Popen(
-                [sys.executable, str(API_FILE)],
-                cwd=str(PROJECT_ROOT),
-                stdout=subprocess.PIPE,
-                stderr=subprocess.PIPE
-            )
-            
-            self.processes['api'] = proc
-            time.sleep(2)  # Wait for startup
+            self.services.add(ManagedProcess(
+                'api', [sys.executable, str(API_FILE), '--port', str(API_PORT), '--no-reload', '--no-flusher'],
+                liveness=lambda: http_probe(API_PORT, '/healthz'),
+                readiness=lambda: http_probe(API_PORT, '/healthz')))  # /readyz also needs the engine
             
-            if proc.poll() is None:  # Process still running
+            if self.wait_ready('api'):
                 print("   ✅ REST API started")
                 print("      📍 http://localhost:5000")
                 print("      📊 Dashboard: GET /api/admin/dashboard")
@@ -101,23 +112,61 @@ class SystemOrchestrator:
             print(f"   ❌ Error: {e}")
             return False
     
+    def start_ingest_flusher(self):
+        """Start ingest flusher (queued orders/webhooks -> main DB, API runs with --no-flusher)"""
+        print("\n📥 Starting Ingest Flusher...")
+        
+        try:
+            self.services.add(ManagedProcess('ingest', [sys.executable, str(INGEST_FILE)]))
+            
+            if self.wait_ready('ingest'):
+                print("   ✅ Ingest flusher started")
+                print("      📦 Orders/webhooks from the API are written in batches")
+            else:
+                print("   ❌ Ingest flusher failed")
+                return False
+            
+            return True
+        except Exception as e:
+            print(f"   ❌ Error: {e}")
+            return False
+    
+    def start_driver_gateway(self):
+        """Start asyncio gateway for the driver app endpoints"""
+        port = CONFIG['gateway_port']
+        print(f"\n📱 Starting Driver Gateway (Port {port})...")
+        
+        try:
+            self.services.add(ManagedProcess(
+                'gateway', [sys.executable, str(GATEWAY_FILE)],
+                liveness=lambda: http_probe(port),
+                readiness=lambda: http_probe(port)))
+            
+            if self.wait_ready('gateway'):
+                print("   ✅ Driver Gateway started")
+                print(f"      📍 http://localhost:{port}/api/driver/...")
+            else:
+                print("   ❌ Driver Gateway failed")
+                return False
+            
+            return True
+        except Exception as e:
+            print(f"   ❌ Error: {e}")
+            return False
+    
     def start_workflow_engine(self):
-        """Start background workflow engine"""
+        """Start supervised workflow engine workers (sharded, restarted on crash)"""
         print("\n3️⃣  Starting Workflow Engine...")
         
         try:
-            proc = subprocess.Popen(
-                [sys.executable, str(WORKFLOW_FILE)],
-                cwd=str(PROJECT_ROOT),
-                stdout=subprocess.PIPE,
-                stderr=subprocess.PIPE
-            )
-            
-            self.processes['workflow'] = proc
+            self.engines.start_all()
             time.sleep(1)
+            self.engines.check()
             
-            if proc.poll() is None:
-                print("   ✅ Workflow Engine started")
+            alive = sum(1 for worker in self.engines.status() if worker['alive'])
+            if alive:
+                print(f"   ✅ Workflow Engine started ({alive}/{len(self.engines.workers)} workers, "
+                      f"{self.engines.shard_count} shards)")
                 print("      ⏰ Monitoring tasks every 10 seconds")
             else:
                 print("   ❌ Workflow Engine failed")
@@ -128,6 +177,58 @@ class SystemOrchestrator:
             print(f"   ❌ Error: {e}")
             return False
     
+    def start_dispatcher(self):
+        """Start outbound message dispatcher (SMS/WhatsApp/Email)"""
+        print("\n📤 Starting Outbound Dispatcher...")
+        
+        try:
+            self.services.add(ManagedProcess('dispatcher', [sys.executable, str(DISPATCH_FILE)]))
+            
+            if self.wait_ready('dispatcher'):
+                print("   ✅ Dispatcher started")
+                print("      📨 Sending queued messages from DB")
+            else:
+                print("   ❌ Dispatcher failed")
+                return False
+            
+            return True
+        except Exception as e:
+            print(f"   ❌ Error: {e}")
+            return False
+    
+    def wait_ready(self, name: str) -> bool:
+        """Start a service and wait for its readiness probe (gone = failed)"""
+        process = self.services.processes[name]
+        if not process.spawn():
+            return False
+        deadline = time.time() + READY_TIMEOUT
+        while time.time() < deadline:
+            time.sleep(0.25)
+            if not process.alive:
+                return False
+            process.probe(time.time())
+            if process.ready:
+                return True
+        return process.alive  # slow start: running, liveness decides later
+    
+    def supervise(self):
+        """Main loop step (every second): restarts, probes, periodic report"""
+        self.services.check()
+        self.engines.check()
+        if time.time() - self.last_report >= REPORT_INTERVAL:
+            self.last_report = time.time()
+            self.print_processes()
+    
+    def print_processes(self):
+        """Per-process CPU, memory, restarts"""
+        print(f"\n📈 PROCESSES ({time.strftime('%H:%M:%S')}):")
+        for process in self.services.status() + self.engines.status():
+            state = '✅' if process['ready'] else ('⏳' if process['alive'] else '❌')
+            cpu = f"{process['cpu_percent']:5.1f}%" if process['cpu_percent'] is not None else '    -'
+            rss = f"{process['rss_mb']:7.1f} MB" if process['rss_mb'] is not None else '      - MB'
+            print(f"   {state} {process['name']:<12} pid {str(process['pid'] or '-'):>7}  cpu {cpu}  "
+                  f"mem {rss}  restarts {process['restarts']}")
+    
     def spawn_agent_sessions(self):
         """Spawn OpenClaw agent sessions"""
         print("\n4️⃣  Spawning Agent Sessions...")
@@ -184,8 +285,11 @@ class SystemOrchestrator:
 
 🔌 ACTIVE COMPONENTS:
    ✅ SQLite Database: {DB_FILE.name}
-   ✅ REST API: http://localhost:5000
-   ✅ Workflow Engine: Auto-processing tasks
+   ✅ REST API: http://localhost:{API_PORT}
+   ✅ Ingest Flusher: orders/webhooks -> main DB
+   ✅ Driver Gateway: http://localhost:{CONFIG['gateway_port']}
+   ✅ Workflow Engine: {len(self.engines.workers)} supervised workers
+   ✅ Outbound Dispatcher: SMS / WhatsApp / Email
    ✅ Agent Team: 4 sessions (Secretary, Accounting, Scheduler, Comms)
 
 🎯 QUICK START:
@@ -201,6 +305,8 @@ class SystemOrchestrator:
 🚀 READY FOR PRODUCTION!
 """)
         
+        print(f"📝 Logs: {CONFIG['log_dir']}/<process>.log (rotated)")
+        self.print_processes()
         print("=" * 60)
         print("Press CTRL+C to stop all services\n")
     
@@ -217,10 +323,22 @@ class SystemOrchestrator:
         if not self.start_rest_api():
             print("\n⚠️  API startup failed, continuing...")
         
+        # Step 2a: Start ingest flusher (accepted orders/webhooks reach the main DB)
+        if not self.start_ingest_flusher():
+            print("\n⚠️  Ingest flusher startup failed, orders stay queued...")
+        
+        # Step 2b: Start driver gateway (driver app traffic)
+        if not self.start_driver_gateway():
+            print("\n⚠️  Driver gateway startup failed, drivers use the REST API...")
+        
         # Step 3: Start workflow engine
         if not self.start_workflow_engine():
             print("\n⚠️  Workflow engine startup failed, continuing...")
         
+        # Step 3b: Start outbound dispatcher
+        if not self.start_dispatcher():
+            print("\n⚠️  Dispatcher startup failed, messages stay queued...")
+        
         # Step 4: Spawn agents
         if not self.spawn_agent_sessions():
             print("\n⚠️  Agent spawning had issues")
@@ -234,14 +352,13 @@ class SystemOrchestrator:
         """Stop all processes gracefully"""
         print("\n\n🛑 Shutting down services...")
         
-        for name, proc in self.processes.items():
-            if proc and proc.poll() is None:
+        print("   Stopping workflow engine workers...")
+        self.engines.stop()
+        
+        for name, process in self.services.processes.items():
+            if process.alive:
                 print(f"   Stopping {name}...")
-                proc.terminate()
-                try:
-                    proc.wait(timeout=5)
-                except subprocess.TimeoutExpired:
-                    proc.kill()
+        self.services.stop()
         
         print("✅ All services stopped")
 
@@ -260,6 +377,7 @@ if __name__ == "__main__":
             try:
                 while True:
                     time.sleep(1)
+                    orchestrator.supervise()  # restarts, probes, shard rebalancing
             except KeyboardInterrupt:
                 orchestrator.cleanup()
         else:
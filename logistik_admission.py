@@ -0,0 +1,160 @@
+#!/usr/bin/env python3
+"""
+Admission Control - Rate limits and load shedding for write endpoints
+A driver app stuck in a retry loop or a partner flooding the webhook must
+not saturate the single SQLite writer. Checked before the view runs:
+
+    rate limit   token bucket per driver_id on driver endpoints, per API
+                 client on webhooks and driver calls without a driver_id:
+                 keyed by X-API-Key only for keys listed in api_clients
+                 (LOGISTIK_API_CLIENTS), else by remote address, so a
+                 made-up key does not buy a fresh burst; a client over
+                 its bucket gets 429 + Retry-After, others are unaffected
+                 (drivers behind one NAT don't share a bucket). Driver
+                 calls are charged to the client bucket too, since the
+                 driver_id is not authenticated either. At most
+                 MAX_BUCKETS buckets per scope, least recently used
+                 dropped first
+    shedding     writes (POST) are refused with 429 + Retry-After while
+                 the write queue is deeper than MAX_QUEUE_DEPTH, its recent
+                 latency is above MAX_WRITE_LATENCY_MS or the ingest queue
+                 holds more than MAX_INGEST_BACKLOG items (sampled every
+                 PRESSURE_INTERVAL seconds)
+
+Counters (admitted / limited / shed per reason) are part of
+/api/admin/backlog.
+"""
+
+import math
+import threading
+import time
+from collections import Counter, OrderedDict
+from typing import Dict, Iterable, Optional, Tuple
+from logistik_config import CONFIG
+from logistik_db import LogisticsDB
+
+DRIVER_RATE = (2.0, 20)  # tokens per second, burst
+CLIENT_RATE = (50.0, 200)
+MAX_QUEUE_DEPTH = 200  # queued writes
+MAX_WRITE_LATENCY_MS = 500.0  # submit -> commit, moving average
+LATENCY_MAX_AGE = 5.0  # seconds; older latency samples don't count (idle writer)
+MAX_INGEST_BACKLOG = 5000  # unflushed orders/webhooks
+PRESSURE_INTERVAL = 0.5  # seconds between pressure samples
+SHED_RETRY_AFTER = 2  # seconds
+MAX_BUCKETS = 10000  # per scope; least recently used bucket is dropped beyond this
+
+
+class TokenBucket:
+    __slots__ = ('rate', 'burst', 'tokens', 'updated')
+
+    def __init__(self, rate: float, burst: int, now: float):
+        self.rate = rate
+        self.burst = burst
+        self.tokens = float(burst)
+        self.updated = now
+
+    def take(self, now: float) -> float:
+        """Take one token; 0 if granted, else seconds until the next one"""
+        self.tokens = min(self.burst, self.tokens + (now - self.updated) * self.rate)
+        self.updated = now
+        if self.tokens >= 1:
+            self.tokens -= 1
+            return 0.0
+        return (1 - self.tokens) / self.rate
+
+
+class Admission:
+    """Token buckets per driver / client plus write-pressure shedding"""
+
+    def __init__(self, db: LogisticsDB, ingest=None, driver_rate: Tuple[float, int] = DRIVER_RATE,
+                 client_rate: Tuple[float, int] = CLIENT_RATE, max_queue_depth: int = MAX_QUEUE_DEPTH,
+                 max_write_latency_ms: float = MAX_WRITE_LATENCY_MS,
+                 max_ingest_backlog: int = MAX_INGEST_BACKLOG, clients: Iterable[str] = None):
+        self.db = db
+        self.ingest = ingest
+        self.rates = {'driver': driver_rate, 'client': client_rate}
+        self.max_queue_depth = max_queue_depth
+        self.max_write_latency_ms = max_write_latency_ms
+        self.max_ingest_backlog = max_ingest_backlog
+        self.clients = frozenset(CONFIG['api_clients'] if clients is None else clients)
+        self.buckets: Dict[str, OrderedDict] = {'driver': OrderedDict(), 'client': OrderedDict()}
+        self.counters: Counter = Counter()
+        self._pressure: Tuple[float, Optional[str]] = (0.0, None)
+        self._lock = threading.Lock()
+
+    # ========== CHECKS ==========
+
+    def client_key(self, api_key: Optional[str], remote_addr: Optional[str]) -> str:
+        """Bucket key of an API client: configured X-API-Key, else the remote address"""
+        if api_key and api_key in self.clients:
+            return f"key:{api_key}"
+        return f"addr:{remote_addr}"
+
+    def limit(self, scope: str, key) -> float:
+        """Token bucket for driver/client key; 0 or seconds to wait"""
+        now = time.monotonic()
+        buckets = self.buckets[scope]
+        key = str(key)
+        with self._lock:
+            bucket = buckets.get(key)
+            if bucket is None:
+                if len(buckets) >= MAX_BUCKETS:
+                    buckets.popitem(last=False)
+                bucket = buckets[key] = TokenBucket(*self.rates[scope], now)
+            else:
+                buckets.move_to_end(key)
+            return bucket.take(now)
+
+    def pressure(self) -> Optional[str]:
+        """Reason to shed writes right now (None: healthy)"""
+        now = time.monotonic()
+        if now - self._pressure[0] < PRESSURE_INTERVAL:
+            return self._pressure[1]
+        writer = self.db.writer.stats()
+        reason = None
+        if writer['queued'] > self.max_queue_depth:
+            reason = 'queue_depth'
+        elif (writer['latency_ms'] > self.max_write_latency_ms
+              and writer['latency_age'] is not None and writer['latency_age'] < LATENCY_MAX_AGE):
+            reason = 'write_latency'
+        elif self.ingest is not None and self.ingest.depth() > self.max_ingest_backlog:
+            reason = 'ingest_backlog'
+        self._pressure = (now, reason)
+        return reason
+
+    def admit(self, scope: str, key, write: bool = False, client: str = None) -> Optional[Tuple[str, int]]:
+        """None to go ahead, else (reason, Retry-After seconds); scope 'driver' or 'client'
+        
+        client: client_key() of a driver call, charged first (made-up driver
+        ids don't buy fresh bursts or push real drivers out of the LRU)
+        """
+        if write:
+            reason = self.pressure()
+            if reason:
+                self._count(f'shed_{reason}')
+                return reason, SHED_RETRY_AFTER
+        if client is not None and scope != 'client':
+            wait = self.limit('client', client)
+            if wait:
+                self._count('limited_client')
+                return 'client_rate', max(1, math.ceil(wait))
+        wait = self.limit(scope, key)
+        if wait:
+            self._count(f'limited_{scope}')
+            return f'{scope}_rate', max(1, math.ceil(wait))
+        self._count('admitted')
+        return None
+
+    def _count(self, key: str):
+        with self._lock:
+            self.counters[key] += 1
+
+    def stats(self) -> Dict:
+        return {
+            **{key: self.counters.get(key, 0) for key in ('admitted', 'limited_driver', 'limited_client',
+                                                          'shed_queue_depth', 'shed_write_latency',
+                                                          'shed_ingest_backlog')},
+            'shedding': self._pressure[1],
+            'tracked_drivers': len(self.buckets['driver']),
+            'tracked_clients': len(self.buckets['client']),
+        }
@@ -0,0 +1,513 @@
+#!/usr/bin/env python3
+"""
+Analytics Engine - Columnar extracts + vectorised aggregations
+Keeps the few columns the reports need from orders, invoices, expenses
+and driver_assignments in memory as typed arrays (array module; one
+array per column, dates as day numbers, statuses as small codes) and
+aggregates over whole columns:
+
+    revenue      per driver and delivery day
+    on_time      delivery_time <= deadline, per driver and overall
+    ageing       open invoice amounts by days past due_date
+    margins      revenue - expenses per driver
+    assignments  completed / failed / open per driver
+
+Extracts are refreshed incrementally by watermark, always from the live DB
+(a snapshot lags it and would move the cursor backwards):
+    orders, invoices     rows named in the event log since the last cursor
+                         (logistik_events.py: inserts, changes of the reported
+                         columns, deletes); archived orders are read from the
+                         attached archive DB, so archiving keeps history
+    expenses             id > last id (append-only)
+    driver_assignments   id > last id; rows still open are re-read every
+                         OPEN_RECHECK seconds (their status changes)
+Results are cached until a refresh changes the extracts. NumPy is used
+for the aggregations when installed (optional, pip install numpy).
+
+Run: python logistik_analytics.py [--days 30]
+"""
+
+import threading
+import time
+from array import array
+from datetime import date, timedelta
+from itertools import compress
+from pathlib import Path
+from typing import Dict, List, Optional, Sequence
+
+from logistik_db import LogisticsDB
+
+try:
+    import numpy as np  # optional: faster masks / group sums
+except ImportError:
+    np = None
+
+EPOCH = date(1970, 1, 1).toordinal()
+CHUNK = 50000  # rows per extract query
+AGEING_BUCKETS = [(0, 'current'), (1, '1-30'), (31, '31-60'), (61, '61-90'), (91, '90+')]
+OPEN_INVOICE = ('sent', 'viewed', 'overdue')
+OPEN_ASSIGNMENT = ('assigned', 'started')
+OPEN_RECHECK = 60  # seconds between re-reads of open driver_assignments
+
+
+def _day(sql_column: str) -> str:
+    """SQL: date/timestamp -> days since 1970-01-01 (-1 for NULL)"""
+    return f"COALESCE(CAST(julianday({sql_column}) - 2440587.5 AS INTEGER), -1)"
+
+
+def to_day(value) -> int:
+    if isinstance(value, str):
+        value = date.fromisoformat(value[:10])
+    return value.toordinal() - EPOCH
+
+
+def from_day(day: int) -> str:
+    return date.fromordinal(EPOCH + day).isoformat()
+
+
+class Extract:
+    """Column arrays for one table; rows are updated in place, deletes are tombstoned"""
+
+    def __init__(self, table: str, columns: Dict[str, str], sql: str, codes: Dict[str, List[str]] = None,
+                 archived: bool = False):
+        self.table = table
+        self.types = columns  # name -> array typecode ('q', 'd', 'b')
+        self.sql = sql  # SELECT id, <columns in order> FROM {source} WHERE {where}
+        self.codes = codes or {}  # text column -> value list (code = index)
+        self.archived = archived  # rows move to archive.<table> (logistik_archive.py)
+        self.clear()
+
+    def clear(self):
+        self.columns = {name: array(code) for name, code in self.types.items()}
+        self.alive = array('b')
+        self.ids = array('q')
+        self.pos: Dict[int, int] = {}
+        self.max_id = 0
+
+    def __len__(self):
+        return len(self.pos)
+
+    def code(self, column: str, value: Optional[str]) -> int:
+        values = self.codes[column]
+        if value not in values:
+            values.append(value)  # unknown status: new code, still counted
+        return values.index(value)
+
+    def fetch(self, conn, where: str, params: Sequence = (), source: str = None) -> List[tuple]:
+        sql = self.sql.format(source=source or self.table, where=where)
+        return conn.execute(sql, tuple(params)).fetchall()
+
+    def apply(self, rows: List[tuple]) -> int:
+        """Insert or overwrite rows (id first, then columns in declared order), return rows changed"""
+        changed = 0
+        names = list(self.types)
+        coded = [(i, name) for i, name in enumerate(names) if name in self.codes]
+        for row in rows:
+            values = list(row[1:])
+            for i, name in coded:
+                values[i] = self.code(name, values[i])
+            index = self.pos.get(row[0])
+            if index is None:
+                self.pos[row[0]] = len(self.ids)
+                self.ids.append(row[0])
+                self.alive.append(1)
+                for name, value in zip(names, values):
+                    self.columns[name].append(value)
+                changed += 1
+            elif any(self.columns[name][index] != value for name, value in zip(names, values)):
+                for name, value in zip(names, values):
+                    self.columns[name][index] = value
+                changed += 1
+            self.max_id = max(self.max_id, row[0])
+        return changed
+
+    def remove(self, ids) -> int:
+        removed = 0
+        for id in ids:
+            index = self.pos.pop(id, None)
+            if index is not None:
+                self.alive[index] = 0
+                removed += 1
+        if len(self.alive) > 1000 and len(self.pos) < len(self.alive) * 0.8:
+            self._compact()
+        return removed
+
+    def _compact(self):
+        keep = self.alive
+        self.columns = {name: array(col.typecode, compress(col, keep)) for name, col in self.columns.items()}
+        self.ids = array('q', compress(self.ids, keep))
+        self.alive = array('b', [1]) * len(self.ids)
+        self.pos = {id: i for i, id in enumerate(self.ids)}
+
+    def _append(self, rows: List[tuple]):
+        """New rows appended column-wise (no per-row work in Python)"""
+        ids, *values = zip(*rows)
+        self.pos.update(zip(ids, range(len(self.ids), len(self.ids) + len(ids))))
+        self.ids.extend(ids)
+        self.alive.extend(array('b', [1]) * len(ids))
+        for name, column in zip(self.types, values):
+            if name in self.codes:
+                for value in set(column):
+                    self.code(name, value)
+                column = map({v: i for i, v in enumerate(self.codes[name])}.__getitem__, column)
+            self.columns[name].extend(column)
+        self.max_id = max(self.max_id, ids[-1])
+
+    def load_all(self, conn, archive: bool = False):
+        """Full extract: archived rows first (archive attached), then the hot table"""
+        self.clear()
+        sources = ([f"archive.{self.table}"] if archive else []) + [self.table]
+        for source in sources:
+            after = 0
+            while True:
+                rows = self.fetch(conn, "id > ? ORDER BY id LIMIT ?", (after, CHUNK), source)
+                if not rows:
+                    break
+                if any(row[0] in self.pos for row in rows):
+                    self.apply(rows)  # row in both (archive run interrupted): hot copy wins
+                else:
+                    self._append(rows)
+                after = rows[-1][0]
+                if len(rows) < CHUNK:
+                    break
+
+    def reload(self, conn, ids: Sequence[int], archive: bool = False) -> int:
+        """Re-read rows by id; ids gone from the table (and the archive) were deleted"""
+        ids = list(ids)
+        changed = 0
+        for start in range(0, len(ids), 500):
+            chunk = ids[start:start + 500]
+            where = f"id IN ({','.join('?' * len(chunk))})"
+            rows = self.fetch(conn, where, chunk)
+            missing = set(chunk) - {row[0] for row in rows}
+            if archive and missing:
+                rows += self.fetch(conn, f"id IN ({','.join('?' * len(missing))})", sorted(missing),
+                                   f"archive.{self.table}")
+                missing -= {row[0] for row in rows}
+            changed += self.apply(rows)
+            changed += self.remove(missing)
+        return changed
+
+    def col(self, name: str):
+        """Column as a NumPy view (no copy) or the plain array"""
+        column = self.columns[name]
+        return np.frombuffer(column, dtype=column.typecode) if np is not None and len(column) else column
+
+
+# ========== COLUMN OPERATIONS ==========
+# Same call for both backends: NumPy arrays or array.array / lists
+
+def mask(*conditions):
+    """AND of boolean columns"""
+    if np is not None and not isinstance(conditions[0], (list, array)):
+        result = conditions[0].astype(bool)
+        for condition in conditions[1:]:
+            result = result & condition
+        return result
+    return [all(values) for values in zip(*conditions)]
+
+
+def compare(column, op: str, value):
+    if np is not None and not isinstance(column, array):
+        if op == 'in':
+            return np.isin(column, list(value))
+        return {'>=': column.__ge__, '<': column.__lt__, '==': column.__eq__, '!=': column.__ne__}[op](value)
+    if op == 'in':
+        value = set(value)
+        return [v in value for v in column]
+    test = {'>=': value.__le__, '<': value.__gt__, '==': value.__eq__, '!=': value.__ne__}[op]
+    return list(map(test, column))
+
+
+def group_sum(keys: Sequence, values, selected) -> Dict[tuple, List[float]]:
+    """{key tuple: [sum of values, row count]} over the selected rows"""
+    if np is not None and not isinstance(selected, list):
+        if not len(selected) or not selected.any():
+            return {}
+        # Key columns -> one int64 (mixed radix), then one bincount pass
+        columns = [np.asarray(k)[selected].astype(np.int64) for k in keys]
+        lows = [int(c.min()) for c in columns]
+        spans = [int(c.max()) - low + 1 for c, low in zip(columns, lows)]
+        combined = np.zeros(len(columns[0]), dtype=np.int64)
+        for column, low, span in zip(columns, lows, spans):
+            combined = combined * span + (column - low)
+        unique, inverse = np.unique(combined, return_inverse=True)
+        sums = np.bincount(inverse, weights=np.asarray(values)[selected], minlength=len(unique))
+        counts = np.bincount(inverse, minlength=len(unique))
+        result = {}
+        for i, code in enumerate(unique.tolist()):
+            key = []
+            for low, span in zip(reversed(lows), reversed(spans)):
+                code, part = divmod(code, span)
+                key.append(part + low)
+            result[tuple(reversed(key))] = [float(sums[i]), int(counts[i])]
+        return result
+    result = {}
+    for row in compress(zip(*keys, values), selected):
+        entry = result.get(row[:-1])
+        if entry is None:
+            result[row[:-1]] = [row[-1], 1]
+        else:
+            entry[0] += row[-1]
+            entry[1] += 1
+    return result
+
+
+# ========== ENGINE ==========
+
+class Analytics:
+    """Columnar cache over the DB + cached aggregations"""
+
+    def __init__(self, db: LogisticsDB = None):
+        self.db = db or LogisticsDB()
+        self.orders = Extract('orders', {
+            'driver': 'q', 'status': 'b', 'day': 'q', 'on_time': 'b', 'revenue': 'd',
+        }, f"""
+            SELECT id, COALESCE(assigned_driver_id, -1), status, {_day('delivery_time')},
+                   CASE WHEN delivery_time IS NULL OR deadline IS NULL THEN -1
+                        WHEN julianday(delivery_time) <= julianday(deadline) THEN 1 ELSE 0 END,
+                   COALESCE(total_price, 0)
+            FROM {{source}} WHERE {{where}}
+        """, {'status': ['pending', 'assigned', 'picked_up', 'in_transit', 'delivered', 'failed', 'cancelled']},
+            archived=True)
+        self.invoices = Extract('invoices', {
+            'customer': 'q', 'status': 'b', 'due_day': 'q', 'open_amount': 'd',
+        }, f"""
+            SELECT id, customer_id, status, {_day('due_date')},
+                   COALESCE(total_amount, 0) - COALESCE(paid_amount, 0)
+            FROM {{source}} WHERE {{where}}
+        """, {'status': ['draft', 'sent', 'viewed', 'paid', 'overdue', 'cancelled']})
+        self.expenses = Extract('expenses', {
+            'driver': 'q', 'day': 'q', 'amount': 'd',
+        }, f"""
+            SELECT id, COALESCE(driver_id, -1), {_day('expense_date')}, COALESCE(amount, 0)
+            FROM {{source}} WHERE {{where}}
+        """)
+        self.assignments = Extract('driver_assignments', {
+            'driver': 'q', 'status': 'b', 'one': 'd',
+        }, """
+            SELECT id, driver_id, status, 1.0 FROM {source} WHERE {where}
+        """, {'status': ['assigned', 'started', 'completed', 'failed']})
+        self.cursor: Optional[int] = None  # event log position the extracts include
+        self._open_checked = 0.0
+        self.version = 0  # bumped whenever the extracts change
+        self.refreshed_at = 0.0
+        self.last_refresh_ms = 0.0
+        self._results: Dict[tuple, Dict] = {}
+        self._lock = threading.RLock()
+
+    def refresh(self) -> bool:
+        """Bring extracts up to date (full load first time), True if anything changed"""
+        started = time.perf_counter()
+        conn = self.db.connect()
+        conn.isolation_level = None
+        with self._lock:
+            try:
+                archive = self._attach_archive(conn)
+                conn.execute("BEGIN")  # cursor and rows from one consistent read
+                changed = self._refresh(conn, archive)
+                conn.execute("COMMIT")
+            finally:
+                conn.close()
+            if changed:
+                self.version += 1
+                self._results.clear()
+            self.refreshed_at = time.time()
+            self.last_refresh_ms = (time.perf_counter() - started) * 1000
+            return changed
+
+    def _attach_archive(self, conn) -> bool:
+        """Attach the archive DB if it holds archived orders"""
+        path = self.db.archive_path
+        if not path or not Path(path).exists():
+            return False
+        conn.execute("ATTACH DATABASE ? AS archive", (str(path),))
+        return conn.execute("SELECT 1 FROM archive.sqlite_master WHERE type='table' AND name='orders'"
+                            ).fetchone() is not None
+
+    def _refresh(self, conn, archive: bool = False) -> bool:
+        latest = conn.execute("SELECT COALESCE(MAX(id), 0) FROM events").fetchone()[0]
+        oldest = conn.execute("SELECT MIN(id) FROM events").fetchone()[0]
+        changed = False
+        if self.cursor is None or (oldest is not None and oldest > self.cursor + 1) or latest < self.cursor:
+            # First run, or events we have not seen were compacted away
+            self.orders.load_all(conn, archive)
+            self.invoices.load_all(conn)
+            changed = True
+        elif latest > self.cursor:
+            touched = {'orders': set(), 'invoices': set()}
+            for entity, entity_id in conn.execute(
+                    "SELECT entity, entity_id FROM events WHERE id > ? AND id <= ? AND entity IN ('orders', 'invoices')",
+                    (self.cursor, latest)):
+                touched[entity].add(entity_id)
+            changed = bool(self.orders.reload(conn, sorted(touched['orders']), archive) +
+                           self.invoices.reload(conn, sorted(touched['invoices'])))
+        self.cursor = latest
+
+        changed |= bool(self.expenses.apply(self.expenses.fetch(conn, "id > ? ORDER BY id", (self.expenses.max_id,))))
+
+        a = self.assignments
+        changed |= bool(a.apply(a.fetch(conn, "id > ? ORDER BY id", (a.max_id,))))
+        if time.time() - self._open_checked >= OPEN_RECHECK:
+            open_codes = {a.code('status', s) for s in OPEN_ASSIGNMENT}
+            open_ids = [id for id, s, alive in zip(a.ids, a.columns['status'], a.alive)
+                        if alive and s in open_codes]
+            changed |= bool(a.reload(conn, open_ids))
+            self._open_checked = time.time()
+        return changed
+
+    def _cached(self, key: tuple, compute) -> Dict:
+        with self._lock:
+            result = self._results.get(key)
+            if result is None:
+                started = time.perf_counter()
+                result = compute()
+                result['compute_ms'] = round((time.perf_counter() - started) * 1000, 2)
+                self._results[key] = result
+            return result
+
+    def _delivered(self, start: int, end: int):
+        o = self.orders
+        day = o.col('day')
+        return mask(self._alive(o),
+                    compare(o.col('status'), '==', o.code('status', 'delivered')),
+                    compare(day, '>=', start), compare(day, '<', end))
+
+    def _alive(self, extract: Extract):
+        return np.frombuffer(extract.alive, dtype='b') if np is not None and len(extract.alive) else extract.alive
+
+    # ========== REPORTS ==========
+
+    def revenue(self, start: int, end: int, driver_id: int = None) -> Dict:
+        """Delivered revenue per driver and day, days [start, end)"""
+        def compute():
+            o = self.orders
+            selected = self._delivered(start, end)
+            if driver_id is not None:
+                selected = mask(selected, compare(o.col('driver'), '==', driver_id))
+            groups = group_sum([o.col('driver'), o.col('day')], o.col('revenue'), selected)
+            rows = [{'driver_id': driver if driver >= 0 else None, 'day': from_day(day),
+                     'orders': count, 'revenue': round(total, 2)}
+                    for (driver, day), (total, count) in sorted(groups.items(), key=lambda g: (g[0][1], g[0][0]))]
+            return {'rows': rows, 'total_revenue': round(sum(total for total, _ in groups.values()), 2),
+                    'total_orders': sum(count for _, count in groups.values())}
+        return self._cached(('revenue', start, end, driver_id), compute)
+
+    def on_time(self, start: int, end: int) -> Dict:
+        """Share of delivered orders (with deadline) delivered by the deadline"""
+        def compute():
+            o = self.orders
+            on_time = o.col('on_time')
+            selected = mask(self._delivered(start, end), compare(on_time, '>=', 0))
+            groups = group_sum([o.col('driver')], on_time, selected)
+            drivers = [{'driver_id': driver if driver >= 0 else None, 'delivered': count,
+                        'on_time': int(hits), 'rate': round(hits / count, 4)}
+                       for (driver,), (hits, count) in sorted(groups.items())]
+            delivered = sum(d['delivered'] for d in drivers)
+            hits = sum(d['on_time'] for d in drivers)
+            return {'delivered': delivered, 'on_time': hits,
+                    'rate': round(hits / delivered, 4) if delivered else None, 'drivers': drivers}
+        return self._cached(('on_time', start, end), compute)
+
+    def invoice_ageing(self, as_of: int) -> Dict:
+        """Open invoice amounts by days past due (as of day `as_of`)"""
+        def compute():
+            inv = self.invoices
+            open_codes = [inv.code('status', s) for s in OPEN_INVOICE]
+            selected = mask(self._alive(inv), compare(inv.col('status'), 'in', open_codes))
+            overdue = [as_of - due for due in inv.columns['due_day']] if np is None else as_of - inv.col('due_day')
+            bucket_of = [max(i for i, (low, _) in enumerate(AGEING_BUCKETS) if days >= low)
+                         for days in range(0, 92)]  # days past due (capped at 91) -> bucket
+            if np is not None:
+                buckets = np.asarray(bucket_of)[np.clip(overdue, 0, 91)] if len(overdue) else overdue
+            else:
+                buckets = [bucket_of[min(max(days, 0), 91)] for days in overdue]
+            groups = group_sum([buckets], inv.col('open_amount'), selected)
+            rows = []
+            for i, (_, name) in enumerate(AGEING_BUCKETS):
+                total, count = groups.get((i,), [0.0, 0])
+                rows.append({'bucket': name, 'invoices': count, 'outstanding': round(total, 2)})
+            return {'as_of': from_day(as_of), 'buckets': rows,
+                    'total_outstanding': round(sum(r['outstanding'] for r in rows), 2)}
+        return self._cached(('ageing', as_of), compute)
+
+    def margins(self, start: int, end: int) -> Dict:
+        """Revenue - expenses per driver; expenses without driver are overhead"""
+        def compute():
+            o, e = self.orders, self.expenses
+            revenue = group_sum([o.col('driver')], o.col('revenue'), self._delivered(start, end))
+            day = e.col('day')
+            costs = group_sum([e.col('driver')], e.col('amount'),
+                              mask(self._alive(e), compare(day, '>=', start), compare(day, '<', end)))
+            drivers = []
+            for driver in sorted({k[0] for k in revenue} | ({k[0] for k in costs} - {-1})):
+                income = revenue.get((driver,), [0.0, 0])[0]
+                spent = costs.get((driver,), [0.0, 0])[0] if driver >= 0 else 0.0
+                drivers.append({'driver_id': driver if driver >= 0 else None, 'revenue': round(income, 2),
+                                'expenses': round(spent, 2), 'margin': round(income - spent, 2),
+                                'margin_pct': round((income - spent) / income * 100, 1) if income else None})
+            total_revenue = sum((total for total, _ in revenue.values()), 0.0)
+            overhead = costs.get((-1,), [0.0, 0])[0]
+            total_costs = sum((total for total, _ in costs.values()), 0.0)
+            return {'drivers': drivers, 'overhead': round(overhead, 2), 'total_revenue': round(total_revenue, 2),
+                    'total_expenses': round(total_costs, 2), 'margin': round(total_revenue - total_costs, 2)}
+        return self._cached(('margins', start, end), compute)
+
+    def assignment_stats(self) -> Dict:
+        """Assignments per driver by status, completion rate of finished ones"""
+        def compute():
+            a = self.assignments
+            groups = group_sum([a.col('driver'), a.col('status')], a.col('one'), self._alive(a))
+            statuses = a.codes['status']
+            drivers: Dict[int, Dict] = {}
+            for (driver, code), (_, count) in groups.items():
+                entry = drivers.setdefault(driver, {'driver_id': driver})
+                entry[statuses[code] or 'unknown'] = count
+            for entry in drivers.values():
+                finished = entry.get('completed', 0) + entry.get('failed', 0)
+                entry['completion_rate'] = round(entry.get('completed', 0) / finished, 4) if finished else None
+            return {'drivers': [drivers[d] for d in sorted(drivers)]}
+        return self._cached(('assignments',), compute)
+
+    def status(self) -> Dict:
+        return {
+            'backend': 'numpy' if np is not None else 'array',
+            'rows': {e.table: len(e) for e in (self.orders, self.invoices, self.expenses, self.assignments)},
+            'event_cursor': self.cursor,
+            'version': self.version,
+            'refreshed_at': self.refreshed_at,
+            'last_refresh_ms': round(self.last_refresh_ms, 2),
+            'cached_results': len(self._results),
+        }
+
+
+def day_range(start: Optional[str], end: Optional[str], default_days: int = 30):
+    """ISO dates (end exclusive) -> day numbers; default: the last `default_days` days"""
+    end_day = to_day(end) if end else to_day(date.today() + timedelta(days=1))
+    start_day = to_day(start) if start else end_day - default_days
+    return start_day, end_day
+
+
+# ============================================
+# STARTUP
+# ============================================
+
+if __name__ == "__main__":
+    import argparse
+    import json
+
+    parser = argparse.ArgumentParser(description='Revenue, on-time, ageing and margin reports')
+    parser.add_argument('--days', type=int, default=30, help='Report period (days up to today)')
+    args = parser.parse_args()
+
+    analytics = Analytics(LogisticsDB())
+    analytics.refresh()
+    start, end = day_range(None, None, args.days)
+    print(f"📊 Analytics ({analytics.status()['backend']}, refresh {analytics.last_refresh_ms:.0f} ms)")
+    print(json.dumps({
+        'revenue': analytics.revenue(start, end),
+        'on_time': analytics.on_time(start, end),
+        'invoice_ageing': analytics.invoice_ageing(to_day(date.today())),
+        'margins': analytics.margins(start, end),
+        'assignments': analytics.assignment_stats(),
+    }, indent=2))
@@ -1,16 +1,51 @@
 #!/usr/bin/env python3
 """
 Logistics API - REST endpoints for driver app, webhooks, etc.
-Run: python logistik_api.py
+Run: python logistik_api.py [--no-reload] [--no-flusher]
+
+Background threads (ingest flusher, snapshotter, index builds) are
+started by start_background(), once per process, and with the code
+reloader only in the child that serves requests (WERKZEUG_RUN_MAIN).
+START_SYSTEM runs the flusher as its own supervised process
+(logistik_ingest.py, API with --no-flusher); do the same under a WSGI
+server, where admin reads then go to the live DB.
 """
 
-from flask import Flask, request, jsonify, send_from_directory
+from flask import Flask, request, jsonify, send_file, g, abort, make_response
+from flask.json.provider import JSONProvider
 from datetime import datetime
 from pathlib import Path
 import json
 from logistik_db import LogisticsDB
+from logistik_admission import Admission
+from logistik_analytics import Analytics, day_range, to_day
+from logistik_http import dumps, loads, maybe_compress
+from logistik_driver import DriverService
+from logistik_eta import EtaService
+from logistik_events import EventLog
+from logistik_health import Backlog, health, readiness
+from logistik_ingest import IngestQueue
+from logistik_invoices import InvoiceRenderer
+from logistik_search import SearchIndex
+from logistik_snapshot import Snapshotter
+from logistik_static import StaticAssets
+from logistik_migrations import migrate, start_background_indexes
+
+class FastJSONProvider(JSONProvider):
+    """jsonify() via logistik_http: orjson if installed, same date/decimal/row handling"""
+    
+    def dumps(self, obj, **kwargs):
+        return dumps(obj).decode()
+    
+    def loads(self, s, **kwargs):
+        return loads(s)
+    
+    def response(self, *args, **kwargs):
+        obj = self._prepare_response_obj(args, kwargs)
+        return self._app.response_class(dumps(obj), mimetype='application/json')
 
 app = Flask(__name__)
+app.json = FastJSONProvider(app)
 DASHBOARD_PATH = Path(__file__).parent / 'dashboard'
 JARVIS_PATH = Path(__file__).parent / 'jarvis_dashboard'
 
@@ -21,7 +56,79 @@ def add_cors_headers(response):
     response.headers['Access-Control-Allow-Methods'] = 'GET, POST, PUT, DELETE, OPTIONS'
     response.headers['Access-Control-Allow-Headers'] = 'Content-Type'
     return response
-db = LogisticsDB()
+
+# gzip/deflate for larger bodies (files from send_file stream uncompressed)
+@app.after_request
+def compress_response(response):
+    if (response.direct_passthrough or response.status_code in (204, 304)
+            or 'Content-Encoding' in response.headers):
+        return response
+    response.vary.add('Accept-Encoding')
+    body, encoding = maybe_compress(response.get_data(), response.mimetype,
+                                    request.headers.get('Accept-Encoding', ''))
+    if encoding:
+        response.set_data(body)
+        response.headers['Content-Encoding'] = encoding
+    return response
+db = LogisticsDB(compact_rows=True)  # rows stay tuples until jsonify()
+invoice_renderer = InvoiceRenderer(db, workers=1)
+search_index = SearchIndex(db)
+ingest = IngestQueue(db)  # flushed by logistik_ingest.py or start_background()
+drivers = DriverService(db)  # same logic as the asyncio gateway (logistik_gateway.py)
+event_log = EventLog(db)
+snapshots = Snapshotter(db)  # analytics reads, refreshed by a background thread (see __main__)
+analytics = Analytics(db)  # columnar extracts, refreshed per request from the live DB
+eta = EtaService(db)  # learned by the engine, reloaded every 10s by start_background()
+backlog = Backlog(db)  # engine backlog, cached 1s
+admission = Admission(db, ingest)  # driver/webhook rate limits + write shedding
+assets = StaticAssets({'dashboard': DASHBOARD_PATH, 'jarvis_dashboard': JARVIS_PATH})  # in memory, see __main__
+MAX_EVENT_WAIT = 30  # seconds a long-poll may hold a worker
+
+# ============================================
+# ADMISSION CONTROL (driver + webhook endpoints)
+# ============================================
+
+@app.before_request
+def admit_request():
+    """Token buckets per API client (+ per driver on driver calls), 429 while the writer is overloaded"""
+    if request.path.startswith('/api/driver/'):
+        driver_id = (request.view_args or {}).get('driver_id')
+        if driver_id is None and request.method == 'POST':
+            body = request.get_json(silent=True)
+            driver_id = body.get('driver_id') if isinstance(body, dict) else None
+    elif request.path.startswith('/webhook/'):
+        driver_id = None
+    else:
+        return None
+    client = admission.client_key(request.headers.get('X-API-Key'), request.remote_addr)
+    if driver_id is not None:
+        rejected = admission.admit('driver', driver_id, write=request.method == 'POST', client=client)
+    else:
+        rejected = admission.admit('client', client, write=request.method == 'POST')
+    if rejected is None:
+        return None
+    reason, retry_after = rejected
+    response = jsonify({'success': False, 'error': 'Too many requests', 'reason': reason,
+                        'retry_after': retry_after})
+    response.status_code = 429
+    response.headers['Retry-After'] = str(retry_after)
+    return response
+
+# ============================================
+# HEALTH ENDPOINTS (load balancer, START_SYSTEM probes)
+# ============================================
+
+@app.route('/healthz', methods=['GET'])
+def healthz():
+    """Liveness: process up, DB reachable"""
+    ok, checks = health(db)
+    return jsonify({'ok': ok, **checks}), 200 if ok else 503
+
+@app.route('/readyz', methods=['GET'])
+def readyz():
+    """Readiness: migrations applied, engine heartbeat fresh"""
+    ok, checks = readiness(db)
+    return jsonify({'ok': ok, 'checks': checks}), 200 if ok else 503
 
 # ============================================
 # DASHBOARD ENDPOINTS
@@ -30,17 +137,17 @@ db = LogisticsDB()
 @app.route('/')
 def root():
     """Serve main dashboard"""
-    return send_from_directory(DASHBOARD_PATH, 'index.html')
+    return assets.response('dashboard', 'index.html')
 
 @app.route('/dashboard')
 def dashboard():
     """Logistics dashboard"""
-    return send_from_directory(DASHBOARD_PATH, 'index.html')
+    return assets.response('dashboard', 'index.html')
 
 @app.route('/dashboard/<path:path>')
 def serve_dashboard(path):
-    """Serve dashboard assets"""
-    return send_from_directory(DASHBOARD_PATH, path)
+    """Serve dashboard assets (fingerprinted names are cached forever)"""
+    return assets.response('dashboard', path)
 
 # ============================================
 # JARVIS ENDPOINTS
@@ -49,255 +156,99 @@ def serve_dashboard(path):
 @app.route('/jarvis')
 def jarvis_desktop():
     """Jarvis desktop dashboard"""
-    return send_from_directory(JARVIS_PATH, 'index.html')
+    return assets.response('jarvis_dashboard', 'index.html')
 
 @app.route('/jarvis/mobile')
 def jarvis_mobile():
     """Jarvis mobile dashboard"""
-    return send_from_directory(JARVIS_PATH, 'mobile.html')
+    return assets.response('jarvis_dashboard', 'mobile.html')
 
 @app.route('/jarvis_dashboard')
 def jarvis_redirect():
     """Redirect to jarvis desktop"""
-    return send_from_directory(JARVIS_PATH, 'index.html')
+    return assets.response('jarvis_dashboard', 'index.html')
 
 @app.route('/jarvis_dashboard/mobile.html')
 def jarvis_mobile_html():
     """Jarvis mobile dashboard (direct path)"""
-    return send_from_directory(JARVIS_PATH, 'mobile.html')
+    return assets.response('jarvis_dashboard', 'mobile.html')
 
 @app.route('/jarvis_dashboard/<path:path>')
 def serve_jarvis(path):
-    """Serve jarvis assets"""
-    return send_from_directory(JARVIS_PATH, path)
+    """Serve jarvis assets (fingerprinted names are cached forever)"""
+    return assets.response('jarvis_dashboard', path)
 
 # ============================================
 # DRIVER ENDPOINTS
 # ============================================
 
+def driver_body() -> dict:
+    """JSON object body of a driver call (400 like the gateway otherwise)"""
+    data = request.get_json(silent=True)
+    if not isinstance(data, dict):
+        abort(make_response(jsonify({'error': 'Expected JSON object'}), 400))
+    return data
+
 @app.route('/api/driver/login', methods=['POST'])
 def driver_login():
     """Driver logs in, gets today's orders"""
-    data = request.json
-    driver_id = data.get('driver_id')
-    phone = data.get('phone')
-    
-    if not driver_id or not phone:
-        return jsonify({'error': 'Missing driver_id or phone'}), 400
-    
-    driver = db.get_driver(driver_id)
-    if not driver or driver['phone'] != phone:
-        return jsonify({'error': 'Invalid credentials'}), 401
-    
-    # Update status to online
-    db.update_driver_status(driver_id, 'online')
-    
-    # Get today's orders
-    orders = db.get_orders_by_driver(driver_id)
-    
-    return jsonify({
-        'success': True,
-        'driver': driver,
-        'orders': orders
-    }), 200
+    payload, status = drivers.login(driver_body())
+    return jsonify(payload), status
 
 @app.route('/api/driver/status', methods=['POST'])
 def update_driver_status():
     """Update driver status (online/offline/on_delivery)"""
-    data = request.json
-    driver_id = data.get('driver_id')
-    status = data.get('status')  # online, offline, on_delivery
-    location = data.get('location')  # optional GPS
-    
-    if not driver_id or not status:
-        return jsonify({'error': 'Missing driver_id or status'}), 400
-    
-    db.update_driver_status(driver_id, status, location)
-    
-    return jsonify({'success': True, 'message': f'Status updated to {status}'}), 200
+    payload, status = drivers.update_status(driver_body())
+    return jsonify(payload), status
 
 @app.route('/api/driver/orders/<int:driver_id>', methods=['GET'])
 def get_driver_orders(driver_id):
-    """Get all orders for driver"""
-    orders = db.get_orders_by_driver(driver_id)
-    return jsonify({
-        'success': True,
-        'orders': orders,
-        'count': len(orders)
-    }), 200
+    """Orders for driver (?since=<sync_token> for changes only)"""
+    payload, status = drivers.orders(driver_id, request.args.get('since'))
+    return jsonify(payload), status
 
 @app.route('/api/driver/order/<int:order_id>/start', methods=['POST'])
 def start_delivery(order_id):
     """Driver starts delivery"""
-    data = request.json
-    driver_id = data.get('driver_id')
-    
-    order = db.get_order(order_id)
-    if not order:
-        return jsonify({'error': 'Order not found'}), 404
-    
-    db.update_order_status(order_id, 'in_transit')
-    
-    # Log message
-    db.log_message(
-        order_id=order_id,
-        from_type='driver',
-        from_id=driver_id,
-        message_text=f'Started delivery to {order["delivery_address"]}',
-        channel='system'
-    )
-    
-    return jsonify({
-        'success': True,
-        'message': 'Delivery started',
-        'order': db.get_order(order_id)
-    }), 200
+    payload, status = drivers.start_delivery(order_id, driver_body())
+    return jsonify(payload), status
 
 @app.route('/api/driver/order/<int:order_id>/complete', methods=['POST'])
 def complete_delivery(order_id):
     """Driver marks delivery as complete"""
-    data = request.json
-    driver_id = data.get('driver_id')
-    photo_path = data.get('photo_path')  # proof of delivery
-    signature_path = data.get('signature_path')
-    notes = data.get('notes', '')
-    
-    order = db.get_order(order_id)
-    if not order:
-        return jsonify({'error': 'Order not found'}), 404
-    
-    # Update order
-    update_data = {
-        'status': 'delivered',
-        'delivery_time': datetime.now().isoformat()
-    }
-    if photo_path:
-        update_data['photo_path'] = photo_path
-    if signature_path:
-        update_data['signature_path'] = signature_path
-    
-    db.update('orders', order_id, update_data)
-    
-    # Log message
-    db.log_message(
-        order_id=order_id,
-        from_type='driver',
-        from_id=driver_id,
-        message_text=f'Delivery completed. Notes: {notes}',
-        channel='system'
-    )
-    
-    # Create invoice automatically
-    invoice_id = db.create_invoice(
-        customer_id=order['customer_id'],
-        order_id=order_id,
-        total_amount=float(order['total_price']),
-        due_days=30
-    )
-    
-    # Create task for SECRETARY to send thank-you email
-    db.create_task(
-        title=f'Send delivery confirmation to {order["customer_id"]}',
-        task_type='send_email',
-        assigned_to='secretary',
-        related_order_id=order_id,
-        related_customer_id=order['customer_id']
-    )
-    
-    return jsonify({
-        'success': True,
-        'message': 'Delivery completed',
-        'invoice_id': invoice_id,
-        'order': db.get_order(order_id)
-    }), 200
+    payload, status = drivers.complete_delivery(order_id, driver_body())
+    return jsonify(payload), status
 
 @app.route('/api/driver/order/<int:order_id>/update', methods=['POST'])
 def update_order_message(order_id):
     """Driver sends location/status update"""
-    data = request.json
-    driver_id = data.get('driver_id')
-    message = data.get('message')  # e.g., "Delayed, traffic jam"
-    location = data.get('location')  # GPS location
-    
-    order = db.get_order(order_id)
-    if not order:
-        return jsonify({'error': 'Order not found'}), 404
-    
-    # Log the message
-    db.log_message(
-        order_id=order_id,
-        from_type='driver',
-        from_id=driver_id,
-        message_text=message,
-        channel='sms'
-    )
-    
-    # Update driver location
-    if location:
-        db.update_driver_status(driver_id, 'on_delivery', location)
-    
-    # Create task for COMMS agent to notify customer
-    db.create_task(
-        title=f'Notify customer: {message}',
-        task_type='notify_customer',
-        assigned_to='comms',
-        related_order_id=order_id,
-        related_customer_id=order['customer_id'],
-        priority='high'
-    )
-    
-    return jsonify({
-        'success': True,
-        'message': 'Update logged, customer will be notified'
-    }), 200
+    payload, status = drivers.update_order(order_id, driver_body())
+    return jsonify(payload), status
 
 # ============================================
 # CUSTOMER ENDPOINTS
 # ============================================
 
+def accept(kind: str):
+    """Queue payload for batched ingestion, answer 202 (duplicates get the first receipt)"""
+    try:
+        receipt = ingest.submit(kind, request.json, key=request.headers.get('Idempotency-Key'))
+    except ValueError as e:
+        return jsonify({'error': str(e)}), 400
+    return jsonify({'success': True, **receipt}), 202
+
 @app.route('/api/customer/order', methods=['POST'])
 def create_new_order():
-    """Customer creates new order"""
-    data = request.json
-    
-    # Find or create customer
-    customer = db.find_customer(email=data.get('email'))
-    if not customer:
-        customer_id = db.create_customer(
-            name=data.get('name'),
-            phone=data.get('phone'),
-            email=data.get('email'),
-            address=data.get('address'),
-            city=data.get('city')
-        )
-    else:
-        customer_id = customer['id']
-    
-    # Create order
-    order_id = db.create_order(
-        customer_id=customer_id,
-        pickup_address=data.get('pickup_address'),
-        delivery_address=data.get('delivery_address'),
-        base_price=float(data.get('price', 50.0)),
-        parcel_description=data.get('description'),
-        weight_kg=float(data.get('weight_kg', 0))
-    )
-    
-    # Create task for SCHEDULER to assign driver
-    db.create_task(
-        title=f'Assign driver for order #{order_id}',
-        task_type='assign_driver',
-        assigned_to='scheduler',
-        related_order_id=order_id,
-        priority='high'
-    )
-    
-    return jsonify({
-        'success': True,
-        'order_id': order_id,
-        'customer_id': customer_id,
-        'status': 'pending'
-    }), 201
+    """Customer creates new order (queued, order_id via /api/ingest/<id>)"""
+    return accept('order')
+
+@app.route('/api/ingest/<int:ingest_id>', methods=['GET'])
+def get_ingest_status(ingest_id):
+    """Status of a queued order/webhook (order_id / message_id once written)"""
+    receipt = ingest.get_receipt(ingest_id)
+    if not receipt:
+        return jsonify({'error': 'Not found'}), 404
+    return jsonify({'success': True, **receipt}), 200
 
 @app.route('/api/customer/order/<int:order_id>', methods=['GET'])
 def get_order_status(order_id):
@@ -314,32 +265,60 @@ def get_order_status(order_id):
     if order['assigned_driver_id']:
         driver = db.get_driver(order['assigned_driver_id'])
     
-    return jsonify({
+    # ETA from learned durations (dict lookups); tells the client when to ask again
+    prediction = eta.predict(order)
+    poll_after = eta.poll_interval(prediction)
+    
+    response = jsonify({
         'success': True,
         'order': order,
         'driver': driver,
-        'messages': messages
-    }), 200
+        'messages': messages,
+        'eta': prediction,
+        'poll_after_seconds': poll_after
+    })
+    response.headers['Cache-Control'] = f'private, max-age={poll_after}'
+    return response, 200
 
 # ============================================
 # ADMIN/BACKOFFICE ENDPOINTS
 # ============================================
 
+def read_db() -> LogisticsDB:
+    """Admin/analytics reads: snapshot within the staleness bound, else live DB"""
+    snapshot = snapshots.reader()
+    g.data_source = 'snapshot' if snapshot else 'live'
+    g.staleness = snapshots.staleness() if snapshot else 0.0
+    return snapshot or db
+
+@app.after_request
+def add_staleness_headers(response):
+    if 'data_source' in g:
+        response.headers['X-Data-Source'] = g.data_source
+        response.headers['X-Data-Staleness'] = f"{g.staleness:.1f}"
+    return response
+
 @app.route('/api/admin/dashboard', methods=['GET'])
 def get_dashboard():
     """Get admin dashboard summary"""
-    summary = db.get_summary()
+    summary = read_db().get_summary()
     return jsonify({
         'success': True,
         'summary': summary,
+        'snapshot': snapshots.status(),
         'timestamp': datetime.now().isoformat()
     }), 200
 
+@app.route('/api/admin/backlog', methods=['GET'])
+def get_backlog():
+    """Pending tasks per agent/priority, oldest task age, engine cycles and lag, admission counters"""
+    return jsonify({'success': True, 'backlog': backlog.report(), 'admission': admission.stats()}), 200
+
 @app.route('/api/admin/tasks', methods=['GET'])
 def get_pending_tasks():
     """Get all pending tasks for agents"""
     agent = request.args.get('agent')  # filter by agent if provided
-    tasks = db.get_pending_tasks(assigned_to=agent)
+    tasks = read_db().get_pending_tasks(assigned_to=agent)
     return jsonify({
         'success': True,
         'tasks': tasks,
@@ -349,42 +328,125 @@ def get_pending_tasks():
 @app.route('/api/admin/invoices/unpaid', methods=['GET'])
 def get_unpaid_invoices():
     """Get unpaid invoices"""
-    invoices = db.get_unpaid_invoices()
+    invoices = read_db().get_unpaid_invoices()
     return jsonify({
         'success': True,
         'invoices': invoices,
         'total_amount': sum(inv['total_amount'] for inv in invoices)
     }), 200
 
+@app.route('/api/admin/invoices/<int:invoice_id>/document', methods=['GET'])
+def get_invoice_document(invoice_id):
+    """Download rendered invoice (?format=pdf|html), renders on first access"""
+    fmt = request.args.get('format', 'pdf')
+    if fmt not in ('pdf', 'html'):
+        return jsonify({'error': 'format must be pdf or html'}), 400
+    
+    documents = invoice_renderer.render_one(invoice_id)
+    if documents is None:
+        return jsonify({'error': 'Invoice not found'}), 404
+    
+    return send_file(documents[fmt], mimetype='application/pdf' if fmt == 'pdf' else 'text/html')
+
 @app.route('/api/admin/drivers', methods=['GET'])
 def get_all_drivers():
     """Get all drivers"""
-    drivers = db.get_active_drivers()
+    drivers = read_db().get_active_drivers()
     return jsonify({
         'success': True,
         'drivers': drivers,
         'online_count': sum(1 for d in drivers if d['status'] == 'online')
     }), 200
 
+@app.route('/api/admin/search', methods=['GET'])
+def admin_search():
+    """Full-text search: ?q=...&type=orders&type=customers&page=1&per_page=20"""
+    result = search_index.search(
+        request.args.get('q', ''),
+        types=request.args.getlist('type') or None,
+        page=request.args.get('page', 1, type=int),
+        per_page=request.args.get('per_page', 20, type=int)
+    )
+    return jsonify({'success': True, **result}), 200
+
+def analytics_report(report):
+    """Refresh extracts (incremental), run report; ?from=YYYY-MM-DD&to=YYYY-MM-DD (exclusive)"""
+    try:
+        start, end = day_range(request.args.get('from'), request.args.get('to'))
+        analytics.refresh()
+        result = report(start, end)
+    except ValueError as e:
+        return jsonify({'error': f'Invalid parameter: {e}'}), 400
+    return jsonify({'success': True, **result, 'analytics': analytics.status()}), 200
+
+@app.route('/api/admin/analytics/revenue', methods=['GET'])
+def analytics_revenue():
+    """Delivered revenue per driver and day (&driver_id=)"""
+    driver_id = request.args.get('driver_id', type=int)
+    return analytics_report(lambda start, end: analytics.revenue(start, end, driver_id))
+
+@app.route('/api/admin/analytics/on-time', methods=['GET'])
+def analytics_on_time():
+    """On-time delivery rate per driver and overall"""
+    return analytics_report(analytics.on_time)
+
+@app.route('/api/admin/analytics/invoice-ageing', methods=['GET'])
+def analytics_invoice_ageing():
+    """Open invoice amounts by days past due (&as_of=YYYY-MM-DD)"""
+    as_of = request.args.get('as_of')
+    return analytics_report(lambda start, end: analytics.invoice_ageing(
+        to_day(as_of) if as_of else to_day(datetime.now().date())))
+
+@app.route('/api/admin/analytics/margins', methods=['GET'])
+def analytics_margins():
+    """Revenue minus expenses per driver"""
+    return analytics_report(analytics.margins)
+
+@app.route('/api/admin/analytics/assignments', methods=['GET'])
+def analytics_assignments():
+    """Driver assignments by status, completion rate"""
+    return analytics_report(lambda start, end: analytics.assignment_stats())
+
+@app.route('/api/events', methods=['GET'])
+def get_events():
+    """Change feed: ?after=<id> or ?consumer=<name>, &entity=orders, &wait=<s> long-polls"""
+    consumer = request.args.get('consumer')
+    after = request.args.get('after', type=int)
+    if after is None:
+        after = event_log.get_offset(consumer) if consumer else 0
+    limit = min(request.args.get('limit', 500, type=int), 5000)
+    head = event_log.latest()  # read first, like EventConsumer.poll
+    events = event_log.poll(
+        after,
+        entities=request.args.getlist('entity') or None,
+        limit=limit,
+        timeout=min(request.args.get('wait', 0, type=float), MAX_EVENT_WAIT)
+    )
+    last = events[-1]['id'] if events else after
+    return jsonify({
+        'success': True,
+        'events': events,
+        # A short page: nothing else matched up to head, skip past filtered-out events
+        'next': last if len(events) >= limit else max(head, last)
+    }), 200
+
+@app.route('/api/events/<consumer>/commit', methods=['POST'])
+def commit_event_offset(consumer):
+    """Store consumer offset: {"position": <last processed event id>}"""
+    position = (request.json or {}).get('position')
+    if not isinstance(position, int):
+        return jsonify({'error': 'Missing position'}), 400
+    event_log.commit(consumer, position)
+    return jsonify({'success': True, 'consumer': consumer, 'position': position}), 200
+
 # ============================================
 # WEBHOOK ENDPOINTS (for external integrations)
 # ============================================
 
 @app.route('/webhook/order/update', methods=['POST'])
 def webhook_order_update():
-    """Webhook for external order updates"""
-    data = request.json
-    
-    # Log to messages
-    db.log_message(
-        order_id=data.get('order_id'),
-        from_type='system',
-        from_id=0,
-        message_text=f"Webhook update: {data.get('message', 'Status changed')}",
-        channel='webhook'
-    )
-    
-    return jsonify({'success': True}), 200
+    """Webhook for external order updates (queued, logged to messages in batches)"""
+    return accept('webhook')
 
 # ============================================
 # AGENT COMMUNICATION ENDPOINTS
@@ -404,23 +466,42 @@ def acknowledge_task():
 def agent_send_message():
     """Agent sends message (email/SMS to driver/customer)"""
     data = request.json
-    
-    # Log to database
-    db.log_message(
-        order_id=data.get('order_id'),
-        from_type='system',
-        from_id=0,
+    order_id = data.get('order_id')
+    channel = data.get('channel', 'email')
+    to_type = data.get('to_type', 'customer')
+    to_id = data.get('to_id')
+    to_address = data.get('to_address')
+    
+    if not data.get('message'):
+        return jsonify({'error': 'Missing message'}), 400
+    
+    # Default recipient: the order's customer
+    if not to_address and order_id:
+        order = db.get_order(order_id)
+        customer = db.get_customer(order['customer_id']) if order else None
+        if customer:
+            to_type, to_id = 'customer', customer['id']
+            to_address = customer['email'] if channel == 'email' else customer['phone']
+    
+    if not to_address:
+        return jsonify({'error': 'Missing to_address or order_id'}), 400
+    
+    # Queue for the outbound dispatcher (logistik_dispatch.py)
+    message_id = db.queue_message(
+        order_id=order_id,
+        to_type=to_type,
+        to_id=to_id,
+        to_address=to_address,
         message_text=data.get('message'),
-        channel=data.get('channel', 'email')
+        channel=channel,
+        subject=data.get('subject')
     )
     
-    # TODO: Actually send via email/SMS API
-    # For now, just log
-    
     return jsonify({
         'success': True,
+        'message_id': message_id,
         'message': 'Message queued for sending'
-    }), 200
+    }), 202
 
 # ============================================
 # ERROR HANDLERS
@@ -438,15 +519,40 @@ def internal_error(error):
 # STARTUP
 # ============================================
 
+_background_started = False
+
+def start_background(flusher: bool = True):
+    """Index builds, snapshotter, ETA reload and (unless run separately) the ingest flusher, once per process"""
+    global _background_started
+    if _background_started:
+        return
+    _background_started = True
+    start_background_indexes(db)
+    if flusher:
+        ingest.start()
+    snapshots.start()
+    eta.start()
+
 if __name__ == '__main__':
+    import os
     import sys
     import argparse
     
     parser = argparse.ArgumentParser(description='Logistics API Server')
     parser.add_argument('--port', type=int, default=5000, help='Port to run on (default: 5000)')
+    parser.add_argument('--no-reload', action='store_true',
+                        help='No code reloader (supervised: one process, restartable)')
+    parser.add_argument('--no-flusher', action='store_true',
+                        help='Ingest queue flushed by a separate logistik_ingest.py process')
     args = parser.parse_args()
     
     port = args.port
+    assets.reload = not args.no_reload  # development: pick up edited dashboard files
+    
+    # Schema upgrades (no-op when current), big indexes build in background
+    migrate(db)
+    if args.no_reload or os.environ.get('WERKZEUG_RUN_MAIN') == 'true':  # reloader parent only watches files
+        start_background(flusher=not args.no_flusher)
     
     print("\n" + "="*60)
     print("🚀 LOGISTICS API + JARVIS DASHBOARDS STARTING...")
@@ -457,6 +563,8 @@ if __name__ == '__main__':
     print(f"  📱 Jarvis Mobile: http://localhost:{port}/jarvis/mobile")
     print("\n🔌 API ENDPOINTS:")
     print("  GET  /api/admin/dashboard")
+    print("  GET  /api/admin/backlog  (+ /healthz, /readyz)")
+    print("  GET  /api/admin/analytics/{revenue,on-time,invoice-ageing,margins,assignments}")
     print("  POST /api/customer/order")
     print("  POST /api/driver/order/{id}/complete")
     print("  POST /api/agent/send-message")
@@ -468,4 +576,4 @@ if __name__ == '__main__':
     print("Press CTRL+C to stop")
     print("="*60 + "\n")
     
-    app.run(debug=True, host='0.0.0.0', port=port)
+    app.run(debug=True, host='0.0.0.0', port=port, use_reloader=not args.no_reload)
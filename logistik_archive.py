@@ -0,0 +1,190 @@
+#!/usr/bin/env python3
+"""
+Archiver - Moves closed, old records into a cold archive database
+Hot DB keeps only what the system works on; everything closed and older
+than `max_age_days` moves to logistik_archive.db in small batches:
+    messages: inbound or delivered
+    tasks:    completed / cancelled
+    orders:   delivered (and invoiced) / cancelled
+Reads like get_order / get_order_messages fall through to the archive.
+
+After each run the freed pages are returned with incremental vacuum
+(new DBs are created with auto_vacuum=INCREMENTAL, older ones need
+a one-time --enable-incremental-vacuum).
+
+Run: python logistik_archive.py [--days 90] [--enable-incremental-vacuum]
+"""
+
+import sqlite3
+import time
+from datetime import date, timedelta
+from typing import Dict, List
+from logistik_config import CONFIG
+from logistik_db import LogisticsDB
+
+ARCHIVE_DAYS = CONFIG['archive_days']
+
+# table -> (WHERE for closed + old rows, indexes that keep the selection cheap)
+ARCHIVE_RULES = {
+    'messages': (
+        "sent_at < :cutoff AND (to_type = 'system' OR delivered_at IS NOT NULL)",
+        ["CREATE INDEX IF NOT EXISTS idx_messages_sent ON messages(sent_at)"],
+    ),
+    'tasks': (
+        "status IN ('completed', 'cancelled') AND COALESCE(completed_at, updated_at) < :cutoff",
+        ["""CREATE INDEX IF NOT EXISTS idx_tasks_closed ON tasks(COALESCE(completed_at, updated_at))
+              WHERE status IN ('completed', 'cancelled')"""],
+    ),
+    'orders': (
+        """status IN ('delivered', 'cancelled') AND COALESCE(delivery_time, created_at) < :cutoff
+           AND (status = 'cancelled' OR invoice_id IS NOT NULL
+                OR EXISTS (SELECT 1 FROM invoices i WHERE i.order_id = orders.id))""",
+        ["""CREATE INDEX IF NOT EXISTS idx_orders_closed ON orders(COALESCE(delivery_time, created_at))
+              WHERE status IN ('delivered', 'cancelled')"""],
+    ),
+}
+
+# Lookups on archived rows (invoice rendering reads lines by invoice_id)
+ARCHIVE_INDEXES = {
+    'orders': ["CREATE INDEX IF NOT EXISTS archive.idx_orders_invoice ON orders(invoice_id)"],
+}
+
+
+class Archiver:
+    """Batch mover hot -> archive"""
+
+    def __init__(self, db: LogisticsDB = None, max_age_days: int = ARCHIVE_DAYS,
+                 batch_size: int = 2000, vacuum_pages: int = 5000):
+        self.db = db or LogisticsDB()
+        self.max_age_days = max_age_days
+        self.batch_size = batch_size
+        self.vacuum_pages = vacuum_pages
+
+    def _connect(self) -> sqlite3.Connection:
+        conn = self.db.connect()
+        conn.isolation_level = None  # explicit BEGIN/COMMIT per batch
+        conn.execute("ATTACH DATABASE ? AS archive", (str(self.db.archive_path),))
+        return conn
+
+    def _prepare(self, conn, table: str) -> List[str]:
+        """Create/extend archive table to match hot table, return shared columns"""
+        for statement in ARCHIVE_RULES[table][1]:
+            conn.execute(statement)
+
+        create_sql = conn.execute(
+            "SELECT sql FROM main.sqlite_master WHERE type='table' AND name=?", (table,)
+        ).fetchone()[0]
+        conn.execute(create_sql.replace(f"CREATE TABLE {table}",
+                                        f"CREATE TABLE IF NOT EXISTS archive.{table}", 1))
+
+        hot = [row['name'] for row in conn.execute(f"PRAGMA main.table_info({table})")]
+        cold = {row['name'] for row in conn.execute(f"PRAGMA archive.table_info({table})")}
+        for column in hot:
+            if column not in cold:  # hot table got new columns since
+                conn.execute(f"ALTER TABLE archive.{table} ADD COLUMN {column}")
+        for statement in ARCHIVE_INDEXES.get(table, []):
+            conn.execute(statement)
+        return hot
+
+    def archive_table(self, conn, table: str, cutoff: str, max_batches: int = None) -> int:
+        """Move closed rows older than cutoff, one short transaction per batch"""
+        columns = ', '.join(self._prepare(conn, table))
+        where = ARCHIVE_RULES[table][0]
+        moved = 0
+        batches = 0
+
+        while max_batches is None or batches < max_batches:
+            conn.execute("BEGIN IMMEDIATE")
+            try:
+                conn.execute("DROP TABLE IF EXISTS temp.archive_batch")
+                conn.execute(f"""
+                    CREATE TEMP TABLE archive_batch AS
+                    SELECT id FROM main.{table} WHERE {where} LIMIT :limit
+                """, {'cutoff': cutoff, 'limit': self.batch_size})
+                count = conn.execute("SELECT COUNT(*) FROM temp.archive_batch").fetchone()[0]
+                if count:
+                    # OR REPLACE: re-running after a crash between the two DBs is harmless
+                    conn.execute(f"""
+                        INSERT OR REPLACE INTO archive.{table} ({columns})
+                        SELECT {columns} FROM main.{table}
+                        WHERE id IN (SELECT id FROM temp.archive_batch)
+                    """)
+                    conn.execute(f"""
+                        DELETE FROM main.{table} WHERE id IN (SELECT id FROM temp.archive_batch)
+                    """)
+                conn.execute("COMMIT")
+            except BaseException:
+                conn.execute("ROLLBACK")
+                raise
+
+            moved += count
+            batches += 1
+            if count < self.batch_size:
+                break
+        return moved
+
+    def run(self, max_batches: int = None) -> Dict:
+        """Archive all tables, then give free pages back to the OS"""
+        started = time.time()
+        cutoff = (date.today() - timedelta(days=self.max_age_days)).isoformat()
+        stats = {'cutoff': cutoff}
+
+        conn = self._connect()
+        try:
+            # Children first: messages/tasks still point to orders
+            for table in ('messages', 'tasks', 'orders'):
+                stats[table] = self.archive_table(conn, table, cutoff, max_batches)
+            stats['vacuumed_pages'] = self.incremental_vacuum(conn)
+        finally:
+            conn.close()
+
+        stats['seconds'] = round(time.time() - started, 2)
+        return stats
+
+    def incremental_vacuum(self, conn) -> int:
+        """Free up to `vacuum_pages` pages (only with auto_vacuum=INCREMENTAL)"""
+        if conn.execute("PRAGMA main.auto_vacuum").fetchone()[0] != 2:
+            return 0
+        free_before = conn.execute("PRAGMA main.freelist_count").fetchone()[0]
+        # executescript steps the pragma to completion (execute() frees one page)
+        conn.executescript(f"PRAGMA main.incremental_vacuum({int(self.vacuum_pages)})")
+        return free_before - conn.execute("PRAGMA main.freelist_count").fetchone()[0]
+
+    def enable_incremental_vacuum(self):
+        """One-time switch for existing DBs (full VACUUM, takes a while)"""
+        conn = self.db.connect()
+        conn.isolation_level = None
+        try:
+            conn.execute("PRAGMA auto_vacuum = INCREMENTAL")
+            conn.execute("VACUUM")
+        finally:
+            conn.close()
+
+
+# ============================================
+# STARTUP
+# ============================================
+
+if __name__ == "__main__":
+    import argparse
+    from logistik_migrations import migrate
+
+    parser = argparse.ArgumentParser(description='Archive closed records into cold storage')
+    parser.add_argument('--days', type=int, default=ARCHIVE_DAYS, help='Minimum age in days')
+    parser.add_argument('--batch-size', type=int, default=2000)
+    parser.add_argument('--enable-incremental-vacuum', action='store_true',
+                        help='Switch existing DB to auto_vacuum=INCREMENTAL (one-time VACUUM)')
+    args = parser.parse_args()
+
+    db = LogisticsDB()
+    migrate(db)
+    archiver = Archiver(db, max_age_days=args.days, batch_size=args.batch_size)
+
+    if args.enable_incremental_vacuum:
+        print("🧹 Enabling incremental vacuum (full VACUUM)...")
+        archiver.enable_incremental_vacuum()
+
+    print(f"📦 Archiving records closed before {args.days} days → {archiver.db.archive_path}")
+    stats = archiver.run()
+    print(f"✅ messages: {stats['messages']}, tasks: {stats['tasks']}, orders: {stats['orders']}, "
+          f"freed pages: {stats['vacuumed_pages']} ({stats['seconds']}s)")
@@ -0,0 +1,294 @@
+#!/usr/bin/env python3
+"""
+Batch Assignment - All pending orders to all online drivers at once
+Each scheduling cycle collects every unassigned order and every online
+driver and solves one cost-minimising assignment instead of handling
+assign_driver tasks one by one (result no longer depends on task order,
+load is balanced across drivers).
+
+Cost of giving order o to the k-th free slot of driver d:
+    area     0 same postal region (2 digits), 2 same zone (1 digit), 5 other
+             (driver area: PLZ in current_location, else last open order)
+    load     LOAD_WEIGHT * (open orders of d + k)
+    urgency  minus priority / deadline bonus (urgent orders win when
+             there are more orders than free slots)
+Drivers take at most MAX_NEW_PER_DRIVER orders per cycle and
+MAX_OPEN_ORDERS in total.
+
+Solver: Hungarian algorithm (exact) up to EXACT_MAX_CELLS cost cells,
+greedy by urgency with per-area load heaps above that (2,000 x 500 in
+well under a second). Assignments, notify_driver tasks and completed
+assign_driver tasks are written in ONE transaction.
+
+Run: python logistik_assignment.py [--dry-run]
+"""
+
+import heapq
+import json
+import re
+import time
+from datetime import datetime
+from typing import Dict, List, Optional, Tuple
+from logistik_db import LogisticsDB
+
+MAX_NEW_PER_DRIVER = 5
+MAX_OPEN_ORDERS = 8
+LOAD_WEIGHT = 1.0
+EXACT_MAX_CELLS = 40000  # orders x free slots solved exactly (pure Python Hungarian)
+PRIORITY_BONUS = {'urgent': 6.0, 'high': 3.0, 'normal': 0.0, 'low': -1.0}
+OPEN_STATUSES = ('assigned', 'picked_up', 'in_transit')
+POSTAL = re.compile(r'\b(\d{5})\b')
+
+
+def region(postal: Optional[str]) -> Optional[str]:
+    """2-digit postal region ('10115' -> '10'), None if unknown"""
+    postal = (postal or '').strip()
+    return postal[:2] if len(postal) >= 2 and postal[:2].isdigit() else None
+
+
+def area_cost(order_area: Optional[str], driver_area: Optional[str]) -> float:
+    if order_area is None or driver_area is None:
+        return 2.5
+    if order_area == driver_area:
+        return 0.0
+    return 2.0 if order_area[0] == driver_area[0] else 5.0
+
+
+def urgency(order: Dict, now: datetime) -> float:
+    bonus = PRIORITY_BONUS.get(order.get('priority') or 'normal', 0.0)
+    try:
+        hours_left = (datetime.fromisoformat(str(order['deadline'])) - now).total_seconds() / 3600
+    except (KeyError, TypeError, ValueError):
+        return bonus
+    if hours_left <= 2:
+        bonus += 4.0
+    elif hours_left <= 6:
+        bonus += 2.0
+    return bonus
+
+
+def hungarian(cost: List[List[float]]) -> List[int]:
+    """Minimum-cost assignment for n rows <= m columns, returns column per row
+
+    Shortest augmenting path version with potentials, O(n^2 m).
+    """
+    n, m = len(cost), len(cost[0]) if cost else 0
+    INF = float('inf')
+    u = [0.0] * (n + 1)
+    v = [0.0] * (m + 1)
+    p = [0] * (m + 1)  # p[j]: row matched to column j (1-based, 0 = free)
+    way = [0] * (m + 1)
+    for i in range(1, n + 1):
+        p[0] = i
+        j0 = 0
+        minv = [INF] * (m + 1)
+        used = [False] * (m + 1)
+        while True:
+            used[j0] = True
+            i0 = p[j0]
+            row = cost[i0 - 1]
+            ui0 = u[i0]
+            delta = INF
+            j1 = 0
+            for j in range(1, m + 1):
+                if not used[j]:
+                    current = row[j - 1] - ui0 - v[j]
+                    if current < minv[j]:
+                        minv[j] = current
+                        way[j] = j0
+                    if minv[j] < delta:
+                        delta = minv[j]
+                        j1 = j
+            for j in range(m + 1):
+                if used[j]:
+                    u[p[j]] += delta
+                    v[j] -= delta
+                else:
+                    minv[j] -= delta
+            j0 = j1
+            if p[j0] == 0:
+                break
+        while True:
+            j1 = way[j0]
+            p[j0] = p[j1]
+            j0 = j1
+            if j0 == 0:
+                break
+    result = [-1] * n
+    for j in range(1, m + 1):
+        if p[j]:
+            result[p[j] - 1] = j - 1
+    return result
+
+
+class BatchAssigner:
+    """One assignment cycle: collect, solve, write"""
+
+    def __init__(self, db: LogisticsDB = None, max_new_per_driver: int = MAX_NEW_PER_DRIVER,
+                 max_open_orders: int = MAX_OPEN_ORDERS, exact_max_cells: int = EXACT_MAX_CELLS):
+        self.db = db or LogisticsDB()
+        self.max_new_per_driver = max_new_per_driver
+        self.max_open_orders = max_open_orders
+        self.exact_max_cells = exact_max_cells
+
+    # ========== INPUT ==========
+
+    def pending_orders(self) -> List[Dict]:
+        return self.db.query("""
+            SELECT id, priority, deadline, pickup_postal FROM orders
+            WHERE status = 'pending' AND assigned_driver_id IS NULL
+            ORDER BY deadline
+        """)
+
+    def available_drivers(self) -> List[Dict]:
+        """Online drivers with free slots, their area and current load"""
+        drivers = self.db.query("SELECT id, name, current_location FROM drivers WHERE status = 'online'")
+        open_orders = self.db.query(f"""
+            SELECT open.driver_id, open.load, last.delivery_postal AS last_postal
+            FROM (SELECT assigned_driver_id AS driver_id, COUNT(*) AS load, MAX(id) AS last_id
+                  FROM orders
+                  WHERE status IN ({','.join('?' * len(OPEN_STATUSES))}) AND assigned_driver_id IS NOT NULL
+                  GROUP BY assigned_driver_id) open
+            JOIN orders last ON last.id = open.last_id
+        """, OPEN_STATUSES)
+        loads = {row['driver_id']: row for row in open_orders}
+        result = []
+        for driver in drivers:
+            load = loads.get(driver['id'])
+            open_count = load['load'] if load else 0
+            slots = min(self.max_new_per_driver, self.max_open_orders - open_count)
+            if slots <= 0:
+                continue
+            located = POSTAL.search(driver['current_location'] or '')
+            result.append({
+                'id': driver['id'], 'name': driver['name'], 'load': open_count, 'slots': slots,
+                'area': region(located.group(1)) if located else region(load['last_postal'] if load else None),
+            })
+        return result
+
+    # ========== SOLVERS ==========
+
+    def solve_exact(self, orders: List[Dict], drivers: List[Dict], now: datetime) -> List[Tuple[int, int]]:
+        """Hungarian over (order x driver slot); returns (order index, driver index)"""
+        slots = [(d, k) for d, driver in enumerate(drivers) for k in range(driver['slots'])]
+        bonus = [urgency(order, now) for order in orders]
+        areas = [region(order['pickup_postal']) for order in orders]
+        cost = [[area_cost(areas[o], drivers[d]['area']) + LOAD_WEIGHT * (drivers[d]['load'] + k) - bonus[o]
+                 for d, k in slots] for o in range(len(orders))]
+        if len(orders) <= len(slots):
+            return [(o, slots[s][0]) for o, s in enumerate(hungarian(cost))]
+        # More orders than slots: assign slots to orders (urgency decides who waits)
+        transposed = [list(column) for column in zip(*cost)]
+        return [(o, slots[s][0]) for s, o in enumerate(hungarian(transposed))]
+
+    def solve_greedy(self, orders: List[Dict], drivers: List[Dict], now: datetime) -> List[Tuple[int, int]]:
+        """Most urgent order first, to the cheapest driver (per-area heaps of current load)"""
+        heaps: Dict[Optional[str], List[Tuple[int, int]]] = {}
+        load = [driver['load'] for driver in drivers]
+        free = [driver['slots'] for driver in drivers]
+        for d, driver in enumerate(drivers):
+            heaps.setdefault(driver['area'], []).append((load[d], d))
+        for heap in heaps.values():
+            heapq.heapify(heap)
+
+        ranked = sorted(range(len(orders)), key=lambda o: (-urgency(orders[o], now), str(orders[o]['deadline'])))
+        result = []
+        for o in ranked:
+            order_area = region(orders[o]['pickup_postal'])
+            best, best_cost = None, None
+            for area, heap in heaps.items():
+                if heap:
+                    cost = area_cost(order_area, area) + LOAD_WEIGHT * heap[0][0]
+                    if best_cost is None or cost < best_cost:
+                        best, best_cost = area, cost
+            if best_cost is None:
+                break  # every slot taken
+            _, d = heapq.heappop(heaps[best])
+            result.append((o, d))
+            load[d] += 1
+            free[d] -= 1
+            if free[d]:
+                heapq.heappush(heaps[best], (load[d], d))
+        return result
+
+    # ========== CYCLE ==========
+
+    def run(self, dry_run: bool = False) -> Dict:
+        """Assign all pending orders, return stats"""
+        started = time.perf_counter()
+        now = datetime.now()
+        orders = self.pending_orders()
+        drivers = self.available_drivers() if orders else []
+        result = {'orders': len(orders), 'drivers': len(drivers), 'assigned': 0, 'method': None,
+                  'dry_run': dry_run}
+        if not orders or not drivers:
+            result['seconds'] = round(time.perf_counter() - started, 3)
+            return result
+
+        cells = len(orders) * sum(driver['slots'] for driver in drivers)
+        solve_started = time.perf_counter()
+        if cells <= self.exact_max_cells:
+            pairs, result['method'] = self.solve_exact(orders, drivers, now), 'hungarian'
+        else:
+            pairs, result['method'] = self.solve_greedy(orders, drivers, now), 'greedy'
+        result['solve_ms'] = round((time.perf_counter() - solve_started) * 1000, 1)
+
+        assignments = [(orders[o]['id'], drivers[d]) for o, d in pairs]
+        if dry_run:
+            result['assigned'] = len(assignments)
+            result['preview'] = [{'order_id': order_id, 'driver_id': driver['id']}
+                                 for order_id, driver in assignments]
+        else:
+            result['assigned'] = self._write(assignments, now)
+        result['unassigned'] = len(orders) - result['assigned']
+        result['seconds'] = round(time.perf_counter() - started, 3)
+        return result
+
+    def _write(self, assignments: List[Tuple[int, Dict]], now: datetime) -> int:
+        """Assignments + notify_driver tasks + close assign_driver tasks, one transaction"""
+        stamp = now.isoformat()
+        deadline = now.replace(microsecond=0).isoformat()
+        written = []
+        with self.db.transaction() as conn:
+            for order_id, driver in assignments:
+                # Guard: order may have been assigned/cancelled since it was read
+                changed = conn.execute("""
+                    UPDATE orders SET assigned_driver_id = ?, status = 'assigned', assigned_at = ?,
+                                      updated_at = CURRENT_TIMESTAMP
+                    WHERE id = ? AND status = 'pending' AND assigned_driver_id IS NULL
+                """, (driver['id'], stamp, order_id)).rowcount
+                if changed:
+                    written.append((order_id, driver))
+            conn.executemany("""
+                INSERT INTO tasks (title, task_type, assigned_to, status, priority,
+                                   related_order_id, related_driver_id, deadline)
+                VALUES (?, 'notify_driver', 'comms', 'pending', 'high', ?, ?, ?)
+            """, [(f"Notify {driver['name']} about order #{order_id}", order_id, driver['id'], deadline)
+                  for order_id, driver in written])
+            conn.execute("""
+                UPDATE tasks SET status = 'completed', completed_at = ?, updated_at = CURRENT_TIMESTAMP
+                WHERE task_type = 'assign_driver' AND status = 'pending'
+                  AND related_order_id IN (SELECT value FROM json_each(?))
+            """, (stamp, json.dumps([order_id for order_id, _ in written])))
+        return len(written)
+
+
+# ============================================
+# STARTUP
+# ============================================
+
+if __name__ == "__main__":
+    import argparse
+    from logistik_migrations import migrate
+
+    parser = argparse.ArgumentParser(description='Assign all pending orders to online drivers')
+    parser.add_argument('--dry-run', action='store_true', help='Solve, write nothing')
+    args = parser.parse_args()
+
+    db = LogisticsDB()
+    migrate(db)
+    stats = BatchAssigner(db).run(dry_run=args.dry_run)
+    print(f"🚗 Batch assignment {'(DRY RUN) ' if stats['dry_run'] else ''}"
+          f"{stats['orders']} orders × {stats['drivers']} drivers ({stats['method'] or '-'})")
+    print(f"✅ {stats['assigned']} assigned, {stats.get('unassigned', stats['orders'])} waiting "
+          f"in {stats['seconds']}s")
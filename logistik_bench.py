@@ -0,0 +1,134 @@
+#!/usr/bin/env python3
+"""
+API Benchmark - Response bytes and CPU per endpoint
+Seeds an in-memory DB, calls the large-payload endpoints through the Flask
+test client and reports per endpoint:
+    bytes   identity / gzip / deflate
+    CPU ms  per request (process time) without and with gzip
+    encode  ms for the JSON payload: stdlib json vs logistik_http.dumps
+
+Run: python logistik_bench.py [--orders 500] [--repeat 20] [--json]
+"""
+
+import json
+import os
+import time
+from datetime import datetime, timedelta
+from typing import Dict, List
+
+os.environ.setdefault('LOGISTIK_DB_PATH', ':memory:')  # before importing the API
+
+import logistik_api as api  # noqa: E402
+from logistik_http import dumps, loads, orjson  # noqa: E402
+from logistik_rows import jsonable  # noqa: E402
+
+
+def seed(db, orders: int) -> Dict[str, int]:
+    """Driver with `orders` orders, one long message thread, tasks and invoices"""
+    customer_id = db.create_customer('Bench GmbH', '+4930000000', 'Hauptstr. 1', email='bench@example.com',
+                                     city='Berlin', company_name='Bench GmbH')
+    driver_id = db.insert('drivers', {'name': 'Bench Driver', 'phone': '+4917000000', 'status': 'online'})
+    now = datetime.now()
+    day, first = db.sequences.reserve('ORD', orders)
+    with db.transaction() as conn:
+        conn.executemany("""
+            INSERT INTO orders (order_number, customer_id, pickup_address, delivery_address,
+                                parcel_description, weight_kg, base_price, total_price, status,
+                                assigned_driver_id, deadline)
+            VALUES (?, ?, 'Hauptstr. 10, 10115 Berlin', 'Nebenstr. 5, 80331 München',
+                    'Elektronik, zerbrechlich', 2.5, 49.9, 49.9, 'assigned', ?, ?)
+        """, [(f"ORD-{day}-{first + i:06d}", customer_id, driver_id,
+               (now + timedelta(hours=i)).isoformat()) for i in range(orders)])
+        order_id = conn.execute("SELECT MIN(id) FROM orders").fetchone()[0]
+        conn.executemany("""
+            INSERT INTO messages (order_id, from_type, from_id, to_type, to_id, message_text, channel)
+            VALUES (?, 'driver', ?, 'system', 0, ?, 'sms')
+        """, [(order_id, driver_id, f"Update {i}: Stau auf der A9, ca. 20 Minuten Verspätung")
+              for i in range(orders)])
+        conn.executemany("""
+            INSERT INTO tasks (title, task_type, assigned_to, status, priority, related_order_id, deadline)
+            VALUES (?, 'notify_customer', 'comms', 'pending', 'normal', ?, ?)
+        """, [(f"Notify customer about order #{order_id + i}", order_id + i, now.isoformat())
+              for i in range(orders)])
+        conn.executemany("""
+            INSERT INTO invoices (invoice_number, customer_id, order_id, subtotal, tax_amount,
+                                  total_amount, issue_date, due_date, status)
+            VALUES (?, ?, ?, 41.93, 7.97, 49.9, ?, ?, 'sent')
+        """, [(f"INV-{day}-{i + 1:06d}", customer_id, order_id + i, now.date().isoformat(),
+               (now + timedelta(days=30)).date().isoformat()) for i in range(orders)])
+    return {'driver_id': driver_id, 'order_id': order_id}
+
+
+def measure(client, path: str, repeat: int, accept: str) -> Dict:
+    started = time.process_time()
+    for _ in range(repeat):
+        response = client.get(path, headers={'Accept-Encoding': accept} if accept else {})
+    cpu_ms = (time.process_time() - started) * 1000 / repeat
+    return {'bytes': len(response.get_data()), 'cpu_ms': round(cpu_ms, 2),
+            'encoding': response.headers.get('Content-Encoding')}
+
+
+def encode_ms(payload, encoder, repeat: int) -> float:
+    started = time.process_time()
+    for _ in range(repeat):
+        encoder(payload)
+    return round((time.process_time() - started) * 1000 / repeat, 2)
+
+
+def run(orders: int = 500, repeat: int = 20) -> List[Dict]:
+    ids = seed(api.db, orders)
+    client = api.app.test_client()
+    endpoints = [
+        '/api/admin/tasks',
+        '/api/admin/invoices/unpaid',
+        f"/api/driver/orders/{ids['driver_id']}",
+        f"/api/customer/order/{ids['order_id']}",
+        '/api/admin/dashboard',
+    ]
+    results = []
+    for path in endpoints:
+        identity = measure(client, path, repeat, '')
+        gzipped = measure(client, path, repeat, 'gzip')
+        deflated = measure(client, path, repeat, 'deflate')
+        payload = loads(client.get(path).get_data())
+        results.append({
+            'endpoint': path,
+            'bytes_identity': identity['bytes'],
+            'bytes_gzip': gzipped['bytes'],
+            'bytes_deflate': deflated['bytes'],
+            'cpu_ms_identity': identity['cpu_ms'],
+            'cpu_ms_gzip': gzipped['cpu_ms'],
+            'encode_ms_stdlib': encode_ms(payload, lambda p: json.dumps(jsonable(p)).encode(), repeat),
+            'encode_ms_fast': encode_ms(payload, dumps, repeat),
+        })
+    return results
+
+
+# ============================================
+# STARTUP
+# ============================================
+
+if __name__ == "__main__":
+    import argparse
+
+    parser = argparse.ArgumentParser(description='Response size / CPU benchmark per endpoint')
+    parser.add_argument('--orders', type=int, default=500, help='Orders/messages/tasks/invoices to seed')
+    parser.add_argument('--repeat', type=int, default=20, help='Requests per measurement')
+    parser.add_argument('--json', action='store_true', help='Machine-readable output')
+    args = parser.parse_args()
+
+    results = run(args.orders, args.repeat)
+    if args.json:
+        print(json.dumps({'orders': args.orders, 'repeat': args.repeat,
+                          'fast_json': 'orjson' if orjson else 'stdlib', 'results': results}, indent=2))
+    else:
+        print("=" * 104)
+        print(f"📊 API BENCHMARK ({args.orders} rows, {args.repeat} requests each, "
+              f"fast JSON: {'orjson' if orjson else 'stdlib'})")
+        print("=" * 104)
+        print(f"{'Endpoint':34} {'identity':>9} {'gzip':>8} {'deflate':>8} "
+              f"{'cpu ms':>7} {'+gzip':>7} {'json ms':>8} {'fast ms':>8}")
+        for r in results:
+            print(f"{r['endpoint']:34} {r['bytes_identity']:>9} {r['bytes_gzip']:>8} {r['bytes_deflate']:>8} "
+                  f"{r['cpu_ms_identity']:>7} {r['cpu_ms_gzip']:>7} "
+                  f"{r['encode_ms_stdlib']:>8} {r['encode_ms_fast']:>8}")
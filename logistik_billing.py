@@ -0,0 +1,203 @@
+#!/usr/bin/env python3
+"""
+Billing Runs - Periodic consolidated invoicing
+Collects every delivered, not yet invoiced order and creates ONE invoice
+per customer and billing period. Totals and VAT are computed with
+set-based SQL inside a single transaction; due dates follow
+customers.payment_terms (days).
+
+Run: python logistik_billing.py [--period-end 2026-10-01] [--dry-run]
+"""
+
+from datetime import date, datetime, timedelta
+from typing import Dict, List, Optional, Tuple
+from logistik_db import LogisticsDB
+
+VAT_RATE = 0.19
+
+BILLING_RUNS_TABLE = """
+CREATE TABLE IF NOT EXISTS billing_runs (
+  id INTEGER PRIMARY KEY AUTOINCREMENT,
+  period_start DATE,
+  period_end DATE NOT NULL, -- exclusive: orders delivered before this day
+  status TEXT DEFAULT 'running', -- running, completed (one transaction: no partial runs)
+  customers INTEGER DEFAULT 0,
+  orders INTEGER DEFAULT 0,
+  invoices INTEGER DEFAULT 0,
+  total_amount DECIMAL(10, 2) DEFAULT 0,
+  started_at TIMESTAMP DEFAULT CURRENT_TIMESTAMP,
+  finished_at TIMESTAMP,
+  duration_ms INTEGER
+)
+"""
+
+# Orders waiting for a billing run (small partial index)
+UNINVOICED_INDEX = """
+CREATE INDEX IF NOT EXISTS idx_orders_uninvoiced ON orders(customer_id)
+  WHERE status = 'delivered' AND invoice_id IS NULL
+"""
+ORDER_INVOICE_INDEX = "CREATE INDEX IF NOT EXISTS idx_orders_invoice ON orders(invoice_id)"
+INVOICE_RUN_INDEX = """
+CREATE INDEX IF NOT EXISTS idx_invoices_billing_run ON invoices(billing_run_id, customer_id)
+"""
+INVOICE_ORDER_INDEX = "CREATE INDEX IF NOT EXISTS idx_invoices_order ON invoices(order_id)"
+
+# Candidate orders: delivered before period end, never invoiced (also not by
+# the old one-invoice-per-order path, which only set invoices.order_id)
+CANDIDATES_SQL = """
+SELECT o.id, o.customer_id, o.total_price
+FROM orders o
+WHERE o.status = 'delivered' AND o.invoice_id IS NULL
+  AND o.delivery_time < :period_end
+  AND NOT EXISTS (SELECT 1 FROM invoices i WHERE i.order_id = o.id)
+"""
+
+# One row per customer; order prices are gross (incl. VAT), as in create_invoice
+TOTALS_SQL = """
+SELECT b.customer_id,
+       COUNT(*) AS order_count,
+       ROUND(SUM(b.total_price), 2) AS total_amount,
+       ROUND(SUM(b.total_price) / (1 + :vat), 2) AS subtotal,
+       ROUND(SUM(b.total_price), 2) - ROUND(SUM(b.total_price) / (1 + :vat), 2) AS tax_amount,
+       COALESCE(CAST(NULLIF(c.payment_terms, '') AS INTEGER), 30) AS payment_terms_days
+FROM billing_candidates b JOIN customers c ON c.id = b.customer_id
+GROUP BY b.customer_id
+"""
+
+
+def previous_month(today: date = None) -> Tuple[date, date]:
+    """Default billing period: last calendar month [start, end)"""
+    today = today or date.today()
+    end = today.replace(day=1)
+    start = (end - timedelta(days=1)).replace(day=1)
+    return start, end
+
+
+class BillingRun:
+    """Consolidated invoicing for one billing period"""
+
+    def __init__(self, db: LogisticsDB = None, vat_rate: float = VAT_RATE):
+        self.db = db or LogisticsDB()
+        self.vat_rate = vat_rate
+
+    def _collect(self, conn, period_end: str) -> List[Dict]:
+        conn.execute("DROP TABLE IF EXISTS temp.billing_candidates")
+        conn.execute(f"CREATE TEMP TABLE billing_candidates AS {CANDIDATES_SQL}",
+                     {'period_end': period_end})
+        return [dict(row) for row in conn.execute(TOTALS_SQL, {'vat': self.vat_rate})]
+
+    def run(self, period_start: Optional[str] = None, period_end: Optional[str] = None,
+            dry_run: bool = False) -> Dict:
+        """Invoice all uninvoiced deliveries before period_end
+
+        dry_run computes the same totals and rolls everything back.
+        Returns run stats incl. throughput.
+        """
+        if not period_end:
+            start, end = previous_month()
+            period_start, period_end = period_start or start.isoformat(), end.isoformat()
+
+        started = datetime.now()
+        issue_date = date.today().isoformat()
+        result = {'period_start': period_start, 'period_end': period_end, 'dry_run': dry_run}
+
+        conn = self.db.connect()
+        conn.isolation_level = None
+        try:
+            conn.execute("BEGIN IMMEDIATE")
+            totals = self._collect(conn, period_end)
+
+            result.update({
+                'customers': len(totals),
+                'orders': sum(t['order_count'] for t in totals),
+                'invoices': len(totals),
+                'total_amount': round(sum(t['total_amount'] for t in totals), 2),
+            })
+
+            if dry_run:
+                result['preview'] = totals
+                conn.execute("ROLLBACK")
+            else:
+                # Invoice numbers: one consecutive range for the whole run
+                day, first_number = self.db.sequences.reserve('INV', len(totals), conn=conn)
+                
+                run_id = conn.execute("""
+                    INSERT INTO billing_runs (period_start, period_end, customers, orders,
+                                              invoices, total_amount)
+                    VALUES (?, ?, ?, ?, ?, ?)
+                """, (period_start, period_end, result['customers'], result['orders'],
+                      result['invoices'], result['total_amount'])).lastrowid
+
+                conn.execute(f"""
+                    INSERT INTO invoices (invoice_number, customer_id, billing_run_id,
+                                          issue_date, due_date, payment_terms_days,
+                                          subtotal, tax_rate, tax_amount, total_amount, status)
+                    SELECT 'INV-' || :day || '-' || printf('%06d', :first - 1
+                               + ROW_NUMBER() OVER (ORDER BY t.customer_id)),
+                           t.customer_id, :run, :issue,
+                           date(:issue, '+' || t.payment_terms_days || ' days'),
+                           t.payment_terms_days, t.subtotal, :vat, t.tax_amount,
+                           t.total_amount, 'draft'
+                    FROM ({TOTALS_SQL}) t
+                """, {'issue': issue_date, 'run': run_id, 'vat': self.vat_rate,
+                      'day': day, 'first': first_number})
+
+                conn.execute("""
+                    UPDATE orders SET invoice_id = (
+                        SELECT i.id FROM invoices i
+                        WHERE i.billing_run_id = :run AND i.customer_id = orders.customer_id
+                    )
+                    WHERE id IN (SELECT id FROM billing_candidates)
+                """, {'run': run_id})
+
+                duration_ms = int((datetime.now() - started).total_seconds() * 1000)
+                conn.execute("""
+                    UPDATE billing_runs SET status='completed', finished_at=?, duration_ms=?
+                    WHERE id=?
+                """, (datetime.now().isoformat(), duration_ms, run_id))
+                conn.execute("COMMIT")
+                result['run_id'] = run_id
+        except BaseException:
+            if conn.in_transaction:
+                conn.execute("ROLLBACK")
+            raise
+        finally:
+            conn.close()
+
+        seconds = (datetime.now() - started).total_seconds()
+        result['seconds'] = round(seconds, 3)
+        result['orders_per_sec'] = round(result['orders'] / seconds, 1) if seconds else None
+        return result
+
+    def get_runs(self, limit: int = 20) -> List[Dict]:
+        """Recent billing runs (newest first)"""
+        return self.db.query("SELECT * FROM billing_runs ORDER BY id DESC LIMIT ?", (limit,))
+
+
+# ============================================
+# STARTUP
+# ============================================
+
+if __name__ == "__main__":
+    import argparse
+    from logistik_migrations import migrate
+
+    parser = argparse.ArgumentParser(description='Consolidated billing run')
+    parser.add_argument('--period-start', help='Label for period start (YYYY-MM-DD)')
+    parser.add_argument('--period-end', help='Invoice deliveries before this day (default: 1st of month)')
+    parser.add_argument('--dry-run', action='store_true', help='Compute totals, write nothing')
+    args = parser.parse_args()
+
+    db = LogisticsDB()
+    migrate(db)
+    billing = BillingRun(db)
+    stats = billing.run(args.period_start, args.period_end, dry_run=args.dry_run)
+
+    print(f"💰 Billing run {'(DRY RUN) ' if stats['dry_run'] else ''}"
+          f"{stats['period_start'] or '...'} → {stats['period_end']}")
+    for row in stats.get('preview', []):
+        print(f"   Customer #{row['customer_id']}: {row['order_count']} orders, "
+              f"€{row['total_amount']:.2f} (net €{row['subtotal']:.2f})")
+    print(f"✅ {stats['invoices']} invoices, {stats['orders']} orders, "
+          f"€{stats['total_amount']:.2f} in {stats['seconds']}s "
+          f"({stats['orders_per_sec']} orders/s)")
@@ -0,0 +1,81 @@
+#!/usr/bin/env python3
+"""
+Configuration - Paths and settings for all components
+Priority: environment variable > config file > defaults
+
+Config file (JSON): $LOGISTIK_CONFIG, otherwise logistik.json next to
+this file if it exists. Example:
+    {"db_path": "/srv/logistik/logistik.db", "archive_days": 60}
+
+Use db_path ":memory:" for tests (schema is created automatically).
+"""
+
+import json
+import os
+from pathlib import Path
+from typing import Any, Dict
+
+PROJECT_ROOT = Path(__file__).parent
+
+DEFAULTS = {
+    'db_path': '/data/.openclaw/workspace/logistik.db',
+    'archive_path': None,  # default: <db>_archive.db next to the DB
+    'ingest_path': None,  # default: <db>_ingest.db next to the DB
+    'snapshot_path': None,  # default: <db>_snapshot.db next to the DB
+    'snapshot_max_staleness': 30,  # seconds; older snapshots are not used for reads
+    'invoice_dir': str(PROJECT_ROOT / 'documents' / 'invoices'),
+    'archive_days': 90,
+    'gateway_port': 5001,  # asyncio driver gateway (logistik_gateway.py)
+    'busy_timeout': 5,  # seconds to wait for another process's write lock
+    'log_level': 'INFO',  # DEBUG logs every engine task
+    'log_dir': str(PROJECT_ROOT / 'logs'),  # START_SYSTEM child process logs (rotated)
+    'engine_workers': 0,  # supervised workflow engine processes, 0 = one per CPU
+    'assignment_mode': 'batch',  # 'batch' (logistik_assignment.py) or 'single' (one task at a time)
+    'api_clients': [],  # known X-API-Key values, rate limited per key (others per remote address)
+}
+
+ENV_VARS = {
+    'db_path': 'LOGISTIK_DB_PATH',
+    'archive_path': 'LOGISTIK_ARCHIVE_PATH',
+    'ingest_path': 'LOGISTIK_INGEST_PATH',
+    'snapshot_path': 'LOGISTIK_SNAPSHOT_PATH',
+    'snapshot_max_staleness': 'LOGISTIK_SNAPSHOT_MAX_STALENESS',
+    'invoice_dir': 'LOGISTIK_INVOICE_DIR',
+    'archive_days': 'LOGISTIK_ARCHIVE_DAYS',
+    'gateway_port': 'LOGISTIK_GATEWAY_PORT',
+    'busy_timeout': 'LOGISTIK_BUSY_TIMEOUT',
+    'log_level': 'LOGISTIK_LOG_LEVEL',
+    'log_dir': 'LOGISTIK_LOG_DIR',
+    'engine_workers': 'LOGISTIK_ENGINE_WORKERS',
+    'assignment_mode': 'LOGISTIK_ASSIGNMENT_MODE',
+    'api_clients': 'LOGISTIK_API_CLIENTS',  # comma-separated
+}
+
+
+def load_config(path: str = None) -> Dict[str, Any]:
+    """Merge defaults, config file and environment"""
+    config = dict(DEFAULTS)
+
+    path = path or os.environ.get('LOGISTIK_CONFIG')
+    config_file = Path(path) if path else PROJECT_ROOT / 'logistik.json'
+    if config_file.exists():
+        with open(config_file) as f:
+            config.update(json.load(f))
+    elif path:
+        raise FileNotFoundError(f"Config file not found: {config_file}")
+
+    for key, var in ENV_VARS.items():
+        if os.environ.get(var):
+            config[key] = os.environ[var]
+
+    config['archive_days'] = int(config['archive_days'])
+    config['gateway_port'] = int(config['gateway_port'])
+    config['snapshot_max_staleness'] = float(config['snapshot_max_staleness'])
+    config['busy_timeout'] = float(config['busy_timeout'])
+    config['engine_workers'] = int(config['engine_workers'])
+    if isinstance(config['api_clients'], str):
+        config['api_clients'] = [key.strip() for key in config['api_clients'].split(',') if key.strip()]
+    return config
+
+
+CONFIG = load_config()
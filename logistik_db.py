@@ -5,62 +5,137 @@ Simple API for agents to read/write data
 """
 
 import sqlite3
+import itertools
+from contextlib import contextmanager
 from pathlib import Path
 from datetime import datetime, timedelta
 from typing import List, Dict, Optional
 import json
+from logistik_config import CONFIG
+from logistik_sequences import SequenceAllocator
+from logistik_rows import compact_rows
+from logistik_writer import WriteQueue, retry_busy
 
-DB_PATH = Path("/data/.openclaw/workspace/logistik.db")
+DB_PATH = Path(CONFIG['db_path'])  # LOGISTIK_DB_PATH / logistik.json, ':memory:' for tests
+ARCHIVE_PATH = CONFIG['archive_path']
+BUSY_TIMEOUT = CONFIG['busy_timeout']  # seconds SQLite waits for another process's lock
+
+_memory_ids = itertools.count(1)
 
 class LogisticsDB:
     """Simple SQLite wrapper for agents"""
     
-    def __init__(self, db_path=DB_PATH):
+    def __init__(self, db_path=DB_PATH, archive_path=ARCHIVE_PATH, compact_rows: bool = False):
         self.db_path = db_path
+        # compact_rows: query() returns tuple-based rows (logistik_rows.py)
+        # instead of dicts - same read access, a fraction of the memory
+        self.compact_rows = compact_rows
+        self.in_memory = str(db_path) == ':memory:'
+        
+        if self.in_memory:
+            # Shared-cache in-memory DB: every connection of this instance sees
+            # the same data; the keepalive connection holds it open
+            self._dsn = f"file:logistik-mem-{next(_memory_ids)}?mode=memory&cache=shared"
+            self._keepalive = sqlite3.connect(self._dsn, uri=True)
+            self.archive_path = archive_path
+        else:
+            self._dsn = str(db_path)
+            # Cold storage for old records (see logistik_archive.py)
+            self.archive_path = archive_path or Path(db_path).with_name(f"{Path(db_path).stem}_archive.db")
+        
+        self.sequences = SequenceAllocator(self)  # ORD-/INV- numbers
+        # insert/update/execute: one writer thread, group commit (logistik_writer.py)
+        self.writer = WriteQueue(self)
+        self._wal = self.in_memory  # file DBs are switched to WAL on first connect
+        
+        if self.in_memory:
+            from logistik_migrations import migrate
+            migrate(self)
     
-    def query(self, sql: str, params: tuple = ()) -> List[Dict]:
-        """Execute SELECT query, return list of dicts"""
-        conn = sqlite3.connect(str(self.db_path))
+    def connect(self) -> sqlite3.Connection:
+        """Open a new connection (caller closes it)"""
+        conn = sqlite3.connect(self._dsn, uri=self.in_memory, timeout=BUSY_TIMEOUT)
         conn.row_factory = sqlite3.Row
-        cursor = conn.cursor()
+        if not self._wal:
+            # Readers don't block the writer (and vice versa); persistent per DB file
+            retry_busy(lambda: conn.execute("PRAGMA journal_mode=WAL"))
+            self._wal = True
+        if not self.in_memory:
+            conn.execute("PRAGMA synchronous=NORMAL")  # WAL: fsync at checkpoint, still crash-safe
+        return conn
+    
+    @contextmanager
+    def transaction(self):
+        """Run several statements in one write transaction
         
+        Usage:
+            with db.transaction() as conn:
+                conn.execute(...)
+                conn.execute(...)
+        """
+        conn = self.connect()
+        conn.isolation_level = None  # manage BEGIN/COMMIT ourselves
         try:
-            cursor.execute(sql, params)
-            rows = cursor.fetchall()
-            return [dict(row) for row in rows]
+            retry_busy(lambda: conn.execute("BEGIN IMMEDIATE"))
+            yield conn
+            conn.execute("COMMIT")
+        except BaseException:
+            if conn.in_transaction:
+                conn.execute("ROLLBACK")
+            raise
+        finally:
+            conn.close()
+    
+    def execute(self, sql: str, params: tuple = ()) -> int:
+        """Execute write statement, return affected row count"""
+        return self.writer.run(lambda conn: conn.execute(sql, params).rowcount)
+    
+    def query_archive(self, sql: str, params: tuple = ()) -> List[Dict]:
+        """Execute SELECT against the archive DB (empty if there is none yet)"""
+        if not self.archive_path or not Path(self.archive_path).exists():
+            return []
+        conn = sqlite3.connect(f"file:{self.archive_path}?mode=ro", uri=True)
+        try:
+            return self._fetch(conn, sql, params)
+        except sqlite3.OperationalError:
+            return []  # Table not archived yet
+        finally:
+            conn.close()
+    
+    def _fetch(self, conn: sqlite3.Connection, sql: str, params: tuple) -> List[Dict]:
+        """Run SELECT, build dicts or compact rows"""
+        conn.row_factory = None  # plain tuples, wrapped below
+        cursor = conn.execute(sql, params)
+        rows = cursor.fetchall()
+        if self.compact_rows:
+            return compact_rows(cursor, rows)
+        if not rows:
+            return []
+        columns = [d[0] for d in cursor.description]
+        return [dict(zip(columns, row)) for row in rows]
+    
+    def query(self, sql: str, params: tuple = ()) -> List[Dict]:
+        """Execute SELECT query, return list of dicts (or compact rows)"""
+        conn = self.connect()
+        try:
+            return self._fetch(conn, sql, params)
         finally:
             conn.close()
     
     def insert(self, table: str, data: Dict) -> int:
         """Insert row, return id"""
-        conn = sqlite3.connect(str(self.db_path))
-        cursor = conn.cursor()
-        
         columns = ', '.join(data.keys())
         placeholders = ', '.join('?' * len(data))
         sql = f"INSERT INTO {table} ({columns}) VALUES ({placeholders})"
-        
-        try:
-            cursor.execute(sql, tuple(data.values()))
-            conn.commit()
-            return cursor.lastrowid
-        finally:
-            conn.close()
+        params = tuple(data.values())
+        return self.writer.run(lambda conn: conn.execute(sql, params).lastrowid)
     
     def update(self, table: str, id: int, data: Dict) -> bool:
         """Update row by id"""
-        conn = sqlite3.connect(str(self.db_path))
-        cursor = conn.cursor()
-        
         set_clause = ', '.join(f"{k}=?" for k in data.keys())
         sql = f"UPDATE {table} SET {set_clause}, updated_at=CURRENT_TIMESTAMP WHERE id=?"
-        
-        try:
-            cursor.execute(sql, tuple(list(data.values()) + [id]))
-            conn.commit()
-            return cursor.rowcount > 0
-        finally:
-            conn.close()
+        params = tuple(list(data.values()) + [id])
+        return self.writer.run(lambda conn: conn.execute(sql, params).rowcount > 0)
     
     # ========== CUSTOMER FUNCTIONS ==========
     
@@ -97,6 +172,8 @@ class LogisticsDB:
     def get_order(self, order_id: int) -> Optional[Dict]:
         """Get order by ID"""
         results = self.query("SELECT * FROM orders WHERE id=?", (order_id,))
+        if not results:
+            results = self.query_archive("SELECT * FROM orders WHERE id=?", (order_id,))
         return results[0] if results else None
     
     def get_orders_by_status(self, status: str) -> List[Dict]:
@@ -119,8 +196,7 @@ class LogisticsDB:
     def create_order(self, customer_id: int, pickup_address: str, delivery_address: str,
                     base_price: float, deadline: str = None, **kwargs) -> int:
         """Create new order"""
-        import uuid
-        order_number = f"ORD-{datetime.now().strftime('%Y%m%d')}-{str(uuid.uuid4())[:8].upper()}"
+        order_number = self.sequences.next_number('ORD')
         
         data = {
             'order_number': order_number,
@@ -184,8 +260,7 @@ class LogisticsDB:
     def create_invoice(self, customer_id: int, order_id: int, 
                       total_amount: float, due_days: int = 30) -> int:
         """Create invoice for order"""
-        import uuid
-        invoice_number = f"INV-{datetime.now().strftime('%Y%m%d')}-{str(uuid.uuid4())[:6].upper()}"
+        invoice_number = self.sequences.next_number('INV')
         due_date = (datetime.now() + timedelta(days=due_days)).date()
         
         data = {
@@ -229,12 +304,44 @@ class LogisticsDB:
         }
         return self.insert('messages', data)
     
+    def queue_message(self, order_id: Optional[int], to_type: str, to_id: int,
+                      to_address: str, message_text: str, channel: str = 'sms',
+                      subject: str = None, complete_task_id: int = None) -> int:
+        """Queue outbound message for the dispatcher (see logistik_dispatch.py)
+        
+        The row stays undelivered (delivered_at IS NULL) until a dispatcher
+        worker has handed it to the channel. complete_task_id: that task is
+        completed in the same transaction (no lost or duplicate message if
+        the process dies in between).
+        """
+        data = {
+            'order_id': order_id,
+            'from_type': 'system',
+            'from_id': 0,
+            'to_type': to_type,
+            'to_id': to_id,
+            'to_address': to_address,
+            'subject': subject,
+            'message_text': message_text,
+            'channel': channel
+        }
+        if complete_task_id is None:
+            return self.insert('messages', data)
+        with self.transaction() as conn:
+            message_id = conn.execute(
+                f"INSERT INTO messages ({', '.join(data)}) VALUES ({', '.join('?' * len(data))})",
+                tuple(data.values())
+            ).lastrowid
+            conn.execute(
+                "UPDATE tasks SET status='completed', completed_at=?, updated_at=CURRENT_TIMESTAMP WHERE id=?",
+                (datetime.now().isoformat(), complete_task_id)
+            )
+        return message_id
+    
     def get_order_messages(self, order_id: int) -> List[Dict]:
-        """Get all messages for order"""
-        return self.query(
-            "SELECT * FROM messages WHERE order_id=? ORDER BY sent_at DESC",
-            (order_id,)
-        )
+        """Get all messages for order (hot + archived, newest first)"""
+        sql = "SELECT * FROM messages WHERE order_id=? ORDER BY sent_at DESC"
+        return self.query(sql, (order_id,)) + self.query_archive(sql, (order_id,))
     
     # ========== TASK FUNCTIONS ==========
     
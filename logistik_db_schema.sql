@@ -3,6 +3,20 @@
 -- ============================================
 -- Created for Sero's AI Logistics Agent Team
 
+-- Fresh installs: applied by logistik_migrations.py (migration 1).
+-- Existing DBs are upgraded by the numbered migrations there.
+
+-- Free pages are returned by logistik_archive.py (PRAGMA incremental_vacuum)
+PRAGMA auto_vacuum = INCREMENTAL;
+
+-- SCHEMA MIGRATIONS (version history; current version = PRAGMA user_version)
+CREATE TABLE IF NOT EXISTS schema_migrations (
+  version INTEGER PRIMARY KEY,
+  name TEXT NOT NULL,
+  background BOOLEAN DEFAULT 0,
+  applied_at TIMESTAMP -- NULL: background index not built yet
+);
+
 -- CUSTOMERS TABLE
 CREATE TABLE IF NOT EXISTS customers (
   id INTEGER PRIMARY KEY AUTOINCREMENT,
@@ -41,13 +55,14 @@ CREATE TABLE IF NOT EXISTS drivers (
   last_active TIMESTAMP,
   notes TEXT,
   created_at TIMESTAMP DEFAULT CURRENT_TIMESTAMP,
+  updated_at TIMESTAMP DEFAULT CURRENT_TIMESTAMP,
   FOREIGN KEY(current_order_id) REFERENCES orders(id)
 );
 
 -- ORDERS TABLE (Core)
 CREATE TABLE IF NOT EXISTS orders (
   id INTEGER PRIMARY KEY AUTOINCREMENT,
-  order_number TEXT NOT NULL UNIQUE, -- e.g., '2024-001', auto-generated
+  order_number TEXT NOT NULL UNIQUE, -- e.g., 'ORD-20261019-000042', see logistik_sequences.py
   customer_id INTEGER NOT NULL,
   
   -- Pickup Details
@@ -82,6 +97,7 @@ CREATE TABLE IF NOT EXISTS orders (
   
   -- Timeline
   created_at TIMESTAMP DEFAULT CURRENT_TIMESTAMP,
+  updated_at TIMESTAMP DEFAULT CURRENT_TIMESTAMP,
   assigned_at TIMESTAMP,
   pickup_time TIMESTAMP,
   delivery_time TIMESTAMP,
@@ -96,8 +112,12 @@ CREATE TABLE IF NOT EXISTS orders (
   signature_path TEXT, -- image path
   photo_path TEXT, -- delivery proof
   
+  -- Billing
+  invoice_id INTEGER, -- set by billing run (NULL = not invoiced yet)
+  
   FOREIGN KEY(customer_id) REFERENCES customers(id),
-  FOREIGN KEY(assigned_driver_id) REFERENCES drivers(id)
+  FOREIGN KEY(assigned_driver_id) REFERENCES drivers(id),
+  FOREIGN KEY(invoice_id) REFERENCES invoices(id)
 );
 
 -- DRIVER ASSIGNMENTS (History tracking)
@@ -118,9 +138,10 @@ CREATE TABLE IF NOT EXISTS driver_assignments (
 -- INVOICES TABLE
 CREATE TABLE IF NOT EXISTS invoices (
   id INTEGER PRIMARY KEY AUTOINCREMENT,
-  invoice_number TEXT NOT NULL UNIQUE, -- e.g., 'INV-2024-001'
-  order_id INTEGER,
+  invoice_number TEXT NOT NULL UNIQUE, -- e.g., 'INV-20261019-000042'
+  order_id INTEGER, -- single-order invoices only; billing runs link via orders.invoice_id
   customer_id INTEGER NOT NULL,
+  billing_run_id INTEGER,
   
   -- Invoice Details
   issue_date DATE NOT NULL,
@@ -150,6 +171,94 @@ CREATE TABLE IF NOT EXISTS invoices (
   FOREIGN KEY(customer_id) REFERENCES customers(id)
 );
 
+-- BILLING RUNS (Consolidated invoicing, see logistik_billing.py)
+CREATE TABLE IF NOT EXISTS billing_runs (
+  id INTEGER PRIMARY KEY AUTOINCREMENT,
+  period_start DATE,
+  period_end DATE NOT NULL, -- exclusive: orders delivered before this day
+  status TEXT DEFAULT 'running', -- running, completed (one transaction: no partial runs)
+  customers INTEGER DEFAULT 0,
+  orders INTEGER DEFAULT 0,
+  invoices INTEGER DEFAULT 0,
+  total_amount DECIMAL(10, 2) DEFAULT 0,
+  started_at TIMESTAMP DEFAULT CURRENT_TIMESTAMP,
+  finished_at TIMESTAMP,
+  duration_ms INTEGER
+);
+
+-- PAYROLL (Driver wages per pay period, see logistik_payroll.py)
+CREATE TABLE IF NOT EXISTS payroll_runs (
+  id INTEGER PRIMARY KEY AUTOINCREMENT,
+  period_start DATE NOT NULL,
+  period_end DATE NOT NULL, -- exclusive
+  status TEXT DEFAULT 'running', -- running, completed (one transaction: no partial runs)
+  incremental BOOLEAN DEFAULT 0,
+  drivers INTEGER DEFAULT 0, -- drivers recomputed by this run
+  deliveries INTEGER DEFAULT 0,
+  net_total DECIMAL(10, 2) DEFAULT 0, -- whole period after this run
+  change_seq INTEGER, -- order_changes position the run has seen
+  expense_id INTEGER, -- highest expenses.id seen
+  assignment_id INTEGER, -- highest driver_assignments.id seen
+  started_at TIMESTAMP DEFAULT CURRENT_TIMESTAMP,
+  finished_at TIMESTAMP,
+  duration_ms INTEGER
+);
+
+CREATE TABLE IF NOT EXISTS driver_payroll (
+  period_start DATE NOT NULL,
+  period_end DATE NOT NULL,
+  driver_id INTEGER NOT NULL,
+  deliveries INTEGER DEFAULT 0,
+  failed INTEGER DEFAULT 0, -- failed assignments (unpaid)
+  revenue DECIMAL(10, 2) DEFAULT 0,
+  gross DECIMAL(10, 2) DEFAULT 0,
+  deductions DECIMAL(10, 2) DEFAULT 0,
+  net DECIMAL(10, 2) DEFAULT 0,
+  run_id INTEGER, -- payroll run that last computed this row
+  computed_at TIMESTAMP DEFAULT CURRENT_TIMESTAMP,
+  PRIMARY KEY(period_start, period_end, driver_id)
+) WITHOUT ROWID;
+
+-- ETA STATISTICS (Learned phase durations, see logistik_eta.py)
+CREATE TABLE IF NOT EXISTS eta_stats (
+  scope TEXT NOT NULL, -- driver_area, driver, area, all
+  key TEXT NOT NULL, -- '12:80', '12', '80', ''
+  phase TEXT NOT NULL, -- assign, pickup, delivery
+  n INTEGER NOT NULL DEFAULT 0,
+  mean REAL NOT NULL DEFAULT 0, -- seconds
+  m2 REAL NOT NULL DEFAULT 0, -- sum of squared deviations (variance = m2 / (n - 1))
+  updated_at TIMESTAMP DEFAULT CURRENT_TIMESTAMP,
+  PRIMARY KEY(scope, key, phase)
+) WITHOUT ROWID;
+
+-- ENGINE WORKERS (Shard map + heartbeats, see logistik_supervisor.py)
+CREATE TABLE IF NOT EXISTS engine_workers (
+  worker TEXT PRIMARY KEY, -- 'engine-0', ... ('engine' = unsupervised single engine)
+  shards TEXT NOT NULL DEFAULT '[]', -- JSON list of owned shards
+  shard_count INTEGER NOT NULL DEFAULT 1,
+  pid INTEGER,
+  restarts INTEGER NOT NULL DEFAULT 0,
+  heartbeat_at REAL, -- unix time of the last finished cycle
+  cycles INTEGER NOT NULL DEFAULT 0,
+  last_cycle_ms REAL,
+  updated_at TIMESTAMP DEFAULT CURRENT_TIMESTAMP
+) WITHOUT ROWID;
+
+-- SEQUENCES (Block-allocated ORD-/INV- numbers, see logistik_sequences.py)
+CREATE TABLE IF NOT EXISTS sequences (
+  name TEXT NOT NULL, -- 'ORD', 'INV', ...
+  day TEXT NOT NULL, -- YYYYMMDD
+  next_value INTEGER NOT NULL DEFAULT 1,
+  PRIMARY KEY(name, day)
+) WITHOUT ROWID;
+
+-- INGEST APPLIED (Idempotency keys written from the ingest queue, see logistik_ingest.py)
+CREATE TABLE IF NOT EXISTS ingest_applied (
+  idempotency_key TEXT PRIMARY KEY,
+  result_id INTEGER, -- order_id / message_id
+  applied_at TIMESTAMP DEFAULT CURRENT_TIMESTAMP
+) WITHOUT ROWID;
+
 -- EXPENSES TABLE
 CREATE TABLE IF NOT EXISTS expenses (
   id INTEGER PRIMARY KEY AUTOINCREMENT,
@@ -178,12 +287,19 @@ CREATE TABLE IF NOT EXISTS messages (
   
   -- Channel
   channel TEXT DEFAULT 'sms', -- sms, whatsapp, email, in_app
+  to_address TEXT, -- phone number or email for outbound messages
+  subject TEXT, -- email subject
   
   -- Delivery Status
   sent_at TIMESTAMP DEFAULT CURRENT_TIMESTAMP,
   delivered_at TIMESTAMP,
   read_at TIMESTAMP,
   
+  -- Outbound Dispatch (logistik_dispatch.py)
+  delivery_attempts INTEGER DEFAULT 0,
+  next_attempt_at TIMESTAMP, -- retry time, or lease expiry while a worker holds it
+  last_error TEXT,
+  
   FOREIGN KEY(order_id) REFERENCES orders(id)
 );
 
@@ -201,6 +317,8 @@ CREATE TABLE IF NOT EXISTS tasks (
   
   priority TEXT DEFAULT 'normal', -- low, normal, high, critical
   status TEXT DEFAULT 'pending', -- pending, in_progress, completed, cancelled
+  claimed_by TEXT, -- engine worker handling it ('<worker>:<pid>')
+  claimed_at TIMESTAMP,
   
   deadline TIMESTAMP,
   completed_at TIMESTAMP,
@@ -246,20 +364,23 @@ CREATE TABLE IF NOT EXISTS daily_metrics (
 -- DOCUMENTS TABLE (Contracts, agreements, etc.)
 CREATE TABLE IF NOT EXISTS documents (
   id INTEGER PRIMARY KEY AUTOINCREMENT,
-  document_type TEXT NOT NULL, -- 'contract', 'agreement', 'terms', 'invoice_template'
+  document_type TEXT NOT NULL, -- 'contract', 'agreement', 'terms', 'invoice_template', 'invoice'
   related_customer_id INTEGER,
   related_driver_id INTEGER,
+  related_invoice_id INTEGER,
   
   document_name TEXT NOT NULL,
-  file_path TEXT NOT NULL,
+  file_path TEXT NOT NULL, -- rendered invoices: content-addressed (sha256)
   version INTEGER DEFAULT 1,
+  source_hash TEXT, -- fingerprint of the render input (skip unchanged re-renders)
   
   created_at TIMESTAMP DEFAULT CURRENT_TIMESTAMP,
   signed_at TIMESTAMP,
   signed_by TEXT,
   
   FOREIGN KEY(related_customer_id) REFERENCES customers(id),
-  FOREIGN KEY(related_driver_id) REFERENCES drivers(id)
+  FOREIGN KEY(related_driver_id) REFERENCES drivers(id),
+  FOREIGN KEY(related_invoice_id) REFERENCES invoices(id)
 );
 
 -- ============================================
@@ -270,18 +391,146 @@ CREATE INDEX IF NOT EXISTS idx_orders_customer ON orders(customer_id);
 CREATE INDEX IF NOT EXISTS idx_orders_driver ON orders(assigned_driver_id);
 CREATE INDEX IF NOT EXISTS idx_orders_status ON orders(status);
 CREATE INDEX IF NOT EXISTS idx_orders_deadline ON orders(deadline);
+CREATE INDEX IF NOT EXISTS idx_orders_invoice ON orders(invoice_id);
+CREATE INDEX IF NOT EXISTS idx_orders_closed ON orders(COALESCE(delivery_time, created_at))
+  WHERE status IN ('delivered', 'cancelled');
+CREATE INDEX IF NOT EXISTS idx_orders_uninvoiced ON orders(customer_id)
+  WHERE status = 'delivered' AND invoice_id IS NULL;
 
 CREATE INDEX IF NOT EXISTS idx_invoices_customer ON invoices(customer_id);
 CREATE INDEX IF NOT EXISTS idx_invoices_status ON invoices(status);
 CREATE INDEX IF NOT EXISTS idx_invoices_due_date ON invoices(due_date);
+CREATE INDEX IF NOT EXISTS idx_invoices_order ON invoices(order_id);
+CREATE INDEX IF NOT EXISTS idx_invoices_billing_run ON invoices(billing_run_id, customer_id);
+
+CREATE INDEX IF NOT EXISTS idx_documents_invoice ON documents(related_invoice_id, document_type);
 
 CREATE INDEX IF NOT EXISTS idx_messages_order ON messages(order_id);
 CREATE INDEX IF NOT EXISTS idx_messages_channel ON messages(channel);
+CREATE INDEX IF NOT EXISTS idx_messages_sent ON messages(sent_at);
+CREATE INDEX IF NOT EXISTS idx_messages_outbox ON messages(channel, next_attempt_at)
+  WHERE delivered_at IS NULL AND to_type != 'system';
 
 CREATE INDEX IF NOT EXISTS idx_drivers_status ON drivers(status);
+CREATE INDEX IF NOT EXISTS idx_driver_assignments_order ON driver_assignments(order_id, status);
+
+CREATE INDEX IF NOT EXISTS idx_expenses_date ON expenses(expense_date, driver_id);
 
 CREATE INDEX IF NOT EXISTS idx_tasks_status ON tasks(status);
 CREATE INDEX IF NOT EXISTS idx_tasks_deadline ON tasks(deadline);
+CREATE INDEX IF NOT EXISTS idx_tasks_backlog ON tasks(assigned_to, priority, created_at)
+  WHERE status = 'pending';
+CREATE INDEX IF NOT EXISTS idx_tasks_closed ON tasks(COALESCE(completed_at, updated_at))
+  WHERE status IN ('completed', 'cancelled');
+
+-- ============================================
+-- FULL-TEXT SEARCH (FTS5, see logistik_search.py)
+-- ============================================
+
+CREATE VIRTUAL TABLE IF NOT EXISTS orders_fts USING fts5(order_number, pickup_address, delivery_address, parcel_description, pickup_contact_name, delivery_contact_name, content='orders', content_rowid='id', tokenize='unicode61 remove_diacritics 2', prefix='2 3');
+CREATE TRIGGER IF NOT EXISTS orders_fts_ai AFTER INSERT ON orders BEGIN
+  INSERT INTO orders_fts(rowid, order_number, pickup_address, delivery_address, parcel_description, pickup_contact_name, delivery_contact_name) VALUES (new.id, new.order_number, new.pickup_address, new.delivery_address, new.parcel_description, new.pickup_contact_name, new.delivery_contact_name);
+END;
+CREATE TRIGGER IF NOT EXISTS orders_fts_ad AFTER DELETE ON orders BEGIN
+  INSERT INTO orders_fts(orders_fts, rowid, order_number, pickup_address, delivery_address, parcel_description, pickup_contact_name, delivery_contact_name) VALUES ('delete', old.id, old.order_number, old.pickup_address, old.delivery_address, old.parcel_description, old.pickup_contact_name, old.delivery_contact_name);
+END;
+CREATE TRIGGER IF NOT EXISTS orders_fts_au AFTER UPDATE OF order_number, pickup_address, delivery_address, parcel_description, pickup_contact_name, delivery_contact_name ON orders BEGIN
+  INSERT INTO orders_fts(orders_fts, rowid, order_number, pickup_address, delivery_address, parcel_description, pickup_contact_name, delivery_contact_name) VALUES ('delete', old.id, old.order_number, old.pickup_address, old.delivery_address, old.parcel_description, old.pickup_contact_name, old.delivery_contact_name);
+  INSERT INTO orders_fts(rowid, order_number, pickup_address, delivery_address, parcel_description, pickup_contact_name, delivery_contact_name) VALUES (new.id, new.order_number, new.pickup_address, new.delivery_address, new.parcel_description, new.pickup_contact_name, new.delivery_contact_name);
+END;
+
+CREATE VIRTUAL TABLE IF NOT EXISTS customers_fts USING fts5(name, company_name, email, phone, address, city, content='customers', content_rowid='id', tokenize='unicode61 remove_diacritics 2', prefix='2 3');
+CREATE TRIGGER IF NOT EXISTS customers_fts_ai AFTER INSERT ON customers BEGIN
+  INSERT INTO customers_fts(rowid, name, company_name, email, phone, address, city) VALUES (new.id, new.name, new.company_name, new.email, new.phone, new.address, new.city);
+END;
+CREATE TRIGGER IF NOT EXISTS customers_fts_ad AFTER DELETE ON customers BEGIN
+  INSERT INTO customers_fts(customers_fts, rowid, name, company_name, email, phone, address, city) VALUES ('delete', old.id, old.name, old.company_name, old.email, old.phone, old.address, old.city);
+END;
+CREATE TRIGGER IF NOT EXISTS customers_fts_au AFTER UPDATE OF name, company_name, email, phone, address, city ON customers BEGIN
+  INSERT INTO customers_fts(customers_fts, rowid, name, company_name, email, phone, address, city) VALUES ('delete', old.id, old.name, old.company_name, old.email, old.phone, old.address, old.city);
+  INSERT INTO customers_fts(rowid, name, company_name, email, phone, address, city) VALUES (new.id, new.name, new.company_name, new.email, new.phone, new.address, new.city);
+END;
+
+CREATE VIRTUAL TABLE IF NOT EXISTS messages_fts USING fts5(message_text, content='messages', content_rowid='id', tokenize='unicode61 remove_diacritics 2', prefix='2 3');
+CREATE TRIGGER IF NOT EXISTS messages_fts_ai AFTER INSERT ON messages BEGIN
+  INSERT INTO messages_fts(rowid, message_text) VALUES (new.id, new.message_text);
+END;
+CREATE TRIGGER IF NOT EXISTS messages_fts_ad AFTER DELETE ON messages BEGIN
+  INSERT INTO messages_fts(messages_fts, rowid, message_text) VALUES ('delete', old.id, old.message_text);
+END;
+CREATE TRIGGER IF NOT EXISTS messages_fts_au AFTER UPDATE OF message_text ON messages BEGIN
+  INSERT INTO messages_fts(messages_fts, rowid, message_text) VALUES ('delete', old.id, old.message_text);
+  INSERT INTO messages_fts(rowid, message_text) VALUES (new.id, new.message_text);
+END;
+
+-- ============================================
+-- DRIVER SYNC (Change log for delta sync, see logistik_sync.py)
+-- ============================================
+
+CREATE TABLE IF NOT EXISTS order_changes (
+  seq INTEGER PRIMARY KEY AUTOINCREMENT, -- sync token
+  driver_id INTEGER NOT NULL,
+  order_id INTEGER NOT NULL,
+  changed_at TIMESTAMP DEFAULT CURRENT_TIMESTAMP
+);
+CREATE INDEX IF NOT EXISTS idx_order_changes_driver ON order_changes(driver_id, seq);
+CREATE TRIGGER IF NOT EXISTS order_changes_ai AFTER INSERT ON orders WHEN new.assigned_driver_id IS NOT NULL BEGIN
+  INSERT INTO order_changes (driver_id, order_id) VALUES (new.assigned_driver_id, new.id);
+END;
+CREATE TRIGGER IF NOT EXISTS order_changes_au AFTER UPDATE OF assigned_driver_id, order_number, status, priority, pickup_address, pickup_city, pickup_postal, pickup_contact_name, pickup_contact_phone, pickup_notes, pickup_time_window, delivery_address, delivery_city, delivery_postal, delivery_contact_name, delivery_contact_phone, delivery_notes, delivery_time_window, parcel_description, weight_kg, dimensions_cm, fragile, requires_signature, deadline, assigned_at, pickup_time, delivery_time ON orders BEGIN
+  INSERT INTO order_changes (driver_id, order_id) SELECT new.assigned_driver_id, new.id WHERE new.assigned_driver_id IS NOT NULL;
+  INSERT INTO order_changes (driver_id, order_id) SELECT old.assigned_driver_id, old.id WHERE old.assigned_driver_id IS NOT NULL AND old.assigned_driver_id IS NOT new.assigned_driver_id;
+END;
+CREATE TRIGGER IF NOT EXISTS order_changes_ad AFTER DELETE ON orders WHEN old.assigned_driver_id IS NOT NULL BEGIN
+  INSERT INTO order_changes (driver_id, order_id) VALUES (old.assigned_driver_id, old.id);
+END;
+
+-- ============================================
+-- EVENT LOG (Change feed for orders/tasks/invoices, see logistik_events.py)
+-- ============================================
+
+CREATE TABLE IF NOT EXISTS events (
+  id INTEGER PRIMARY KEY AUTOINCREMENT, -- cursor position
+  entity TEXT NOT NULL, -- 'orders', 'tasks', 'invoices'
+  entity_id INTEGER NOT NULL,
+  op TEXT NOT NULL, -- insert, update, delete
+  old_status TEXT,
+  new_status TEXT,
+  created_at TIMESTAMP DEFAULT CURRENT_TIMESTAMP
+);
+CREATE INDEX IF NOT EXISTS idx_events_entity ON events(entity, id);
+CREATE TABLE IF NOT EXISTS event_offsets (
+  consumer TEXT PRIMARY KEY,
+  position INTEGER NOT NULL DEFAULT 0,
+  updated_at TIMESTAMP DEFAULT CURRENT_TIMESTAMP
+);
+CREATE TRIGGER IF NOT EXISTS orders_events_ai AFTER INSERT ON orders BEGIN
+  INSERT INTO events (entity, entity_id, op, new_status) VALUES ('orders', new.id, 'insert', new.status);
+END;
+CREATE TRIGGER IF NOT EXISTS orders_events_au AFTER UPDATE OF status, assigned_driver_id, total_price, deadline, delivery_time ON orders WHEN old.status IS NOT new.status OR old.assigned_driver_id IS NOT new.assigned_driver_id OR old.total_price IS NOT new.total_price OR old.deadline IS NOT new.deadline OR old.delivery_time IS NOT new.delivery_time BEGIN
+  INSERT INTO events (entity, entity_id, op, old_status, new_status) VALUES ('orders', new.id, 'update', old.status, new.status);
+END;
+CREATE TRIGGER IF NOT EXISTS orders_events_ad AFTER DELETE ON orders BEGIN
+  INSERT INTO events (entity, entity_id, op, old_status) VALUES ('orders', old.id, 'delete', old.status);
+END;
+CREATE TRIGGER IF NOT EXISTS tasks_events_ai AFTER INSERT ON tasks BEGIN
+  INSERT INTO events (entity, entity_id, op, new_status) VALUES ('tasks', new.id, 'insert', new.status);
+END;
+CREATE TRIGGER IF NOT EXISTS tasks_events_au AFTER UPDATE OF status, assigned_to ON tasks WHEN old.status IS NOT new.status OR old.assigned_to IS NOT new.assigned_to BEGIN
+  INSERT INTO events (entity, entity_id, op, old_status, new_status) VALUES ('tasks', new.id, 'update', old.status, new.status);
+END;
+CREATE TRIGGER IF NOT EXISTS tasks_events_ad AFTER DELETE ON tasks BEGIN
+  INSERT INTO events (entity, entity_id, op, old_status) VALUES ('tasks', old.id, 'delete', old.status);
+END;
+CREATE TRIGGER IF NOT EXISTS invoices_events_ai AFTER INSERT ON invoices BEGIN
+  INSERT INTO events (entity, entity_id, op, new_status) VALUES ('invoices', new.id, 'insert', new.status);
+END;
+CREATE TRIGGER IF NOT EXISTS invoices_events_au AFTER UPDATE OF status, due_date, total_amount, paid_amount ON invoices WHEN old.status IS NOT new.status OR old.due_date IS NOT new.due_date OR old.total_amount IS NOT new.total_amount OR old.paid_amount IS NOT new.paid_amount BEGIN
+  INSERT INTO events (entity, entity_id, op, old_status, new_status) VALUES ('invoices', new.id, 'update', old.status, new.status);
+END;
+CREATE TRIGGER IF NOT EXISTS invoices_events_ad AFTER DELETE ON invoices BEGIN
+  INSERT INTO events (entity, entity_id, op, old_status) VALUES ('invoices', old.id, 'delete', old.status);
+END;
 
 -- ============================================
 -- SAMPLE DATA (optional, for testing)
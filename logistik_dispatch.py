@@ -0,0 +1,388 @@
+#!/usr/bin/env python3
+"""
+Outbound Dispatcher - Sends queued SMS / WhatsApp / Email messages
+Undelivered rows in `messages` (delivered_at IS NULL) are the durable queue.
+Each channel gets its own asyncio workers with a concurrency limit, a rate
+limit and batching; failed sends are retried with exponential backoff + jitter.
+
+Channels are configured via environment, so local stub servers can be used:
+    LOGISTIK_SMTP_HOST / LOGISTIK_SMTP_PORT / LOGISTIK_SMTP_SENDER
+    LOGISTIK_SMTP_USER / LOGISTIK_SMTP_PASSWORD
+    LOGISTIK_SMS_GATEWAY       e.g. http://localhost:8025/sms
+    LOGISTIK_WHATSAPP_GATEWAY  e.g. http://localhost:8025/whatsapp
+    LOGISTIK_GATEWAY_TOKEN     bearer token for the HTTP gateways
+Channels without config fall back to printing (old behaviour).
+
+Run: python logistik_dispatch.py [--once]
+"""
+
+import asyncio
+import json
+import os
+import random
+import smtplib
+import time
+import urllib.request
+from datetime import datetime, timedelta
+from email.message import EmailMessage
+from typing import Dict, List, Optional
+from logistik_db import LogisticsDB
+
+# Columns added to `messages` for dispatching (migration 2)
+OUTBOX_COLUMNS = {
+    'to_address': 'TEXT',
+    'subject': 'TEXT',
+    'delivery_attempts': 'INTEGER DEFAULT 0',
+    'next_attempt_at': 'TIMESTAMP',
+    'last_error': 'TEXT',
+}
+
+OUTBOX_INDEX = """
+CREATE INDEX IF NOT EXISTS idx_messages_outbox ON messages(channel, next_attempt_at)
+  WHERE delivered_at IS NULL AND to_type != 'system'
+"""
+
+
+# ============================================
+# RATE LIMITING
+# ============================================
+
+class TokenBucket:
+    """Async token bucket (rate = tokens per second)"""
+
+    def __init__(self, rate: float, burst: float = None):
+        self.rate = rate
+        self.capacity = burst or max(1.0, rate)
+        self.tokens = self.capacity
+        self.updated = time.monotonic()
+        self._lock = asyncio.Lock()
+
+    async def acquire(self, n: int = 1):
+        """Wait until n tokens are available (n > capacity borrows ahead)"""
+        async with self._lock:
+            needed = min(n, self.capacity)
+            while True:
+                now = time.monotonic()
+                self.tokens = min(self.capacity, self.tokens + (now - self.updated) * self.rate)
+                self.updated = now
+                if self.tokens >= needed:
+                    self.tokens -= n
+                    return
+                await asyncio.sleep((needed - self.tokens) / self.rate)
+
+
+# ============================================
+# CHANNELS
+# ============================================
+
+class Channel:
+    """Base channel: prints messages (no real provider configured)
+
+    send_batch() is blocking and runs in a worker thread. It returns
+    {message_id: error} with error None on success.
+    """
+
+    def __init__(self, name: str, concurrency: int = 4, rate_per_sec: float = 50.0,
+                 batch_size: int = 1):
+        self.name = name
+        self.concurrency = concurrency
+        self.rate_per_sec = rate_per_sec
+        self.batch_size = batch_size
+
+    def send_batch(self, messages: List[Dict]) -> Dict[int, Optional[str]]:
+        for msg in messages:
+            print(f"  📤 [{self.name}] to {msg['to_address']}: {msg['message_text']}")
+        return {msg['id']: None for msg in messages}
+
+
+class SmtpChannel(Channel):
+    """Email via SMTP - one connection per batch"""
+
+    def __init__(self, host: str, port: int = 25, sender: str = 'noreply@localhost',
+                 username: str = None, password: str = None, starttls: bool = False,
+                 timeout: float = 30.0, **kwargs):
+        kwargs.setdefault('batch_size', 50)
+        super().__init__('email', **kwargs)
+        self.host = host
+        self.port = port
+        self.sender = sender
+        self.username = username
+        self.password = password
+        self.starttls = starttls
+        self.timeout = timeout
+
+    def send_batch(self, messages: List[Dict]) -> Dict[int, Optional[str]]:
+        results = {}
+        try:
+            with smtplib.SMTP(self.host, self.port, timeout=self.timeout) as smtp:
+                if self.starttls:
+                    smtp.starttls()
+                if self.username:
+                    smtp.login(self.username, self.password)
+                for msg in messages:
+                    email = EmailMessage()
+                    email['From'] = self.sender
+                    email['To'] = msg['to_address']
+                    email['Subject'] = msg['subject'] or 'Logistics Update'
+                    email.set_content(msg['message_text'])
+                    try:
+                        smtp.send_message(email)
+                        results[msg['id']] = None
+                    except smtplib.SMTPRecipientsRefused as e:
+                        results[msg['id']] = f"recipient refused: {e}"
+        except (smtplib.SMTPException, OSError) as e:
+            # Connection-level failure: everything not yet sent is retried
+            for msg in messages:
+                results.setdefault(msg['id'], f"smtp: {e}")
+        return results
+
+
+class HttpGatewayChannel(Channel):
+    """SMS / WhatsApp via JSON HTTP gateway
+
+    POST {"messages": [{"id", "to", "text"}, ...]}
+    Response may contain {"results": [{"id", "error"}]}; otherwise a 2xx
+    status means every message in the batch was accepted.
+    """
+
+    def __init__(self, name: str, url: str, token: str = None, timeout: float = 15.0,
+                 **kwargs):
+        kwargs.setdefault('batch_size', 100)
+        super().__init__(name, **kwargs)
+        self.url = url
+        self.token = token
+        self.timeout = timeout
+
+    def send_batch(self, messages: List[Dict]) -> Dict[int, Optional[str]]:
+        body = json.dumps({'messages': [
+            {'id': msg['id'], 'to': msg['to_address'], 'text': msg['message_text']}
+            for msg in messages
+        ]}).encode('utf-8')
+        headers = {'Content-Type': 'application/json'}
+        if self.token:
+            headers['Authorization'] = f'Bearer {self.token}'
+        req = urllib.request.Request(self.url, data=body, headers=headers, method='POST')
+
+        try:
+            with urllib.request.urlopen(req, timeout=self.timeout) as resp:
+                payload = resp.read()
+        except OSError as e:  # URLError / HTTPError / timeouts
+            return {msg['id']: f"{self.name}: {e}" for msg in messages}
+
+        results = {msg['id']: None for msg in messages}
+        try:
+            for item in json.loads(payload or b'{}').get('results', []):
+                if item.get('id') in results:
+                    results[item['id']] = item.get('error')
+        except (ValueError, AttributeError):
+            pass  # Non-JSON 2xx body: treat batch as accepted
+        return results
+
+
+def build_channels_from_env() -> Dict[str, Channel]:
+    """Create channels from LOGISTIK_* environment variables"""
+    env = os.environ
+    channels = {}
+
+    if env.get('LOGISTIK_SMTP_HOST'):
+        channels['email'] = SmtpChannel(
+            host=env['LOGISTIK_SMTP_HOST'],
+            port=int(env.get('LOGISTIK_SMTP_PORT', 25)),
+            sender=env.get('LOGISTIK_SMTP_SENDER', 'noreply@localhost'),
+            username=env.get('LOGISTIK_SMTP_USER'),
+            password=env.get('LOGISTIK_SMTP_PASSWORD'),
+            starttls=env.get('LOGISTIK_SMTP_STARTTLS') == '1',
+            concurrency=4, rate_per_sec=20.0
+        )
+    else:
+        channels['email'] = Channel('email')
+
+    token = env.get('LOGISTIK_GATEWAY_TOKEN')
+    for name, var in (('sms', 'LOGISTIK_SMS_GATEWAY'), ('whatsapp', 'LOGISTIK_WHATSAPP_GATEWAY')):
+        if env.get(var):
+            channels[name] = HttpGatewayChannel(name, env[var], token=token,
+                                                concurrency=8, rate_per_sec=100.0)
+        else:
+            channels[name] = Channel(name)
+
+    return channels
+
+
+# ============================================
+# DISPATCHER
+# ============================================
+
+class OutboundDispatcher:
+    """Moves queued messages from the DB to their channels"""
+
+    def __init__(self, db: LogisticsDB = None, channels: Dict[str, Channel] = None,
+                 poll_interval: float = 1.0, max_attempts: int = 6,
+                 base_backoff: float = 5.0, max_backoff: float = 900.0,
+                 lease_seconds: float = 120.0):
+        self.db = db or LogisticsDB()
+        self.channels = channels if channels is not None else build_channels_from_env()
+        self.poll_interval = poll_interval
+        self.max_attempts = max_attempts
+        self.base_backoff = base_backoff
+        self.max_backoff = max_backoff
+        self.lease_seconds = lease_seconds
+        self.stats = {'sent': 0, 'failed': 0}
+
+    def claim_batch(self, channel: str, limit: int) -> List[Dict]:
+        """Lease up to `limit` due messages so no other worker picks them up"""
+        now = datetime.now()
+        lease_until = (now + timedelta(seconds=self.lease_seconds)).isoformat()
+        with self.db.transaction() as conn:
+            rows = conn.execute("""
+                UPDATE messages SET next_attempt_at = ?
+                WHERE id IN (
+                    SELECT id FROM messages
+                    WHERE delivered_at IS NULL AND to_type != 'system'
+                      AND channel = ? AND delivery_attempts < ?
+                      AND (next_attempt_at IS NULL OR next_attempt_at <= ?)
+                    ORDER BY id LIMIT ?
+                )
+                RETURNING id, order_id, to_type, to_id, to_address, subject,
+                          message_text, channel, delivery_attempts
+            """, (lease_until, channel, self.max_attempts, now.isoformat(), limit)).fetchall()
+        return [dict(row) for row in rows]
+
+    def backoff(self, attempts: int) -> float:
+        """Exponential backoff with full jitter"""
+        return random.uniform(0, min(self.max_backoff, self.base_backoff * 2 ** attempts))
+
+    def record_results(self, batch: List[Dict], results: Dict[int, Optional[str]]):
+        """Mark sent messages delivered, reschedule failed ones"""
+        now = datetime.now()
+        delivered, failed = [], []
+        for msg in batch:
+            error = results.get(msg['id'], 'no result from channel')
+            if error is None:
+                delivered.append((now.isoformat(), msg['id']))
+            else:
+                retry_at = now + timedelta(seconds=self.backoff(msg['delivery_attempts']))
+                failed.append((str(error)[:500], retry_at.isoformat(), msg['id']))
+
+        with self.db.transaction() as conn:
+            conn.executemany("""
+                UPDATE messages SET delivered_at = ?, next_attempt_at = NULL, last_error = NULL,
+                       delivery_attempts = delivery_attempts + 1
+                WHERE id = ?
+            """, delivered)
+            conn.executemany("""
+                UPDATE messages SET last_error = ?, next_attempt_at = ?,
+                       delivery_attempts = delivery_attempts + 1
+                WHERE id = ?
+            """, failed)
+
+        self.stats['sent'] += len(delivered)
+        self.stats['failed'] += len(failed)
+
+    async def _poll_channel(self, channel: Channel, queue: asyncio.Queue,
+                            stop: asyncio.Event):
+        """Feed leased batches to the channel's workers"""
+        while not stop.is_set():
+            batch = await asyncio.to_thread(self.claim_batch, channel.name, channel.batch_size)
+            if batch:
+                await queue.put(batch)
+                continue
+            try:
+                await asyncio.wait_for(stop.wait(), timeout=self.poll_interval)
+            except asyncio.TimeoutError:
+                pass
+
+    async def _worker(self, channel: Channel, queue: asyncio.Queue, bucket: TokenBucket):
+        """Send batches for one channel (runs `concurrency` times in parallel)"""
+        while True:
+            batch = await queue.get()
+            try:
+                await bucket.acquire(len(batch))
+                try:
+                    results = await asyncio.to_thread(channel.send_batch, batch)
+                except Exception as e:  # Channel bug: retry later instead of dying
+                    results = {msg['id']: f"{type(e).__name__}: {e}" for msg in batch}
+                await asyncio.to_thread(self.record_results, batch, results)
+            finally:
+                queue.task_done()
+
+    async def run(self, stop: asyncio.Event = None):
+        """Run pollers + workers for all channels until `stop` is set"""
+        stop = stop or asyncio.Event()
+        workers = []
+        pollers = []
+        queues = []
+
+        for channel in self.channels.values():
+            # Small queue: leases stay short, backpressure reaches the poller
+            queue = asyncio.Queue(maxsize=channel.concurrency * 2)
+            bucket = TokenBucket(channel.rate_per_sec, burst=max(channel.rate_per_sec,
+                                                                 channel.batch_size))
+            queues.append(queue)
+            pollers.append(asyncio.create_task(self._poll_channel(channel, queue, stop)))
+            workers += [asyncio.create_task(self._worker(channel, queue, bucket))
+                        for _ in range(channel.concurrency)]
+
+        try:
+            await asyncio.gather(*pollers)
+            for queue in queues:
+                await queue.join()  # Finish batches already leased
+        finally:
+            for task in pollers + workers:
+                task.cancel()
+            await asyncio.gather(*pollers, *workers, return_exceptions=True)
+
+    def dispatch_once(self) -> int:
+        """Synchronously send everything currently due (scripts / cron)"""
+        processed = 0
+        for channel in self.channels.values():
+            while True:
+                batch = self.claim_batch(channel.name, channel.batch_size)
+                if not batch:
+                    break
+                self.record_results(batch, channel.send_batch(batch))
+                processed += len(batch)
+        return processed
+
+    def get_queue_depth(self) -> Dict[str, int]:
+        """Undelivered outbound messages per channel"""
+        rows = self.db.query("""
+            SELECT channel, COUNT(*) AS pending FROM messages
+            WHERE delivered_at IS NULL AND to_type != 'system' AND delivery_attempts < ?
+            GROUP BY channel
+        """, (self.max_attempts,))
+        return {row['channel']: row['pending'] for row in rows}
+
+
+# ============================================
+# STARTUP
+# ============================================
+
+if __name__ == "__main__":
+    import argparse
+    from logistik_migrations import migrate
+
+    parser = argparse.ArgumentParser(description='Outbound message dispatcher')
+    parser.add_argument('--once', action='store_true', help='Send everything due, then exit')
+    args = parser.parse_args()
+
+    db = LogisticsDB()
+    migrate(db)
+    dispatcher = OutboundDispatcher(db)
+
+    print("=" * 50)
+    print("📤 OUTBOUND DISPATCHER")
+    print("=" * 50)
+    for name, channel in dispatcher.channels.items():
+        print(f"  {name}: {type(channel).__name__} "
+              f"(workers={channel.concurrency}, rate={channel.rate_per_sec}/s, "
+              f"batch={channel.batch_size})")
+    print(f"  Queue: {dispatcher.get_queue_depth()}\n")
+
+    if args.once:
+        count = dispatcher.dispatch_once()
+        print(f"✅ Processed {count} messages ({dispatcher.stats})")
+    else:
+        try:
+            asyncio.run(dispatcher.run())
+        except KeyboardInterrupt:
+            print(f"\n✋ Dispatcher stopped ({dispatcher.stats})")
@@ -0,0 +1,183 @@
+#!/usr/bin/env python3
+"""
+Driver Service - Logic behind the driver app endpoints
+Shared by the Flask API (logistik_api.py) and the asyncio driver gateway
+(logistik_gateway.py), so both behave identically.
+
+Every method takes the parsed JSON body and returns (payload, http_status).
+Methods are blocking (SQLite); the gateway runs them in its DB thread pool.
+"""
+
+from datetime import datetime
+from typing import Dict, Tuple
+from logistik_db import LogisticsDB
+from logistik_sync import DriverSync
+
+Response = Tuple[Dict, int]
+
+
+class DriverService:
+    """Driver login/status and order start/complete/update"""
+
+    def __init__(self, db: LogisticsDB = None):
+        self.db = db or LogisticsDB(compact_rows=True)
+        self.sync = DriverSync(self.db)
+
+    def login(self, data: Dict) -> Response:
+        """Driver logs in, gets open orders + sync token (see logistik_sync.py)"""
+        driver_id = data.get('driver_id')
+        phone = data.get('phone')
+
+        if not driver_id or not phone:
+            return {'error': 'Missing driver_id or phone'}, 400
+
+        driver = self.db.get_driver(driver_id)
+        if not driver or driver['phone'] != phone:
+            return {'error': 'Invalid credentials'}, 401
+
+        # Update status to online
+        self.db.update_driver_status(driver_id, 'online')
+
+        # Open orders snapshot; later calls sync with the token
+        snapshot = self.sync.sync(driver_id)
+
+        return {
+            'success': True,
+            'driver': driver,
+            'orders': snapshot['orders'],
+            'sync_token': snapshot['sync_token']
+        }, 200
+
+    def update_status(self, data: Dict) -> Response:
+        """Update driver status (online/offline/on_delivery)"""
+        driver_id = data.get('driver_id')
+        status = data.get('status')  # online, offline, on_delivery
+        location = data.get('location')  # optional GPS
+
+        if not driver_id or not status:
+            return {'error': 'Missing driver_id or status'}, 400
+
+        self.db.update_driver_status(driver_id, status, location)
+
+        return {'success': True, 'message': f'Status updated to {status}'}, 200
+
+    def orders(self, driver_id: int, since: str = None) -> Response:
+        """Orders for driver: changes since the sync token, snapshot without one"""
+        result = self.sync.sync(driver_id, since)
+        return {
+            'success': True,
+            **result,
+            'count': len(result['orders'])
+        }, 200
+
+    def start_delivery(self, order_id: int, data: Dict) -> Response:
+        """Driver starts delivery"""
+        driver_id = data.get('driver_id')
+
+        order = self.db.get_order(order_id)
+        if not order:
+            return {'error': 'Order not found'}, 404
+
+        self.db.update_order_status(order_id, 'in_transit')
+
+        # Log message
+        self.db.log_message(
+            order_id=order_id,
+            from_type='driver',
+            from_id=driver_id,
+            message_text=f'Started delivery to {order["delivery_address"]}',
+            channel='system'
+        )
+
+        return {
+            'success': True,
+            'message': 'Delivery started',
+            'order': self.db.get_order(order_id)
+        }, 200
+
+    def complete_delivery(self, order_id: int, data: Dict) -> Response:
+        """Driver marks delivery as complete"""
+        driver_id = data.get('driver_id')
+        photo_path = data.get('photo_path')  # proof of delivery
+        signature_path = data.get('signature_path')
+        notes = data.get('notes', '')
+
+        order = self.db.get_order(order_id)
+        if not order:
+            return {'error': 'Order not found'}, 404
+
+        # Update order
+        update_data = {
+            'status': 'delivered',
+            'delivery_time': datetime.now().isoformat()
+        }
+        if photo_path:
+            update_data['photo_path'] = photo_path
+        if signature_path:
+            update_data['signature_path'] = signature_path
+
+        self.db.update('orders', order_id, update_data)
+
+        # Log message
+        self.db.log_message(
+            order_id=order_id,
+            from_type='driver',
+            from_id=driver_id,
+            message_text=f'Delivery completed. Notes: {notes}',
+            channel='system'
+        )
+
+        # Invoice is created by the next billing run (logistik_billing.py)
+
+        # Create task for SECRETARY to send thank-you email
+        self.db.create_task(
+            title=f'Send delivery confirmation to {order["customer_id"]}',
+            task_type='send_email',
+            assigned_to='secretary',
+            related_order_id=order_id,
+            related_customer_id=order['customer_id']
+        )
+
+        return {
+            'success': True,
+            'message': 'Delivery completed',
+            'order': self.db.get_order(order_id)
+        }, 200
+
+    def update_order(self, order_id: int, data: Dict) -> Response:
+        """Driver sends location/status update"""
+        driver_id = data.get('driver_id')
+        message = data.get('message')  # e.g., "Delayed, traffic jam"
+        location = data.get('location')  # GPS location
+
+        order = self.db.get_order(order_id)
+        if not order:
+            return {'error': 'Order not found'}, 404
+
+        # Log the message
+        self.db.log_message(
+            order_id=order_id,
+            from_type='driver',
+            from_id=driver_id,
+            message_text=message,
+            channel='sms'
+        )
+
+        # Update driver location
+        if location:
+            self.db.update_driver_status(driver_id, 'on_delivery', location)
+
+        # Create task for COMMS agent to notify customer
+        self.db.create_task(
+            title=f'Notify customer: {message}',
+            task_type='notify_customer',
+            assigned_to='comms',
+            related_order_id=order_id,
+            related_customer_id=order['customer_id'],
+            priority='high'
+        )
+
+        return {
+            'success': True,
+            'message': 'Update logged, customer will be notified'
+        }, 200
@@ -0,0 +1,360 @@
+#!/usr/bin/env python3
+"""
+ETA Service - Delivery time predictions from delivery history
+Learns how long each phase of an order takes:
+    assign    created_at  -> assigned_at
+    pickup    assigned_at -> pickup_time
+    delivery  pickup_time -> delivery_time
+(driver_assignments fill in missing times and the driver who actually
+delivered) and keeps count / mean / M2 (Welford) per phase for
+
+    driver_area   driver + delivery area (first 2 digits of the postal code, else city)
+    driver        driver
+    area          delivery area
+    all           everything
+
+in the small `eta_stats` table. predict() picks the most specific level
+with enough samples: one dict lookup per phase, no queries.
+
+Refresh is incremental: deliveries since the `eta` consumer offset in the
+event log are folded into the stats and the offset is committed in the
+same transaction (a delivery is never counted twice). The workflow engine
+learns (refresh() in its maintenance step); API processes only reload
+`eta_stats` in a background thread (start()), requests call predict().
+
+Run: python logistik_eta.py [--rebuild]
+"""
+
+import math
+import sqlite3
+import threading
+import time
+from datetime import datetime, timedelta
+from typing import Dict, List, Optional, Tuple
+from logistik_db import LogisticsDB
+
+CONSUMER = 'eta'
+PHASES = ('assign', 'pickup', 'delivery')
+LEVELS = [('driver_area', 1.0), ('driver', 0.9), ('area', 0.75), ('all', 0.5)]  # most specific first
+MIN_SAMPLES = 5  # fewer samples: fall back to the next level
+FULL_CONFIDENCE_SAMPLES = 50
+MAX_DURATION = 48 * 3600  # longer phases are data errors, not history
+Z_80 = 1.2816  # earliest/latest = 80% interval
+REFRESH_INTERVAL = 10.0  # seconds between incremental refreshes per process
+CHUNK = 5000
+
+ETA_STATS_TABLE = """
+CREATE TABLE IF NOT EXISTS eta_stats (
+  scope TEXT NOT NULL, -- driver_area, driver, area, all
+  key TEXT NOT NULL, -- '12:80', '12', '80', ''
+  phase TEXT NOT NULL, -- assign, pickup, delivery
+  n INTEGER NOT NULL DEFAULT 0,
+  mean REAL NOT NULL DEFAULT 0, -- seconds
+  m2 REAL NOT NULL DEFAULT 0, -- sum of squared deviations (variance = m2 / (n - 1))
+  updated_at TIMESTAMP DEFAULT CURRENT_TIMESTAMP,
+  PRIMARY KEY(scope, key, phase)
+) WITHOUT ROWID
+"""
+
+# Phase durations (seconds) of delivered orders; created_at is UTC (CURRENT_TIMESTAMP),
+# the other timestamps are local (datetime.now())
+DURATIONS_SQL = """
+SELECT o.id,
+       COALESCE(a.driver_id, o.assigned_driver_id) AS driver_id,
+       COALESCE(NULLIF(substr(o.delivery_postal, 1, 2), ''), lower(o.delivery_city)) AS area,
+       (julianday(COALESCE(o.assigned_at, a.assigned_at)) - julianday(o.created_at, 'localtime')) * 86400 AS assign,
+       (julianday(COALESCE(o.pickup_time, a.started_at)) - julianday(COALESCE(o.assigned_at, a.assigned_at))) * 86400 AS pickup,
+       (julianday(COALESCE(o.delivery_time, a.completed_at)) - julianday(COALESCE(o.pickup_time, a.started_at))) * 86400 AS delivery
+FROM orders o
+LEFT JOIN driver_assignments a ON a.id = (
+    SELECT id FROM driver_assignments WHERE order_id = o.id AND status = 'completed' ORDER BY id DESC LIMIT 1)
+WHERE o.status = 'delivered' AND {where}
+"""
+
+
+def area_of(order: Dict) -> Optional[str]:
+    postal = (order.get('delivery_postal') or '')[:2]
+    return postal or (order.get('delivery_city') or '').lower() or None
+
+
+def parse_time(value) -> Optional[datetime]:
+    if not value:
+        return None
+    if isinstance(value, datetime):
+        return value
+    try:
+        return datetime.fromisoformat(str(value))
+    except ValueError:
+        return None
+
+
+class Stat:
+    """Running count / mean / M2; merge() combines two batches (Chan et al.)"""
+
+    __slots__ = ('n', 'mean', 'm2')
+
+    def __init__(self, n: int = 0, mean: float = 0.0, m2: float = 0.0):
+        self.n, self.mean, self.m2 = n, mean, m2
+
+    def add(self, x: float):
+        self.n += 1
+        delta = x - self.mean
+        self.mean += delta / self.n
+        self.m2 += delta * (x - self.mean)
+
+    def merge(self, other: 'Stat'):
+        if not other.n:
+            return
+        n = self.n + other.n
+        delta = other.mean - self.mean
+        self.mean += delta * other.n / n
+        self.m2 += other.m2 + delta * delta * self.n * other.n / n
+        self.n = n
+
+    @property
+    def std(self) -> float:
+        return math.sqrt(self.m2 / (self.n - 1)) if self.n > 1 else self.mean * 0.5
+
+
+class EtaService:
+    """Learned phase durations + O(1) ETA lookups"""
+
+    def __init__(self, db: LogisticsDB = None, refresh_interval: float = REFRESH_INTERVAL):
+        self.db = db or LogisticsDB()
+        self.refresh_interval = refresh_interval
+        self.stats: Dict[Tuple[str, str, str], Stat] = {}  # (scope, key, phase) -> Stat
+        self.position: Optional[int] = None  # event log offset the in-memory stats include
+        self._checked = 0.0
+        self._lock = threading.Lock()
+
+    # ========== LEARNING ==========
+
+    def _keys(self, driver_id, area) -> List[Tuple[str, str]]:
+        keys = [('all', '')]
+        if area:
+            keys.append(('area', area))
+        if driver_id:
+            keys.append(('driver', str(driver_id)))
+            if area:
+                keys.append(('driver_area', f"{driver_id}:{area}"))
+        return keys
+
+    def _fold(self, conn, where: str, params: tuple) -> Dict[Tuple[str, str, str], Stat]:
+        """Batch stats of the matching delivered orders"""
+        batch: Dict[Tuple[str, str, str], Stat] = {}
+        for row in conn.execute(DURATIONS_SQL.format(where=where), params):
+            keys = self._keys(row[1], row[2])
+            for phase, seconds in zip(PHASES, row[3:]):
+                if seconds is None or not 0 < seconds <= MAX_DURATION:
+                    continue
+                for scope, key in keys:
+                    stat = batch.get((scope, key, phase))
+                    if stat is None:
+                        stat = batch[(scope, key, phase)] = Stat()
+                    stat.add(seconds)
+        return batch
+
+    def _store(self, conn, batch: Dict[Tuple[str, str, str], Stat], replace: bool):
+        """Merge batch into eta_stats (or replace the table contents)"""
+        if replace:
+            conn.execute("DELETE FROM eta_stats")
+        else:
+            for row in conn.execute("SELECT scope, key, phase, n, mean, m2 FROM eta_stats"):
+                stat = batch.get(tuple(row[:3]))
+                if stat is not None:
+                    merged = Stat(*row[3:])
+                    merged.merge(stat)
+                    batch[tuple(row[:3])] = merged
+        conn.executemany("""
+            INSERT INTO eta_stats (scope, key, phase, n, mean, m2, updated_at)
+            VALUES (?, ?, ?, ?, ?, ?, CURRENT_TIMESTAMP)
+            ON CONFLICT(scope, key, phase) DO UPDATE SET
+              n=excluded.n, mean=excluded.mean, m2=excluded.m2, updated_at=excluded.updated_at
+        """, [(*key, s.n, s.mean, s.m2) for key, s in batch.items()])
+
+    def _commit_offset(self, conn, position: int):
+        conn.execute("""
+            INSERT INTO event_offsets (consumer, position, updated_at) VALUES (?, ?, CURRENT_TIMESTAMP)
+            ON CONFLICT(consumer) DO UPDATE SET position=excluded.position, updated_at=excluded.updated_at
+        """, (CONSUMER, position))
+
+    def rebuild(self) -> int:
+        """Recompute stats from all delivered orders, return orders seen"""
+        conn = self.db.connect()
+        conn.isolation_level = None
+        try:
+            conn.execute("BEGIN")  # offset and history from one consistent read, no write lock
+            latest = conn.execute("SELECT COALESCE(MAX(id), 0) FROM events").fetchone()[0]
+            batch = self._fold(conn, "1", ())
+            conn.execute("COMMIT")
+        finally:
+            conn.close()
+        with self.db.transaction() as conn:
+            self._store(conn, batch, replace=True)
+            self._commit_offset(conn, latest)
+        self._load()
+        return batch[('all', '', 'delivery')].n if ('all', '', 'delivery') in batch else 0
+
+    def refresh(self, force: bool = False) -> bool:
+        """Fold deliveries since the stored offset; True if the stats changed"""
+        now = time.monotonic()
+        if not force and now - self._checked < self.refresh_interval:
+            return False
+        self._checked = now
+        offset = self.db.query("SELECT position FROM event_offsets WHERE consumer=?", (CONSUMER,))
+        if not offset:
+            self.rebuild()  # first run: learn from the whole history
+            return True
+        latest = self.db.query("SELECT COALESCE(MAX(id), 0) AS id FROM events")[0]['id']
+        if latest > offset[0]['position']:
+            with self.db.transaction() as conn:
+                # Re-read under the write lock: another process may have folded them
+                start = conn.execute("SELECT position FROM event_offsets WHERE consumer=?",
+                                     (CONSUMER,)).fetchone()[0]
+                delivered = [row[0] for row in conn.execute("""
+                    SELECT DISTINCT entity_id FROM events
+                    WHERE id > ? AND id <= ? AND entity = 'orders' AND new_status = 'delivered'
+                      AND old_status IS NOT 'delivered'
+                """, (start, latest))]
+                batch: Dict[Tuple[str, str, str], Stat] = {}
+                for i in range(0, len(delivered), CHUNK):
+                    chunk = delivered[i:i + CHUNK]
+                    for key, stat in self._fold(conn, f"o.id IN ({','.join('?' * len(chunk))})",
+                                                tuple(chunk)).items():
+                        batch.setdefault(key, Stat()).merge(stat)
+                self._store(conn, batch, replace=False)
+                self._commit_offset(conn, latest)
+            offset = [{'position': latest}]
+        if offset[0]['position'] != self.position:
+            self._load()
+            return True
+        return False
+
+    def sync(self) -> bool:
+        """Reader side: reload the stats when the learner moved the offset (no writes)"""
+        offset = self.db.query("SELECT position FROM event_offsets WHERE consumer=?", (CONSUMER,))
+        if offset and offset[0]['position'] != self.position:
+            self._load()
+            return True
+        return False
+
+    def run(self, stop: threading.Event):
+        """Keep the in-memory stats current (every refresh_interval)"""
+        while not stop.is_set():
+            try:
+                self.sync()
+            except sqlite3.Error as e:
+                print(f"⚠️ ETA stats reload failed: {e}")
+            stop.wait(self.refresh_interval)
+
+    def start(self) -> threading.Event:
+        """Reload in a daemon thread, return its stop event"""
+        stop = threading.Event()
+        threading.Thread(target=self.run, args=(stop,), name='eta-sync', daemon=True).start()
+        return stop
+
+    def _load(self):
+        rows = self.db.query("SELECT scope, key, phase, n, mean, m2 FROM eta_stats")
+        position = self.db.query("SELECT position FROM event_offsets WHERE consumer=?", (CONSUMER,))
+        stats = {(r['scope'], r['key'], r['phase']): Stat(r['n'], r['mean'], r['m2']) for r in rows}
+        with self._lock:
+            self.stats = stats
+            self.position = position[0]['position'] if position else None
+
+    # ========== PREDICTION ==========
+
+    def _phase(self, phase: str, driver_id, area) -> Tuple[Optional[Stat], Optional[str], float]:
+        """Most specific stat with enough samples: (stat, level, level weight)"""
+        keys = {'driver_area': f"{driver_id}:{area}" if driver_id and area else None,
+                'driver': str(driver_id) if driver_id else None,
+                'area': area, 'all': ''}
+        fallback = (None, None, 0.0)
+        for level, weight in LEVELS:
+            if keys[level] is None:
+                continue
+            stat = self.stats.get((level, keys[level], phase))
+            if stat is not None and stat.n >= MIN_SAMPLES:
+                return stat, level, weight
+            if stat is not None and stat.n and fallback[0] is None:
+                fallback = (stat, level, weight * 0.5)
+        return fallback
+
+    def predict(self, order: Dict, now: datetime = None) -> Optional[Dict]:
+        """ETA for an open order (None when closed or nothing learned yet)"""
+        status = order.get('status')
+        if status in ('delivered', 'cancelled', 'failed'):
+            return None
+        now = now or datetime.now()
+        driver_id, area = order.get('assigned_driver_id'), area_of(order)
+
+        if status == 'pending':
+            remaining, started = list(PHASES), None
+        elif status == 'assigned':
+            remaining, started = ['pickup', 'delivery'], parse_time(order.get('assigned_at'))
+        else:  # picked_up, in_transit
+            remaining, started = ['delivery'], parse_time(order.get('pickup_time'))
+
+        mean = variance = 0.0
+        confidence = 1.0
+        levels, samples = [], []
+        for i, phase in enumerate(remaining):
+            stat, level, weight = self._phase(phase, driver_id, area)
+            if stat is None:
+                levels.append(None)  # never observed: leave out, trust the rest less
+                confidence = min(confidence, 0.25)
+                continue
+            phase_mean, phase_std = stat.mean, stat.std
+            if i == 0 and started is not None:
+                # Already running: expected remainder, at least a fraction of the spread
+                elapsed = (now - started).total_seconds()
+                phase_mean = max(phase_mean - elapsed, 0.25 * phase_std, 60.0)
+            mean += phase_mean
+            variance += phase_std ** 2
+            confidence = min(confidence, weight * min(1.0, stat.n / FULL_CONFIDENCE_SAMPLES))
+            levels.append(level)
+            samples.append(stat.n)
+
+        if not samples:
+            return None
+        spread = Z_80 * math.sqrt(variance)
+        return {
+            'eta': (now + timedelta(seconds=mean)).isoformat(timespec='seconds'),
+            'earliest': (now + timedelta(seconds=max(mean - spread, 0))).isoformat(timespec='seconds'),
+            'latest': (now + timedelta(seconds=mean + spread)).isoformat(timespec='seconds'),
+            'remaining_minutes': round(mean / 60, 1),
+            'confidence': round(confidence, 2),
+            'basis': dict(zip(remaining, levels)),
+            'samples': min(samples),
+        }
+
+    def poll_interval(self, eta: Optional[Dict]) -> int:
+        """Seconds a client should wait before asking again"""
+        if not eta:
+            return 300
+        return int(min(max(eta['remaining_minutes'] * 60 * 0.1, 30), 600))
+
+
+# ============================================
+# STARTUP
+# ============================================
+
+if __name__ == "__main__":
+    import argparse
+    from logistik_migrations import migrate
+
+    parser = argparse.ArgumentParser(description='Learn delivery phase durations for ETAs')
+    parser.add_argument('--rebuild', action='store_true', help='Recompute from the whole history')
+    args = parser.parse_args()
+
+    db = LogisticsDB()
+    migrate(db)
+    service = EtaService(db)
+    if args.rebuild:
+        print(f"🔁 Rebuilt from {service.rebuild()} deliveries")
+    else:
+        service.refresh(force=True)
+    for phase in PHASES:
+        stat = service.stats.get(('all', '', phase))
+        if stat:
+            print(f"⏱️  {phase:9} {stat.mean / 60:6.1f} min ± {stat.std / 60:5.1f} (n={stat.n})")
+    print(f"✅ {len(service.stats)} stats, event offset {service.position}")
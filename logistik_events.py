@@ -0,0 +1,210 @@
+#!/usr/bin/env python3
+"""
+Event Log - Append-only change feed (CDC) for orders, tasks and invoices
+Triggers write one row to `events` in the same transaction as the change,
+for every write path (LogisticsDB.insert/update, billing runs, ingest
+batches, archiving):
+    insert  new row                      (new_status)
+    update  a watched column changed     (old_status -> new_status; status,
+            assignment, price, dates - see EVENT_SOURCES)
+    delete  row removed (archived)       (old_status)
+
+Consumers read with a cursor (`events.id`), optionally long-polling, and
+store their offset in `event_offsets` after processing (at-least-once).
+Filtered consumers (entities=[...]) read through idx_events_entity and
+can commit past the events they skipped (EventConsumer.scanned).
+compact() drops old events every consumer has already passed.
+
+Run: python logistik_events.py [--follow] [--compact]
+"""
+
+import time
+from typing import Dict, List, Optional, Sequence
+from logistik_db import LogisticsDB
+
+# table -> columns whose change is an 'update' event (status always first;
+# analytics extracts re-read rows on these, see logistik_analytics.py)
+EVENT_SOURCES = {
+    'orders': ['status', 'assigned_driver_id', 'total_price', 'deadline', 'delivery_time'],
+    'tasks': ['status', 'assigned_to'],
+    'invoices': ['status', 'due_date', 'total_amount', 'paid_amount'],
+}
+
+RETENTION_DAYS = 7  # consumed events are kept this long
+MAX_RETENTION_DAYS = 30  # consumers idle longer than this don't hold events back
+
+EVENTS_TABLE = """
+CREATE TABLE IF NOT EXISTS events (
+  id INTEGER PRIMARY KEY AUTOINCREMENT, -- cursor position
+  entity TEXT NOT NULL, -- 'orders', 'tasks', 'invoices'
+  entity_id INTEGER NOT NULL,
+  op TEXT NOT NULL, -- insert, update, delete
+  old_status TEXT,
+  new_status TEXT,
+  created_at TIMESTAMP DEFAULT CURRENT_TIMESTAMP
+)
+"""
+
+# Filtered reads (entity IN (...) AND id > cursor); built in the background (migration 16)
+EVENTS_ENTITY_INDEX = "CREATE INDEX IF NOT EXISTS idx_events_entity ON events(entity, id)"
+
+OFFSETS_TABLE = """
+CREATE TABLE IF NOT EXISTS event_offsets (
+  consumer TEXT PRIMARY KEY,
+  position INTEGER NOT NULL DEFAULT 0,
+  updated_at TIMESTAMP DEFAULT CURRENT_TIMESTAMP
+)
+"""
+
+
+def event_triggers(table: str) -> List[str]:
+    """CREATE TRIGGER statements feeding `events` from one table"""
+    columns = EVENT_SOURCES[table]
+    changed = ' OR '.join(f"old.{c} IS NOT new.{c}" for c in columns)
+    return [
+        f"""CREATE TRIGGER IF NOT EXISTS {table}_events_ai AFTER INSERT ON {table} BEGIN
+              INSERT INTO events (entity, entity_id, op, new_status) VALUES ('{table}', new.id, 'insert', new.status);
+            END""",
+        f"""CREATE TRIGGER IF NOT EXISTS {table}_events_au AFTER UPDATE OF {', '.join(columns)} ON {table}
+              WHEN {changed} BEGIN
+              INSERT INTO events (entity, entity_id, op, old_status, new_status)
+                VALUES ('{table}', new.id, 'update', old.status, new.status);
+            END""",
+        f"""CREATE TRIGGER IF NOT EXISTS {table}_events_ad AFTER DELETE ON {table} BEGIN
+              INSERT INTO events (entity, entity_id, op, old_status) VALUES ('{table}', old.id, 'delete', old.status);
+            END""",
+    ]
+
+
+EVENTS_DDL = [EVENTS_TABLE, OFFSETS_TABLE] + [sql for table in EVENT_SOURCES for sql in event_triggers(table)]
+
+
+def recreate_update_triggers(conn, tables: Sequence[str] = ('orders', 'invoices')):
+    """Migration 17: update triggers watch the columns now listed in EVENT_SOURCES"""
+    for table in tables:
+        conn.execute(f"DROP TRIGGER IF EXISTS {table}_events_au")
+        conn.execute(event_triggers(table)[1])
+
+
+class EventLog:
+    """Cursor reads, long-polling and offsets over `events`"""
+
+    def __init__(self, db: LogisticsDB = None):
+        self.db = db or LogisticsDB()
+
+    def read(self, after: int = 0, entities: Sequence[str] = None, limit: int = 500) -> List[Dict]:
+        """Events with id > after, oldest first"""
+        sql = "SELECT * FROM events WHERE id > ?"
+        params = [after]
+        if entities:
+            sql += f" AND entity IN ({','.join('?' * len(entities))})"
+            params += list(entities)
+        return self.db.query(sql + " ORDER BY id LIMIT ?", tuple(params) + (limit,))
+
+    def poll(self, after: int = 0, entities: Sequence[str] = None, limit: int = 500,
+             timeout: float = 0.0) -> List[Dict]:
+        """Like read(), but wait up to `timeout` seconds for the first new event"""
+        deadline = time.monotonic() + timeout
+        delay = 0.05
+        while True:
+            events = self.read(after, entities, limit)
+            remaining = deadline - time.monotonic()
+            if events or remaining <= 0:
+                return events
+            time.sleep(min(delay, remaining))  # cheap: PK range probe
+            delay = min(delay * 2, 0.5)
+
+    def latest(self) -> int:
+        """Current end of the log (new consumers may start here)"""
+        rows = self.db.query("SELECT seq FROM sqlite_sequence WHERE name='events'")
+        return rows[0]['seq'] if rows else 0
+
+    def get_offset(self, consumer: str) -> int:
+        rows = self.db.query("SELECT position FROM event_offsets WHERE consumer=?", (consumer,))
+        return rows[0]['position'] if rows else 0
+
+    def commit(self, consumer: str, position: int):
+        """Store consumer offset (after its events were processed)"""
+        self.db.execute("""
+            INSERT INTO event_offsets (consumer, position, updated_at) VALUES (?, ?, CURRENT_TIMESTAMP)
+            ON CONFLICT(consumer) DO UPDATE SET position=excluded.position, updated_at=excluded.updated_at
+        """, (consumer, position))
+
+    def consumer(self, name: str, entities: Sequence[str] = None) -> 'EventConsumer':
+        return EventConsumer(self, name, entities)
+
+    def compact(self, retention_days: int = RETENTION_DAYS, max_days: int = MAX_RETENTION_DAYS,
+                batch_size: int = 10000) -> int:
+        """Delete old events all active consumers have passed, in short batches"""
+        where = f"""
+            created_at < datetime('now', '-{int(retention_days)} days')
+            AND (id <= COALESCE((SELECT MIN(position) FROM event_offsets
+                                 WHERE updated_at >= datetime('now', '-{int(max_days)} days')), id)
+                 OR created_at < datetime('now', '-{int(max_days)} days'))
+        """
+        deleted = 0
+        while True:
+            count = self.db.execute(
+                f"DELETE FROM events WHERE id IN (SELECT id FROM events WHERE {where} ORDER BY id LIMIT ?)",
+                (batch_size,))
+            deleted += count
+            if count < batch_size:
+                return deleted
+
+
+class EventConsumer:
+    """Named cursor: poll() new events, commit() when processed"""
+
+    def __init__(self, log: EventLog, name: str, entities: Sequence[str] = None):
+        self.log = log
+        self.name = name
+        self.entities = list(entities) if entities else None
+        self.position = log.get_offset(name)
+        self.scanned = self.position  # every event <= scanned was returned or filtered out
+
+    def poll(self, limit: int = 500, timeout: float = 0.0) -> List[Dict]:
+        head = self.log.latest()  # read first: every event <= head is visible to the poll below
+        events = self.log.poll(self.position, self.entities, limit, timeout)
+        last = events[-1]['id'] if events else self.position
+        self.scanned = last if len(events) >= limit else max(head, last)
+        return events
+
+    def commit(self, position: Optional[int] = None):
+        """Persist offset, e.g. commit(events[-1]['id']) or commit(scanned) once they are processed"""
+        if position is not None:
+            self.position = position
+        self.log.commit(self.name, self.position)
+
+
+# ============================================
+# STARTUP
+# ============================================
+
+if __name__ == "__main__":
+    import argparse
+    from logistik_migrations import migrate
+
+    parser = argparse.ArgumentParser(description='Change feed for orders, tasks and invoices')
+    parser.add_argument('--follow', action='store_true', help='Print new events as they arrive')
+    parser.add_argument('--entity', action='append', help='orders, tasks, invoices')
+    parser.add_argument('--compact', action='store_true', help='Drop old consumed events')
+    args = parser.parse_args()
+
+    db = LogisticsDB()
+    migrate(db)
+    log = EventLog(db)
+
+    if args.compact:
+        print(f"🧹 Compacted {log.compact()} events")
+
+    if args.follow:
+        after = log.latest()
+        print(f"👀 Following events after #{after} (CTRL+C to stop)")
+        try:
+            while True:
+                for event in log.poll(after, args.entity, timeout=30):
+                    print(f"  #{event['id']} {event['entity']}/{event['entity_id']} {event['op']}: "
+                          f"{event['old_status'] or '-'} -> {event['new_status'] or '-'}")
+                    after = event['id']
+        except KeyboardInterrupt:
+            print("\n👋 Stopped")
@@ -0,0 +1,249 @@
+#!/usr/bin/env python3
+"""
+Driver Gateway - asyncio HTTP server for the driver app endpoints
+Serves the high-volume driver routes (login, status, order start/complete/
+update) with the standard library only. Connections are coroutines, so
+thousands of idle keep-alive driver apps cost almost nothing; the blocking
+SQLite work runs in a dedicated thread pool.
+
+Same handlers as the Flask API (logistik_driver.DriverService), so both
+return identical responses. Everything else stays on logistik_api.py.
+
+Run: python logistik_gateway.py [--port 5001] [--db-workers 16]
+"""
+
+import asyncio
+import functools
+import re
+from urllib.parse import parse_qs
+from concurrent.futures import ThreadPoolExecutor
+from http import HTTPStatus
+from typing import Dict, Optional, Tuple
+from logistik_config import CONFIG
+from logistik_db import LogisticsDB
+from logistik_driver import DriverService
+from logistik_http import dumps, loads, maybe_compress
+
+MAX_HEADER_BYTES = 64 * 1024
+MAX_BODY_BYTES = 1024 * 1024
+KEEPALIVE_TIMEOUT = 75  # seconds an idle connection stays open
+BODY_TIMEOUT = 30  # seconds to receive a body once its headers are in
+
+CORS_HEADERS = {
+    'Access-Control-Allow-Origin': '*',
+    'Access-Control-Allow-Methods': 'GET, POST, PUT, DELETE, OPTIONS',
+    'Access-Control-Allow-Headers': 'Content-Type',
+}
+
+# (method, path pattern, DriverService method, takes JSON body, query params)
+ROUTES = [
+    ('POST', re.compile(r'^/api/driver/login$'), 'login', True, ()),
+    ('POST', re.compile(r'^/api/driver/status$'), 'update_status', True, ()),
+    ('GET', re.compile(r'^/api/driver/orders/(\d+)$'), 'orders', False, ('since',)),
+    ('POST', re.compile(r'^/api/driver/order/(\d+)/start$'), 'start_delivery', True, ()),
+    ('POST', re.compile(r'^/api/driver/order/(\d+)/complete$'), 'complete_delivery', True, ()),
+    ('POST', re.compile(r'^/api/driver/order/(\d+)/update$'), 'update_order', True, ()),
+]
+
+
+class BadRequest(Exception):
+    """Request rejected before dispatch; answered with `status`, connection closed"""
+
+    def __init__(self, message: str, status: int = 400):
+        super().__init__(message)
+        self.status = status
+
+
+class DriverGateway:
+    """Keep-alive HTTP/1.1 server, DB calls offloaded to a thread pool"""
+
+    def __init__(self, db: LogisticsDB = None, host: str = '0.0.0.0', port: int = None,
+                 db_workers: int = 16, keepalive_timeout: float = KEEPALIVE_TIMEOUT):
+        self.service = DriverService(db or LogisticsDB(compact_rows=True))
+        self.host = host
+        self.port = CONFIG['gateway_port'] if port is None else port
+        self.keepalive_timeout = keepalive_timeout
+        self.pool = ThreadPoolExecutor(max_workers=db_workers, thread_name_prefix='gateway-db')
+        self.connections = 0
+        self.requests = 0
+
+    # ---------- HTTP ----------
+
+    async def _read_request(self, reader: asyncio.StreamReader) -> Optional[Tuple[str, str, str, Dict, bytes]]:
+        """Next request on the connection, None when the client is gone"""
+        try:
+            head = await asyncio.wait_for(reader.readuntil(b'\r\n\r\n'), self.keepalive_timeout)
+        except (asyncio.IncompleteReadError, asyncio.TimeoutError, ConnectionError):
+            return None
+        except asyncio.LimitOverrunError:
+            raise BadRequest('Headers too large')
+
+        lines = head.decode('latin-1').split('\r\n')
+        try:
+            method, target, version = lines[0].split(' ', 2)
+        except ValueError:
+            raise BadRequest('Malformed request line')
+        headers = {}
+        for line in lines[1:]:
+            if ':' in line:
+                name, value = line.split(':', 1)
+                headers[name.strip().lower()] = value.strip()
+
+        if headers.get('transfer-encoding', 'identity').lower() != 'identity':
+            # Chunked bodies are not parsed; ignoring them would read the chunks as the next request
+            raise BadRequest('Transfer-Encoding not supported, send Content-Length', 411)
+        try:
+            length = int(headers.get('content-length') or 0)
+        except ValueError:
+            raise BadRequest('Invalid Content-Length')
+        if length < 0 or length > MAX_BODY_BYTES:
+            raise BadRequest('Body too large', 413)
+        try:
+            body = await asyncio.wait_for(reader.readexactly(length), BODY_TIMEOUT) if length else b''
+        except asyncio.TimeoutError:
+            raise BadRequest('Body not received in time', 408)
+        except (asyncio.IncompleteReadError, ConnectionError):
+            return None
+        return method.upper(), target, version, headers, body
+
+    def _response(self, status: int, payload: Optional[Dict], keep_alive: bool,
+                  accept_encoding: str = '') -> bytes:
+        headers = dict(CORS_HEADERS)
+        body = b''
+        if payload is not None:
+            body, encoding = maybe_compress(dumps(payload), 'application/json', accept_encoding)
+            headers['Content-Type'] = 'application/json'
+            headers['Vary'] = 'Accept-Encoding'
+            if encoding:
+                headers['Content-Encoding'] = encoding
+        headers['Content-Length'] = str(len(body))
+        headers['Connection'] = 'keep-alive' if keep_alive else 'close'
+        head = f"HTTP/1.1 {status} {HTTPStatus(status).phrase}\r\n"
+        head += ''.join(f"{name}: {value}\r\n" for name, value in headers.items())
+        return head.encode('latin-1') + b'\r\n' + body
+
+    async def _dispatch(self, method: str, target: str, body: bytes) -> Tuple[Dict, int]:
+        path, _, query = target.partition('?')
+        for route_method, pattern, handler, takes_body, params in ROUTES:
+            match = pattern.match(path)
+            if not match:
+                continue
+            if method != route_method:
+                return {'error': 'Method not allowed'}, 405
+            args = [int(group) for group in match.groups()]
+            if takes_body:
+                try:
+                    data = loads(body or b'null')
+                except ValueError:
+                    raise BadRequest('Invalid JSON')
+                if not isinstance(data, dict):
+                    raise BadRequest('Expected JSON object')
+                args.append(data)
+            values = parse_qs(query)
+            kwargs = {name: values[name][0] for name in params if name in values}
+            call = functools.partial(getattr(self.service, handler), *args, **kwargs)
+            return await asyncio.get_running_loop().run_in_executor(self.pool, call)
+        return {'error': 'Endpoint not found'}, 404
+
+    async def handle_connection(self, reader: asyncio.StreamReader, writer: asyncio.StreamWriter):
+        """Serve requests on one connection until close/timeout"""
+        self.connections += 1
+        try:
+            while True:
+                try:
+                    request = await self._read_request(reader)
+                except BadRequest as e:
+                    writer.write(self._response(e.status, {'error': str(e)}, keep_alive=False))
+                    break
+                if request is None:
+                    break
+                method, target, version, headers, body = request
+                path = target.partition('?')[0]
+                connection = headers.get('connection', '').lower()
+                keep_alive = connection != 'close' and (version != 'HTTP/1.0' or connection == 'keep-alive')
+
+                if method == 'OPTIONS':
+                    status, payload = 204, None
+                else:
+                    try:
+                        payload, status = await self._dispatch(method, target, body)
+                    except BadRequest as e:
+                        payload, status = {'error': str(e)}, 400
+                    except Exception as e:
+                        print(f"❌ Gateway error on {method} {path}: {e}")
+                        payload, status = {'error': 'Internal server error'}, 500
+
+                self.requests += 1
+                writer.write(self._response(status, payload, keep_alive,
+                                            headers.get('accept-encoding', '')))
+                await writer.drain()
+                if not keep_alive:
+                    break
+        except ConnectionError:
+            pass
+        finally:
+            self.connections -= 1
+            writer.close()
+
+    # ---------- SERVER ----------
+
+    async def serve(self, ready: asyncio.Event = None):
+        """Run until cancelled"""
+        server = await asyncio.start_server(self.handle_connection, self.host, self.port,
+                                            limit=MAX_HEADER_BYTES, backlog=4096)
+        self.port = server.sockets[0].getsockname()[1]  # port 0: pick a free one
+        if ready:
+            ready.set()
+        try:
+            async with server:
+                await server.serve_forever()
+        finally:
+            self.pool.shutdown(wait=False)
+
+
+def raise_fd_limit():
+    """One file descriptor per connection: lift the soft limit to the hard limit"""
+    try:
+        import resource
+    except ImportError:
+        return None  # Windows
+    soft, hard = resource.getrlimit(resource.RLIMIT_NOFILE)
+    if soft < hard:
+        resource.setrlimit(resource.RLIMIT_NOFILE, (hard, hard))
+    return resource.getrlimit(resource.RLIMIT_NOFILE)[0]
+
+
+# ============================================
+# STARTUP
+# ============================================
+
+if __name__ == "__main__":
+    import argparse
+    from logistik_migrations import migrate
+
+    parser = argparse.ArgumentParser(description='Asyncio gateway for the driver app endpoints')
+    parser.add_argument('--host', default='0.0.0.0')
+    parser.add_argument('--port', type=int, default=CONFIG['gateway_port'],
+                        help=f"Port (default: {CONFIG['gateway_port']})")
+    parser.add_argument('--db-workers', type=int, default=16, help='DB thread pool size')
+    args = parser.parse_args()
+
+    db = LogisticsDB(compact_rows=True)
+    migrate(db)
+    gateway = DriverGateway(db, host=args.host, port=args.port, db_workers=args.db_workers)
+    fd_limit = raise_fd_limit()
+
+    print("=" * 50)
+    print("📱 DRIVER GATEWAY (asyncio)")
+    print("=" * 50)
+    print(f"  http://{args.host}:{args.port}")
+    print(f"  DB workers: {args.db_workers}, keep-alive: {KEEPALIVE_TIMEOUT}s"
+          + (f", max connections: ~{fd_limit}" if fd_limit else ""))
+    for method, pattern, *_ in ROUTES:
+        print(f"  {method:4} {pattern.pattern.strip('^$')}")
+    print()
+
+    try:
+        asyncio.run(gateway.serve())
+    except KeyboardInterrupt:
+        print("\n👋 Gateway stopped")
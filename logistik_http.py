@@ -0,0 +1,96 @@
+#!/usr/bin/env python3
+"""
+HTTP Helpers - JSON encoding and response compression
+Shared by the Flask API and the asyncio driver gateway (stdlib only here).
+
+JSON: orjson when installed (optional, pip install orjson), stdlib json
+otherwise - both produce the same types:
+    datetime / date / time -> ISO 8601 string ('2026-10-19T14:05:00')
+    Decimal                -> number
+    compact DB rows        -> object
+
+Compression: gzip or deflate (by Accept-Encoding q-values) for
+compressible bodies of at least COMPRESS_MIN_BYTES; small bodies are
+sent as-is, where compression costs more than it saves.
+"""
+
+import gzip
+import json
+import zlib
+from datetime import date, datetime, time
+from decimal import Decimal
+from typing import Any, Optional
+from logistik_rows import CompactRow, jsonable
+
+try:
+    import orjson  # optional fast path
+except ImportError:
+    orjson = None
+
+COMPRESS_MIN_BYTES = 1024
+COMPRESS_LEVEL = 5  # ~gzip -6 size, noticeably less CPU
+COMPRESSIBLE_TYPES = ('application/json', 'application/javascript', 'image/svg+xml')
+ENCODINGS = ('gzip', 'deflate')  # preference on equal q
+
+
+def default(obj: Any) -> Any:
+    """Types neither encoder handles the same way by itself"""
+    if isinstance(obj, CompactRow):
+        return obj.to_dict()
+    if isinstance(obj, (datetime, date, time)):
+        return obj.isoformat()
+    if isinstance(obj, Decimal):
+        return float(obj)
+    raise TypeError(f"Object of type {type(obj).__name__} is not JSON serializable")
+
+
+def dumps(obj: Any) -> bytes:
+    """Encode response payload as UTF-8 JSON"""
+    if orjson is not None:
+        return orjson.dumps(obj, default=default, option=orjson.OPT_NON_STR_KEYS)
+    # stdlib writes tuples (compact rows) as arrays without asking default()
+    return json.dumps(jsonable(obj), default=default, ensure_ascii=False,
+                      separators=(',', ':')).encode()
+
+
+def loads(data) -> Any:
+    return orjson.loads(data) if orjson is not None else json.loads(data)
+
+
+def compressible(mimetype: Optional[str]) -> bool:
+    return bool(mimetype) and (mimetype.startswith('text/') or mimetype in COMPRESSIBLE_TYPES)
+
+
+def negotiate(accept_encoding: str) -> Optional[str]:
+    """Pick gzip/deflate from an Accept-Encoding header, None for identity"""
+    weights = {}
+    for part in (accept_encoding or '').split(','):
+        name, _, params = part.strip().partition(';')
+        q = 1.0
+        params = params.strip()
+        if params.startswith('q='):
+            try:
+                q = float(params[2:])
+            except ValueError:
+                q = 0.0
+        weights[name.strip().lower()] = q
+    star = weights.get('*', 0.0)
+    ranked = [(weights.get(name, star), -pos, name) for pos, name in enumerate(ENCODINGS)]
+    q, _, name = max(ranked)
+    return name if q > 0 else None
+
+
+def compress(data: bytes, encoding: str) -> bytes:
+    if encoding == 'gzip':
+        return gzip.compress(data, compresslevel=COMPRESS_LEVEL, mtime=0)
+    return zlib.compress(data, COMPRESS_LEVEL)  # HTTP "deflate" = zlib stream
+
+
+def maybe_compress(data: bytes, mimetype: Optional[str], accept_encoding: str):
+    """(body, encoding or None) - compress if worth it and accepted"""
+    if len(data) < COMPRESS_MIN_BYTES or not compressible(mimetype):
+        return data, None
+    encoding = negotiate(accept_encoding)
+    if not encoding:
+        return data, None
+    return compress(data, encoding), encoding
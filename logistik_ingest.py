@@ -0,0 +1,374 @@
+#!/usr/bin/env python3
+"""
+Ingestion Queue - Buffered, idempotent intake for orders and webhooks
+POST /api/customer/order and /webhook/order/update only append the payload
+to a small local queue DB (logistik_ingest.db, WAL, fsync on commit) and
+answer 202 Accepted. A flusher writes queued items to the main DB in
+batches: one transaction per batch instead of one per request, so intake
+latency stays flat while the main DB is busy.
+
+Idempotency: the `Idempotency-Key` header (or `idempotency_key` in the
+body) is stored with UNIQUE; retries inside the TTL get the first receipt
+back instead of a second order. Without a key the payload hash is used
+with a short window, which catches partner retry storms.
+Queue entries applied to the main DB are recorded in `ingest_applied`
+(key@queue id) in the same transaction, so a crash between both commits
+never applies an item twice, while a new entry for an expired key is
+applied again.
+
+Run: python logistik_ingest.py [--once] [--status]
+"""
+
+import hashlib
+import itertools
+import json
+import sqlite3
+import threading
+import time
+from datetime import datetime, timedelta
+from pathlib import Path
+from typing import Dict, List, Optional
+from logistik_config import CONFIG
+from logistik_db import LogisticsDB
+from logistik_sequences import format_number
+
+KEY_TTL = 24 * 3600  # seconds: explicit idempotency keys
+HASH_TTL = 10 * 60  # seconds: payload-hash keys (retries, not repeat orders)
+
+QUEUE_TABLE = """
+CREATE TABLE IF NOT EXISTS ingest_queue (
+  id INTEGER PRIMARY KEY AUTOINCREMENT,
+  idempotency_key TEXT UNIQUE NOT NULL,
+  kind TEXT NOT NULL, -- 'order', 'webhook'
+  payload TEXT NOT NULL,
+  received_at REAL NOT NULL,
+  expires_at REAL NOT NULL,
+  processed_at REAL,
+  result_id INTEGER, -- order_id / message_id
+  error TEXT
+)
+"""
+QUEUE_INDEX = "CREATE INDEX IF NOT EXISTS idx_ingest_pending ON ingest_queue(id) WHERE processed_at IS NULL"
+
+# Main DB: keys already written (same transaction as the rows themselves)
+INGEST_APPLIED_TABLE = """
+CREATE TABLE IF NOT EXISTS ingest_applied (
+  idempotency_key TEXT PRIMARY KEY,
+  result_id INTEGER,
+  applied_at TIMESTAMP DEFAULT CURRENT_TIMESTAMP
+) WITHOUT ROWID
+"""
+
+RESULT_NAMES = {'order': 'order_id', 'webhook': 'message_id'}
+
+# Payload fields the flusher reads; each must be a scalar (str/number/bool/null)
+PAYLOAD_FIELDS = {
+    'order': ['name', 'phone', 'address', 'email', 'city', 'pickup_address', 'delivery_address',
+              'description', 'price', 'weight_kg'],
+    'webhook': ['order_id', 'message'],
+}
+
+_memory_ids = itertools.count(1)
+
+
+def validate(kind: str, data: Dict) -> Dict:
+    """Cheap checks before accepting (bad payloads get 400, not a queue entry)"""
+    if kind not in RESULT_NAMES:
+        raise ValueError(f"Unknown kind: {kind}")
+    if not isinstance(data, dict):
+        raise ValueError('Expected JSON object')
+    nested = [field for field in PAYLOAD_FIELDS[kind] if isinstance(data.get(field), (dict, list))]
+    if nested:
+        raise ValueError(f"{', '.join(nested)} must be plain values")
+    if kind == 'webhook':
+        order_id = data.get('order_id')
+        if order_id is not None and (isinstance(order_id, bool) or not isinstance(order_id, int)):
+            raise ValueError('order_id must be an integer')
+    if kind == 'order':
+        try:
+            float(data.get('price', 50.0))
+            float(data.get('weight_kg', 0))
+        except (TypeError, ValueError):
+            raise ValueError('price and weight_kg must be numbers')
+    return data
+
+
+def applied_key(item) -> str:
+    """ingest_applied key of one queue entry: a key reused after its TTL is a new entry"""
+    return f"{item['idempotency_key']}@{item['id']}"
+
+
+class IngestQueue:
+    """Durable local queue + batch flusher into the main DB"""
+
+    def __init__(self, db: LogisticsDB = None, path=None, batch_size: int = 500,
+                 key_ttl: int = KEY_TTL, hash_ttl: int = HASH_TTL):
+        self.db = db or LogisticsDB()
+        self.batch_size = batch_size
+        self.key_ttl = key_ttl
+        self.hash_ttl = hash_ttl
+        self._last_purge = 0.0
+
+        if self.db.in_memory:
+            self.path = f"file:logistik-ingest-{next(_memory_ids)}?mode=memory&cache=shared"
+            self._keepalive = sqlite3.connect(self.path, uri=True)
+        else:
+            self.path = str(path or CONFIG['ingest_path'] or
+                            Path(self.db.db_path).with_name(f"{Path(self.db.db_path).stem}_ingest.db"))
+
+        self._ready = False  # queue DB is created on first use
+
+    def connect(self) -> sqlite3.Connection:
+        conn = sqlite3.connect(self.path, uri=self.path.startswith('file:'))
+        conn.row_factory = sqlite3.Row
+        if not self._ready:
+            conn.execute("PRAGMA journal_mode=WAL")  # appends don't block the flusher's reads
+            conn.execute(QUEUE_TABLE)
+            conn.execute(QUEUE_INDEX)
+            conn.commit()
+            self._ready = True
+        conn.execute("PRAGMA synchronous=FULL")  # 202 means on disk
+        return conn
+
+    # ========== INTAKE ==========
+
+    def submit(self, kind: str, data: Dict, key: Optional[str] = None) -> Dict:
+        """Queue payload, return receipt (same receipt for duplicates)"""
+        validate(kind, data)
+        key = key or data.get('idempotency_key')
+        payload = json.dumps(data, sort_keys=True, separators=(',', ':'))
+        if key:
+            key, ttl = f"{kind}:{key}", self.key_ttl
+        else:
+            key, ttl = f"{kind}#{hashlib.sha256(payload.encode()).hexdigest()}", self.hash_ttl
+
+        now = time.time()
+        conn = self.connect()
+        try:
+            with conn:
+                # Expired key: the slot is free again
+                conn.execute("DELETE FROM ingest_queue WHERE idempotency_key=? AND expires_at<? "
+                             "AND processed_at IS NOT NULL", (key, now))
+                cursor = conn.execute("""
+                    INSERT INTO ingest_queue (idempotency_key, kind, payload, received_at, expires_at)
+                    VALUES (?, ?, ?, ?, ?) ON CONFLICT(idempotency_key) DO NOTHING
+                """, (key, kind, payload, now, now + ttl))
+                duplicate = cursor.rowcount == 0
+            row = conn.execute("SELECT * FROM ingest_queue WHERE idempotency_key=?", (key,)).fetchone()
+            return self._receipt(row, duplicate)
+        finally:
+            conn.close()
+
+    def _receipt(self, row, duplicate: bool = False) -> Dict:
+        status = 'failed' if row['error'] else 'processed' if row['processed_at'] else 'queued'
+        kind, key = row['kind'], row['idempotency_key']
+        receipt = {
+            'ingest_id': row['id'],
+            'idempotency_key': key[len(kind) + 1:] if key.startswith(f"{kind}:") else None,  # None: payload hash
+            'status': status,
+            'duplicate': duplicate,
+            RESULT_NAMES[kind]: row['result_id'],
+        }
+        if row['error']:
+            receipt['error'] = row['error']
+        return receipt
+
+    def get_receipt(self, ingest_id: int) -> Optional[Dict]:
+        """Status of one queued item (order_id once processed)"""
+        conn = self.connect()
+        try:
+            row = conn.execute("SELECT * FROM ingest_queue WHERE id=?", (ingest_id,)).fetchone()
+            return self._receipt(row) if row else None
+        finally:
+            conn.close()
+
+    def depth(self) -> int:
+        """Items waiting for the flusher"""
+        conn = self.connect()
+        try:
+            return conn.execute("SELECT COUNT(*) FROM ingest_queue WHERE processed_at IS NULL").fetchone()[0]
+        finally:
+            conn.close()
+
+    # ========== FLUSH ==========
+
+    def _apply_orders(self, conn, items: List[sqlite3.Row], results: Dict[int, tuple]):
+        """Customers, orders and scheduler tasks for a batch of order payloads"""
+        if not items:
+            return
+        day, next_value = self.db.sequences.reserve('ORD', len(items), conn=conn)
+        customers = {}  # email -> id within this batch
+        deadline = (datetime.now() + timedelta(days=1)).isoformat()
+        task_deadline = (datetime.now() + timedelta(hours=24)).isoformat()
+        for item in items:
+            data = json.loads(item['payload'])
+            conn.execute("SAVEPOINT item")
+            try:
+                # Find or create customer
+                email = data.get('email')
+                customer_id = customers.get(email) if email else None
+                if customer_id is None and email:
+                    row = conn.execute("SELECT id FROM customers WHERE email=?", (email,)).fetchone()
+                    customer_id = row['id'] if row else None
+                if customer_id is None:
+                    customer_id = conn.execute("""
+                        INSERT INTO customers (name, phone, address, email, city, company_name)
+                        VALUES (?, ?, ?, ?, ?, '')
+                    """, (data.get('name'), data.get('phone'), data.get('address'),
+                          email or '', data.get('city') or '')).lastrowid
+                if email:
+                    customers[email] = customer_id
+
+                price = float(data.get('price', 50.0))
+                order_id = conn.execute("""
+                    INSERT INTO orders (order_number, customer_id, pickup_address, delivery_address,
+                                        base_price, total_price, status, deadline,
+                                        parcel_description, weight_kg)
+                    VALUES (?, ?, ?, ?, ?, ?, 'pending', ?, ?, ?)
+                """, (format_number('ORD', day, next_value), customer_id, data.get('pickup_address'),
+                      data.get('delivery_address'), price, price, deadline,
+                      data.get('description'), float(data.get('weight_kg', 0)))).lastrowid
+                next_value += 1
+
+                # Task for SCHEDULER to assign driver
+                conn.execute("""
+                    INSERT INTO tasks (title, task_type, assigned_to, deadline, status,
+                                       related_order_id, priority)
+                    VALUES (?, 'assign_driver', 'scheduler', ?, 'pending', ?, 'high')
+                """, (f'Assign driver for order #{order_id}', task_deadline, order_id))
+                conn.execute("RELEASE item")
+                results[item['id']] = (order_id, None)
+            except Exception as e:  # bad item fails alone, the batch and the flusher go on
+                conn.execute("ROLLBACK TO item")
+                conn.execute("RELEASE item")
+                results[item['id']] = (None, str(e))
+
+    def _apply_webhooks(self, conn, items: List[sqlite3.Row], results: Dict[int, tuple]):
+        for item in items:
+            data = json.loads(item['payload'])
+            conn.execute("SAVEPOINT item")
+            try:
+                message_id = conn.execute("""
+                    INSERT INTO messages (order_id, from_type, from_id, to_type, to_id, message_text, channel)
+                    VALUES (?, 'system', 0, 'system', 0, ?, 'webhook')
+                """, (data.get('order_id'),
+                      f"Webhook update: {data.get('message', 'Status changed')}")).lastrowid
+                conn.execute("RELEASE item")
+                results[item['id']] = (message_id, None)
+            except Exception as e:
+                conn.execute("ROLLBACK TO item")
+                conn.execute("RELEASE item")
+                results[item['id']] = (None, str(e))
+
+    def flush(self, max_items: int = None) -> int:
+        """Write one batch of queued items to the main DB, return count"""
+        queue = self.connect()
+        try:
+            items = queue.execute("""
+                SELECT * FROM ingest_queue WHERE processed_at IS NULL ORDER BY id LIMIT ?
+            """, (max_items or self.batch_size,)).fetchall()
+            if not items:
+                return 0
+
+            results: Dict[int, tuple] = {}
+            with self.db.transaction() as conn:
+                keys = [applied_key(item) for item in items]
+                marks = ','.join('?' * len(keys))
+                applied = {row['idempotency_key']: row['result_id'] for row in conn.execute(
+                    f"SELECT * FROM ingest_applied WHERE idempotency_key IN ({marks})", keys)}
+                pending = []
+                for item in items:
+                    if applied_key(item) in applied:  # written before a crash
+                        results[item['id']] = (applied[applied_key(item)], None)
+                    else:
+                        pending.append(item)
+
+                self._apply_orders(conn, [i for i in pending if i['kind'] == 'order'], results)
+                self._apply_webhooks(conn, [i for i in pending if i['kind'] == 'webhook'], results)
+
+                conn.executemany("INSERT INTO ingest_applied (idempotency_key, result_id) VALUES (?, ?)",
+                                 [(applied_key(item), results[item['id']][0]) for item in pending
+                                  if results[item['id']][1] is None])
+
+            now = time.time()
+            with queue:
+                queue.executemany("UPDATE ingest_queue SET processed_at=?, result_id=?, error=? WHERE id=?",
+                                  [(now, result_id, error, item_id)
+                                   for item_id, (result_id, error) in results.items()])
+            return len(items)
+        finally:
+            queue.close()
+
+    def purge(self):
+        """Drop receipts past their TTL (queue DB) and old applied keys (main DB)"""
+        now = time.time()
+        conn = self.connect()
+        try:
+            with conn:
+                conn.execute("DELETE FROM ingest_queue WHERE processed_at IS NOT NULL AND expires_at < ?",
+                             (now,))
+        finally:
+            conn.close()
+        cutoff = time.gmtime(now - max(self.key_ttl, self.hash_ttl))  # CURRENT_TIMESTAMP is UTC
+        self.db.execute("DELETE FROM ingest_applied WHERE applied_at < ?",
+                        (time.strftime('%Y-%m-%d %H:%M:%S', cutoff),))
+        self._last_purge = now
+
+    def drain(self) -> int:
+        """Flush until the queue is empty"""
+        total = 0
+        while True:
+            count = self.flush()
+            total += count
+            if count < self.batch_size:
+                return total
+
+    def run(self, stop: threading.Event, interval: float = 0.2, purge_every: float = 300):
+        """Flush loop: batches grow by themselves while the main DB is slow"""
+        while not stop.is_set():
+            try:
+                if not self.drain():
+                    stop.wait(interval)
+                if time.time() - self._last_purge > purge_every:
+                    self.purge()
+            except Exception as e:  # the flusher thread must not die (items fail one by one)
+                print(f"❌ Ingest flush failed, retrying: {e}")
+                stop.wait(interval * 5)
+
+    def start(self, interval: float = 0.2) -> threading.Event:
+        """Run the flusher in a daemon thread, return its stop event"""
+        stop = threading.Event()
+        threading.Thread(target=self.run, args=(stop, interval), name='ingest-flusher',
+                         daemon=True).start()
+        return stop
+
+
+# ============================================
+# STARTUP
+# ============================================
+
+if __name__ == "__main__":
+    import argparse
+    from logistik_migrations import migrate
+
+    parser = argparse.ArgumentParser(description='Flush the ingestion queue into the main DB')
+    parser.add_argument('--once', action='store_true', help='Flush everything queued, then exit')
+    parser.add_argument('--status', action='store_true', help='Show queue depth only')
+    args = parser.parse_args()
+
+    db = LogisticsDB()
+    migrate(db)
+    ingest = IngestQueue(db)
+    print(f"📥 Ingest queue: {ingest.path} ({ingest.depth()} waiting)")
+
+    if args.status:
+        pass
+    elif args.once:
+        print(f"✅ Flushed {ingest.drain()} items")
+    else:
+        stop = threading.Event()
+        try:
+            ingest.run(stop)
+        except KeyboardInterrupt:
+            stop.set()
+            print("\n👋 Ingest flusher stopped")
@@ -0,0 +1,413 @@
+#!/usr/bin/env python3
+"""
+Invoice Renderer - Produces invoice documents (HTML + PDF)
+Renders invoices in batches on a process pool, stores the files
+content-addressed on disk and registers them in `documents`.
+Invoices whose data did not change since the last render are skipped.
+
+Run: python logistik_invoices.py [--since 2026-09-01] [--workers 8]
+"""
+
+import hashlib
+import html
+import json
+import os
+from concurrent.futures import ProcessPoolExecutor
+from datetime import datetime
+from pathlib import Path
+from typing import Dict, List, Optional, Tuple
+from logistik_config import CONFIG
+from logistik_db import LogisticsDB
+
+INVOICE_DIR = Path(CONFIG['invoice_dir'])
+
+# Bump when the templates change, so every invoice gets re-rendered once
+TEMPLATE_VERSION = 1
+
+COMPANY_NAME = "Logistics Team"
+
+# Columns added to `documents` for rendered invoices (migration 3)
+DOCUMENT_COLUMNS = {
+    'related_invoice_id': 'INTEGER',
+    'source_hash': 'TEXT',  # fingerprint of the render input
+}
+
+DOCUMENT_INDEX = """
+CREATE INDEX IF NOT EXISTS idx_documents_invoice ON documents(related_invoice_id, document_type)
+"""
+
+
+# ============================================
+# DATA LOADING (set-based, one batch at a time)
+# ============================================
+
+def load_invoice_batch(conn, invoice_ids: List[int]) -> List[Dict]:
+    """Load invoices + customer + order lines for a batch of ids"""
+    marks = ','.join('?' * len(invoice_ids))
+    invoices = [dict(row) for row in conn.execute(f"""
+        SELECT i.*, c.name AS customer_name, c.company_name, c.address AS customer_address,
+               c.city AS customer_city, c.postal_code AS customer_postal, c.tax_id AS customer_tax_id
+        FROM invoices i JOIN customers c ON c.id = i.customer_id
+        WHERE i.id IN ({marks})
+        ORDER BY i.id
+    """, invoice_ids)]
+
+    # Lines: orders linked via orders.invoice_id (billing runs), plus the
+    # single order of older per-delivery invoices
+    lines = {}
+    for row in conn.execute(f"""
+        SELECT o.invoice_id, o.id AS order_id, o.order_number, o.parcel_description,
+               o.delivery_address, o.delivery_time, o.total_price
+        FROM orders o WHERE o.invoice_id IN ({marks})
+        UNION
+        SELECT i.id, o.id, o.order_number, o.parcel_description,
+               o.delivery_address, o.delivery_time, o.total_price
+        FROM invoices i JOIN orders o ON o.id = i.order_id
+        WHERE i.id IN ({marks}) AND o.invoice_id IS NULL
+        ORDER BY 2
+    """, invoice_ids + invoice_ids):
+        lines.setdefault(row['invoice_id'], []).append(dict(row))
+
+    for invoice in invoices:
+        invoice['lines'] = lines.get(invoice['id'], [])
+    return invoices
+
+
+# Fields the templates print (status / paid_* / updated_at changes don't re-render)
+RENDERED_FIELDS = ('invoice_number', 'issue_date', 'due_date', 'company_name', 'customer_name',
+                   'customer_address', 'customer_postal', 'customer_city', 'customer_tax_id',
+                   'tax_rate', 'subtotal', 'tax_amount', 'total_amount')
+RENDERED_LINE_FIELDS = ('order_number', 'parcel_description', 'delivery_address', 'delivery_time',
+                        'total_price')
+
+
+def fingerprint(invoice: Dict) -> str:
+    """Stable hash of everything that ends up in the document"""
+    payload = json.dumps({
+        'template': TEMPLATE_VERSION,
+        'invoice': {field: invoice[field] for field in RENDERED_FIELDS},
+        'lines': [[line[field] for field in RENDERED_LINE_FIELDS] for line in invoice['lines']],
+    }, sort_keys=True, default=str)
+    return hashlib.sha256(payload.encode('utf-8')).hexdigest()
+
+
+# ============================================
+# TEMPLATES
+# ============================================
+
+def _money(value) -> str:
+    return f"€{float(value or 0):.2f}"
+
+
+def _text_lines(invoice: Dict) -> List[str]:
+    """Plain text layout shared by the PDF renderer"""
+    out = [
+        COMPANY_NAME,
+        "",
+        f"RECHNUNG {invoice['invoice_number']}",
+        f"Rechnungsdatum: {invoice['issue_date']}    Fällig: {invoice['due_date']}",
+        "",
+        invoice['company_name'] or invoice['customer_name'],
+    ]
+    if invoice['company_name']:
+        out.append(invoice['customer_name'])
+    out.append(invoice['customer_address'] or '')
+    out.append(f"{invoice['customer_postal'] or ''} {invoice['customer_city'] or ''}".strip())
+    if invoice['customer_tax_id']:
+        out.append(f"USt-IdNr.: {invoice['customer_tax_id']}")
+    out += ["", "Pos  Auftrag                  Lieferung    Betrag", "-" * 60]
+
+    for pos, line in enumerate(invoice['lines'], 1):
+        delivered = (line['delivery_time'] or '')[:10]
+        out.append(f"{pos:<4} {line['order_number']:<24} {delivered:<12} {_money(line['total_price'])}")
+        if line['parcel_description']:
+            out.append(f"     {line['parcel_description']}")
+        out.append(f"     -> {line['delivery_address']}")
+
+    tax_rate = invoice['tax_rate'] if invoice['tax_rate'] is not None else 0.19
+    out += [
+        "-" * 60,
+        f"Netto: {_money(invoice['subtotal'])}",
+        f"MwSt ({tax_rate * 100:.0f}%): {_money(invoice['tax_amount'])}",
+        f"Gesamt: {_money(invoice['total_amount'])}",
+        "",
+        f"Zahlbar bis {invoice['due_date']}.",
+    ]
+    return out
+
+
+def render_html(invoice: Dict) -> bytes:
+    """Render invoice as standalone HTML"""
+    e = lambda value: html.escape(str(value or ''))
+    rows = ''.join(
+        f"<tr><td>{pos}</td><td>{e(line['order_number'])}<br><small>{e(line['parcel_description'])}"
+        f" &rarr; {e(line['delivery_address'])}</small></td>"
+        f"<td>{e((line['delivery_time'] or '')[:10])}</td>"
+        f"<td class=\"num\">{e(_money(line['total_price']))}</td></tr>"
+        for pos, line in enumerate(invoice['lines'], 1)
+    )
+    tax_rate = invoice['tax_rate'] if invoice['tax_rate'] is not None else 0.19
+    doc = f"""<!DOCTYPE html>
+<html lang="de"><head><meta charset="utf-8">
+<title>Rechnung {e(invoice['invoice_number'])}</title>
+<style>
+body{{font-family:Helvetica,Arial,sans-serif;margin:40px;color:#222}}
+table{{width:100%;border-collapse:collapse;margin:24px 0}}
+td,th{{border-bottom:1px solid #ddd;padding:6px;text-align:left}}
+.num{{text-align:right}}
+</style></head><body>
+<h2>{e(COMPANY_NAME)}</h2>
+<h1>Rechnung {e(invoice['invoice_number'])}</h1>
+<p>Rechnungsdatum: {e(invoice['issue_date'])}<br>Fällig: {e(invoice['due_date'])}</p>
+<p>{e(invoice['company_name'])}<br>{e(invoice['customer_name'])}<br>{e(invoice['customer_address'])}<br>
+{e(invoice['customer_postal'])} {e(invoice['customer_city'])}</p>
+<table><tr><th>Pos</th><th>Auftrag</th><th>Lieferung</th><th class="num">Betrag</th></tr>{rows}</table>
+<p class="num">Netto: {e(_money(invoice['subtotal']))}<br>
+MwSt ({tax_rate * 100:.0f}%): {e(_money(invoice['tax_amount']))}<br>
+<b>Gesamt: {e(_money(invoice['total_amount']))}</b></p>
+</body></html>
+"""
+    return doc.encode('utf-8')
+
+
+def _pdf_string(text: str) -> bytes:
+    raw = text.encode('cp1252', errors='replace')
+    return raw.replace(b'\\', b'\\\\').replace(b'(', b'\\(').replace(b')', b'\\)')
+
+
+def render_pdf(invoice: Dict, lines_per_page: int = 60) -> bytes:
+    """Render invoice as PDF (pure Python, Helvetica text layout)"""
+    text = _text_lines(invoice)
+    pages = [text[i:i + lines_per_page] for i in range(0, len(text), lines_per_page)] or [[]]
+
+    # Object numbers: 1 catalog, 2 page tree, 3 font, then (page, content) pairs
+    objects = {
+        1: b"<< /Type /Catalog /Pages 2 0 R >>",
+        3: b"<< /Type /Font /Subtype /Type1 /BaseFont /Helvetica /Encoding /WinAnsiEncoding >>",
+    }
+    kids = []
+    for n, page_lines in enumerate(pages):
+        page_obj, content_obj = 4 + 2 * n, 5 + 2 * n
+        kids.append(f"{page_obj} 0 R".encode())
+        stream = b"BT /F1 10 Tf 12 TL 50 800 Td\n" + b"".join(
+            b"(" + _pdf_string(line) + b") Tj T*\n" for line in page_lines
+        ) + b"ET"
+        objects[page_obj] = (
+            b"<< /Type /Page /Parent 2 0 R /MediaBox [0 0 595 842] "
+            b"/Resources << /Font << /F1 3 0 R >> >> /Contents " + f"{content_obj} 0 R".encode() + b" >>"
+        )
+        objects[content_obj] = (f"<< /Length {len(stream)} >>\nstream\n".encode() + stream
+                                + b"\nendstream")
+    objects[2] = b"<< /Type /Pages /Kids [" + b" ".join(kids) + f"] /Count {len(pages)} >>".encode()
+
+    out = bytearray(b"%PDF-1.4\n")
+    offsets = {}
+    for num in sorted(objects):
+        offsets[num] = len(out)
+        out += f"{num} 0 obj\n".encode() + objects[num] + b"\nendobj\n"
+    xref_at = len(out)
+    out += f"xref\n0 {len(objects) + 1}\n0000000000 65535 f \n".encode()
+    for num in sorted(objects):
+        out += f"{offsets[num]:010d} 00000 n \n".encode()
+    out += f"trailer\n<< /Size {len(objects) + 1} /Root 1 0 R >>\nstartxref\n{xref_at}\n%%EOF\n".encode()
+    return bytes(out)
+
+
+# ============================================
+# STORAGE
+# ============================================
+
+def store_blob(data: bytes, suffix: str, base_dir: Path = None) -> Path:
+    """Write file under its SHA-256 (identical output is stored once)"""
+    digest = hashlib.sha256(data).hexdigest()
+    path = Path(base_dir or INVOICE_DIR) / digest[:2] / f"{digest}{suffix}"
+    if not path.exists():
+        path.parent.mkdir(parents=True, exist_ok=True)
+        tmp = path.with_name(f".{path.name}.{os.getpid()}.tmp")
+        tmp.write_bytes(data)
+        os.replace(tmp, path)  # atomic, concurrent writers end up with same file
+    return path
+
+
+def render_chunk(invoices: List[Dict], formats: Tuple[str, ...],
+                 base_dir: str) -> List[Tuple[int, str, str, str]]:
+    """Process pool worker: render + store, return (invoice_id, hash, format, path)"""
+    renderers = {'html': (render_html, '.html'), 'pdf': (render_pdf, '.pdf')}
+    results = []
+    for invoice in invoices:
+        for fmt in formats:
+            render, suffix = renderers[fmt]
+            path = store_blob(render(invoice), suffix, Path(base_dir))
+            results.append((invoice['id'], invoice['_source_hash'], fmt, str(path)))
+    return results
+
+
+# ============================================
+# PIPELINE
+# ============================================
+
+class InvoiceRenderer:
+    """Batch renderer for invoice documents"""
+
+    def __init__(self, db: LogisticsDB = None, base_dir: Path = None, workers: int = None,
+                 formats: Tuple[str, ...] = ('html', 'pdf')):
+        self.db = db or LogisticsDB()
+        self.base_dir = Path(base_dir or INVOICE_DIR)
+        self.workers = workers or os.cpu_count() or 1
+        self.formats = formats
+
+    def _select_ids(self, invoice_ids: List[int] = None, since: str = None) -> List[int]:
+        if invoice_ids is not None:
+            return list(invoice_ids)
+        if since:
+            rows = self.db.query("SELECT id FROM invoices WHERE issue_date >= ? ORDER BY id", (since,))
+        else:
+            rows = self.db.query("SELECT id FROM invoices ORDER BY id")
+        return [row['id'] for row in rows]
+
+    def _load(self, conn, invoice_ids: List[int]) -> List[Dict]:
+        """Load batch; lines of archived orders come from the archive DB
+
+        Orders are archived one by one, so a consolidated invoice can have
+        hot and archived lines at the same time: always merge both.
+        """
+        invoices = load_invoice_batch(conn, invoice_ids)
+        if not invoices:
+            return invoices
+        by_id = {inv['id']: inv for inv in invoices}
+        by_order = {inv['order_id']: inv for inv in invoices if inv['order_id']}
+        rows = self.db.query_archive(f"""
+            SELECT invoice_id, id AS order_id, order_number, parcel_description,
+                   delivery_address, delivery_time, total_price
+            FROM orders WHERE invoice_id IN ({','.join('?' * len(by_id))})
+                           OR id IN ({','.join('?' * len(by_order))})
+        """, tuple(by_id) + tuple(by_order))
+        seen = {inv['id']: {line['order_id'] for line in inv['lines']} for inv in invoices}
+        merged = set()
+        for row in rows:
+            invoice = by_id.get(row['invoice_id']) or by_order.get(row['order_id'])
+            if invoice and row['order_id'] not in seen[invoice['id']]:  # hot copy wins
+                seen[invoice['id']].add(row['order_id'])
+                invoice['lines'].append(dict(row))
+                merged.add(invoice['id'])
+        for invoice_id in merged:
+            by_id[invoice_id]['lines'].sort(key=lambda line: line['order_id'])
+        return invoices
+
+    def _stale(self, conn, invoices: List[Dict]) -> List[Dict]:
+        """Drop invoices whose current documents already match their data"""
+        marks = ','.join('?' * len(invoices))
+        rendered = {}
+        for row in conn.execute(f"""
+            SELECT related_invoice_id, source_hash, COUNT(*) AS formats FROM documents
+            WHERE document_type = 'invoice' AND related_invoice_id IN ({marks})
+            GROUP BY related_invoice_id, source_hash
+        """, [inv['id'] for inv in invoices]):
+            if row['formats'] >= len(self.formats):
+                rendered.setdefault(row['related_invoice_id'], set()).add(row['source_hash'])
+
+        stale = []
+        for invoice in invoices:
+            invoice['_source_hash'] = fingerprint(invoice)
+            if invoice['_source_hash'] not in rendered.get(invoice['id'], ()):
+                stale.append(invoice)
+        return stale
+
+    def _register(self, invoices: Dict[int, Dict], results: List[Tuple[int, str, str, str]]):
+        """Insert document rows for one rendered batch"""
+        with self.db.transaction() as conn:
+            versions = {
+                row['related_invoice_id']: row['version']
+                for row in conn.execute(f"""
+                    SELECT related_invoice_id, MAX(version) AS version FROM documents
+                    WHERE document_type = 'invoice'
+                      AND related_invoice_id IN ({','.join('?' * len(invoices))})
+                    GROUP BY related_invoice_id
+                """, list(invoices))
+            }
+            conn.executemany("""
+                INSERT INTO documents (document_type, related_customer_id, related_invoice_id,
+                                       document_name, file_path, version, source_hash)
+                VALUES ('invoice', ?, ?, ?, ?, ?, ?)
+            """, [
+                (invoices[invoice_id]['customer_id'], invoice_id,
+                 f"{invoices[invoice_id]['invoice_number']}.{fmt}", path,
+                 (versions.get(invoice_id) or 0) + 1, source_hash)
+                for invoice_id, source_hash, fmt, path in results
+            ])
+
+    def render(self, invoice_ids: List[int] = None, since: str = None,
+               batch_size: int = 1000, chunk_size: int = 100) -> Dict:
+        """Render all selected invoices, return stats"""
+        started = datetime.now()
+        ids = self._select_ids(invoice_ids, since)
+        stats = {'selected': len(ids), 'rendered': 0, 'skipped': 0}
+        conn = self.db.connect()
+
+        try:
+            with ProcessPoolExecutor(max_workers=self.workers) as pool:
+                for start in range(0, len(ids), batch_size):
+                    batch = self._load(conn, ids[start:start + batch_size])
+                    stale = self._stale(conn, batch)
+                    stats['skipped'] += len(batch) - len(stale)
+                    if not stale:
+                        continue
+
+                    chunks = [stale[i:i + chunk_size] for i in range(0, len(stale), chunk_size)]
+                    futures = [pool.submit(render_chunk, chunk, self.formats, str(self.base_dir))
+                               for chunk in chunks]
+                    results = [row for future in futures for row in future.result()]
+                    self._register({inv['id']: inv for inv in stale}, results)
+                    stats['rendered'] += len(stale)
+        finally:
+            conn.close()
+
+        stats['seconds'] = round((datetime.now() - started).total_seconds(), 2)
+        return stats
+
+    def render_one(self, invoice_id: int) -> Optional[Dict[str, str]]:
+        """Render a single invoice in-process (API on-demand path)"""
+        conn = self.db.connect()
+        try:
+            batch = self._load(conn, [invoice_id])
+            if not batch:
+                return None
+            stale = self._stale(conn, batch)
+        finally:
+            conn.close()
+        if stale:
+            self._register({invoice_id: stale[0]},
+                           render_chunk(stale, self.formats, str(self.base_dir)))
+        return self.get_documents(invoice_id)
+
+    def get_documents(self, invoice_id: int) -> Dict[str, str]:
+        """Latest file path per format for an invoice"""
+        rows = self.db.query("""
+            SELECT document_name, file_path FROM documents
+            WHERE document_type = 'invoice' AND related_invoice_id = ?
+            ORDER BY version
+        """, (invoice_id,))
+        return {row['document_name'].rsplit('.', 1)[-1]: row['file_path'] for row in rows}
+
+
+# ============================================
+# STARTUP
+# ============================================
+
+if __name__ == "__main__":
+    import argparse
+    from logistik_migrations import migrate
+
+    parser = argparse.ArgumentParser(description='Render invoice documents')
+    parser.add_argument('--since', help='Only invoices issued on/after this date (YYYY-MM-DD)')
+    parser.add_argument('--workers', type=int, default=None, help='Process pool size')
+    parser.add_argument('--formats', default='html,pdf', help='Comma separated: html,pdf')
+    args = parser.parse_args()
+
+    db = LogisticsDB()
+    migrate(db)
+    renderer = InvoiceRenderer(db, workers=args.workers, formats=tuple(args.formats.split(',')))
+    print(f"🧾 Rendering invoices to {renderer.base_dir} ({renderer.workers} workers)...")
+    stats = renderer.render(since=args.since)
+    print(f"✅ {stats['rendered']} rendered, {stats['skipped']} unchanged, "
+          f"{stats['seconds']}s")
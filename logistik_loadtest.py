@@ -0,0 +1,407 @@
+#!/usr/bin/env python3
+"""
+Load Test - Simulated drivers, customers and dashboards against the API
+Drives a running logistik_api (python logistik_api.py --no-reload) with
+asyncio virtual users, standard library only (keep-alive HTTP/1.1):
+
+    drivers     login, status/location pings, order sync, start ->
+                location update -> complete for every assigned order
+    customers   create order (202), poll the ingest receipt, then poll
+                the order status at the advertised poll_after_seconds
+    dashboards  admin dashboard, tasks and backlog
+
+Drivers are seeded ('Load Driver <n>') in the configured DB; --engine
+runs workflow_engine.py alongside so orders actually get assigned.
+--speed compresses think times and delivery durations (10 = ten times
+faster than real life). Engine lag is sampled from /api/admin/backlog.
+
+Report per endpoint: requests, errors, 429s, throughput, p50/p95/p99/max
+latency (ms), plus orders/deliveries per minute and engine lag.
+
+Run: python logistik_loadtest.py [--drivers 50] [--customers 20] [--duration 60] [--engine] [--json]
+"""
+
+import asyncio
+import json
+import math
+import os
+import random
+import subprocess
+import sys
+import time
+import uuid
+from collections import Counter, defaultdict
+from pathlib import Path
+from typing import Any, Dict, List, Optional, Tuple
+from logistik_db import LogisticsDB
+
+PROJECT_ROOT = Path(__file__).parent
+AREAS = [('10115', 'Berlin'), ('10245', 'Berlin'), ('20095', 'Hamburg'), ('50667', 'Köln'),
+         ('60311', 'Frankfurt'), ('80331', 'München')]
+MONITOR_INTERVAL = 5.0  # seconds between backlog samples (real time)
+
+
+def percentile(ordered: List[float], p: float) -> Optional[float]:
+    """Nearest-rank percentile of a sorted list"""
+    if not ordered:
+        return None
+    return ordered[max(0, math.ceil(p / 100 * len(ordered)) - 1)]
+
+
+def seed_drivers(db: LogisticsDB, count: int) -> List[Dict]:
+    """'Load Driver <n>' rows 1..count (existing ones are reused)"""
+    existing = {row['name']: row for row in db.query(
+        "SELECT id, name, phone FROM drivers WHERE name LIKE 'Load Driver %'")}
+    missing = [i for i in range(count) if f'Load Driver {i}' not in existing]
+    if missing:
+        with db.transaction() as conn:
+            conn.executemany("""
+                INSERT INTO drivers (name, phone, vehicle_type, status) VALUES (?, ?, 'van', 'offline')
+            """, [(f'Load Driver {i}', f'+49155000{i:05d}') for i in missing])
+        existing = {row['name']: row for row in db.query(
+            "SELECT id, name, phone FROM drivers WHERE name LIKE 'Load Driver %'")}
+    return [existing[f'Load Driver {i}'] for i in range(count)]
+
+
+class Connection:
+    """One keep-alive HTTP/1.1 connection (reconnects when the server closes it)"""
+
+    def __init__(self, host: str, port: int):
+        self.host = host
+        self.port = port
+        self.reader: Optional[asyncio.StreamReader] = None
+        self.writer: Optional[asyncio.StreamWriter] = None
+
+    async def request(self, method: str, path: str, body: Any = None,
+                      headers: Dict[str, str] = None) -> Tuple[int, bytes]:
+        payload = json.dumps(body).encode() if body is not None else b''
+        head = [f"{method} {path} HTTP/1.1", f"Host: {self.host}:{self.port}",
+                f"Content-Length: {len(payload)}"]
+        if body is not None:
+            head.append("Content-Type: application/json")
+        head += [f"{name}: {value}" for name, value in (headers or {}).items()]
+        raw = ('\r\n'.join(head) + '\r\n\r\n').encode() + payload
+
+        for attempt in range(2):
+            reused = self.writer is not None
+            if not reused:
+                self.reader, self.writer = await asyncio.open_connection(self.host, self.port)
+            try:
+                self.writer.write(raw)
+                await self.writer.drain()
+                status_line = await self.reader.readline()
+                if not status_line:
+                    raise ConnectionResetError('connection closed')
+                return await self._response(status_line)
+            except (ConnectionError, asyncio.IncompleteReadError):
+                self.close()
+                if not reused or attempt:  # retry only a stale keep-alive connection
+                    raise
+        raise ConnectionResetError('unreachable')
+
+    async def _response(self, status_line: bytes) -> Tuple[int, bytes]:
+        status = int(status_line.split()[1])
+        close = status_line.startswith(b'HTTP/1.0')
+        length, chunked = None, False
+        while True:
+            line = await self.reader.readline()
+            if line in (b'\r\n', b'\n', b''):
+                break
+            name, _, value = line.decode('latin-1').partition(':')
+            name, value = name.strip().lower(), value.strip().lower()
+            if name == 'content-length':
+                length = int(value)
+            elif name == 'connection':
+                close = value == 'close'
+            elif name == 'transfer-encoding':
+                chunked = 'chunked' in value
+        if chunked:
+            data = b''
+            while True:
+                size = int((await self.reader.readline()).split(b';')[0], 16)
+                chunk = await self.reader.readexactly(size + 2)
+                if not size:
+                    break
+                data += chunk[:-2]
+        elif length is not None:
+            data = await self.reader.readexactly(length)
+        else:
+            data, close = await self.reader.read(), True
+        if close:
+            self.close()
+        return status, data
+
+    def close(self):
+        if self.writer is not None:
+            self.writer.close()
+        self.reader = self.writer = None
+
+
+class Stats:
+    """Latencies and status codes per endpoint template"""
+
+    def __init__(self):
+        self.latencies: Dict[str, List[float]] = defaultdict(list)
+        self.statuses: Dict[str, Counter] = defaultdict(Counter)
+        self.counters: Counter = Counter()
+
+    def record(self, name: str, ms: float, status: int):
+        self.latencies[name].append(ms)
+        self.statuses[name][status] += 1
+
+    def endpoints(self, seconds: float) -> List[Dict]:
+        result = []
+        for name in sorted(self.latencies):
+            ordered = sorted(self.latencies[name])
+            statuses = self.statuses[name]
+            result.append({
+                'endpoint': name,
+                'requests': len(ordered),
+                'errors': sum(n for status, n in statuses.items() if status == 0 or status >= 500),
+                'rejected': statuses.get(429, 0),
+                'rps': round(len(ordered) / seconds, 2),
+                'p50_ms': round(percentile(ordered, 50), 1),
+                'p95_ms': round(percentile(ordered, 95), 1),
+                'p99_ms': round(percentile(ordered, 99), 1),
+                'max_ms': round(ordered[-1], 1),
+                'status': {str(status): n for status, n in sorted(statuses.items())},
+            })
+        return result
+
+
+class LoadTest:
+    """Virtual users against one API instance"""
+
+    def __init__(self, host: str = '127.0.0.1', port: int = 5000, drivers: List[Dict] = (),
+                 customers: int = 20, dashboards: int = 2, duration: float = 60, speed: float = 10):
+        self.host = host
+        self.port = port
+        self.drivers = list(drivers)
+        self.customers = customers
+        self.dashboards = dashboards
+        self.duration = duration
+        self.speed = speed
+        self.stats = Stats()
+        self.engine_samples: List[Dict] = []
+        self.deadline = 0.0
+
+    # ========== PLUMBING ==========
+
+    @property
+    def running(self) -> bool:
+        return time.monotonic() < self.deadline
+
+    async def pause(self, seconds: float):
+        """Think time (scaled by speed, never past the end of the run)"""
+        await asyncio.sleep(max(0.0, min(seconds / self.speed, self.deadline - time.monotonic())))
+
+    async def call(self, conn: Connection, method: str, path: str, name: str, body: Any = None,
+                   headers: Dict[str, str] = None) -> Tuple[int, Any]:
+        started = time.perf_counter()
+        try:
+            status, data = await conn.request(method, path, body, headers)
+        except (OSError, asyncio.IncompleteReadError, ValueError):
+            self.stats.record(name, (time.perf_counter() - started) * 1000, 0)
+            return 0, None
+        self.stats.record(name, (time.perf_counter() - started) * 1000, status)
+        try:
+            return status, json.loads(data) if data else None
+        except ValueError:
+            return status, None
+
+    # ========== VIRTUAL USERS ==========
+
+    async def driver(self, driver: Dict, rng: random.Random):
+        conn = Connection(self.host, self.port)
+        await self.pause(rng.uniform(0, 10))  # ramp-up
+        status, body = await self.call(conn, 'POST', '/api/driver/login', '/api/driver/login',
+                                       {'driver_id': driver['id'], 'phone': driver['phone']})
+        if status != 200:
+            conn.close()
+            return
+        token = body.get('sync_token')
+        postal, city = rng.choice(AREAS)
+        location = f"{postal} {city}"
+        busy = set()
+        while self.running:
+            await self.call(conn, 'POST', '/api/driver/status', '/api/driver/status',
+                            {'driver_id': driver['id'], 'status': 'online', 'location': location})
+            status, body = await self.call(conn, 'GET', f"/api/driver/orders/{driver['id']}?since={token}",
+                                           '/api/driver/orders/{id}')
+            if status == 200:
+                token = body.get('sync_token', token)
+                for order in body.get('orders', []):
+                    if order['status'] == 'assigned' and order['id'] not in busy and self.running:
+                        busy.add(order['id'])
+                        await self.deliver(conn, driver, order['id'], location, rng)
+            await self.pause(rng.uniform(10, 20))
+        conn.close()
+
+    async def deliver(self, conn: Connection, driver: Dict, order_id: int, location: str, rng: random.Random):
+        await self.call(conn, 'POST', f'/api/driver/order/{order_id}/start', '/api/driver/order/{id}/start',
+                        {'driver_id': driver['id']})
+        await self.pause(rng.uniform(10, 40))
+        await self.call(conn, 'POST', f'/api/driver/order/{order_id}/update', '/api/driver/order/{id}/update',
+                        {'driver_id': driver['id'], 'message': 'Unterwegs, ca. 15 Minuten',
+                         'location': location})
+        await self.pause(rng.uniform(20, 60))
+        status, _ = await self.call(conn, 'POST', f'/api/driver/order/{order_id}/complete',
+                                    '/api/driver/order/{id}/complete',
+                                    {'driver_id': driver['id'], 'notes': 'Abgegeben'})
+        if status == 200:
+            self.stats.counters['deliveries'] += 1
+
+    async def customer(self, number: int, rng: random.Random):
+        conn = Connection(self.host, self.port)
+        await self.pause(rng.uniform(0, 10))
+        while self.running:
+            (pickup, pickup_city), (delivery, delivery_city) = rng.sample(AREAS, 2)
+            status, body = await self.call(conn, 'POST', '/api/customer/order', '/api/customer/order', {
+                'name': f'Load Customer {number}', 'phone': f'+4930{number:07d}',
+                'email': f'load{number}@example.com', 'address': f'Kundenweg {number}, {pickup} {pickup_city}',
+                'pickup_address': f'Lagerstr. 1, {pickup} {pickup_city}',
+                'delivery_address': f'Zielstr. 2, {delivery} {delivery_city}',
+                'price': round(rng.uniform(15, 80), 2), 'weight_kg': round(rng.uniform(0.5, 20), 1),
+                'description': 'Lasttest',
+            }, headers={'Idempotency-Key': uuid.uuid4().hex})
+            if status == 202:
+                self.stats.counters['orders'] += 1
+                await self.follow_order(conn, body['ingest_id'], rng)
+            await self.pause(rng.uniform(30, 90))
+        conn.close()
+
+    async def follow_order(self, conn: Connection, ingest_id: int, rng: random.Random):
+        """Receipt until the order exists, then a few status polls"""
+        order_id = None
+        for _ in range(20):
+            await asyncio.sleep(0.5)  # ingest flush interval, not user think time
+            status, body = await self.call(conn, 'GET', f'/api/ingest/{ingest_id}', '/api/ingest/{id}')
+            order_id = body.get('order_id') if status == 200 and body else None
+            if order_id or not self.running:
+                break
+        for _ in range(rng.randint(2, 5)):
+            if not order_id or not self.running:
+                return
+            status, body = await self.call(conn, 'GET', f'/api/customer/order/{order_id}',
+                                           '/api/customer/order/{id}')
+            await self.pause((body or {}).get('poll_after_seconds') or 30)
+
+    async def dashboard(self, rng: random.Random):
+        conn = Connection(self.host, self.port)
+        while self.running:
+            await self.call(conn, 'GET', '/api/admin/dashboard', '/api/admin/dashboard')
+            await self.call(conn, 'GET', '/api/admin/tasks', '/api/admin/tasks')
+            await self.call(conn, 'GET', '/api/admin/backlog', '/api/admin/backlog')
+            await self.pause(rng.uniform(20, 40))
+        conn.close()
+
+    async def monitor(self):
+        """Engine lag over time (not counted as load)"""
+        conn = Connection(self.host, self.port)
+        while self.running:
+            try:
+                status, data = await conn.request('GET', '/api/admin/backlog')
+                backlog = json.loads(data)['backlog'] if status == 200 else None
+            except (OSError, ValueError, KeyError, asyncio.IncompleteReadError):
+                backlog = None
+            if backlog:
+                engine = backlog['engine']
+                self.engine_samples.append({
+                    't': round(time.monotonic() - self.deadline + self.duration, 1),
+                    'pending_tasks': backlog['pending_tasks'],
+                    'oldest_pending_age_seconds': backlog['oldest_pending_age_seconds'],
+                    'max_cycle_ms': engine['max_cycle_ms'],
+                    'event_lag': max(engine['event_lag'].values(), default=0),
+                })
+            await asyncio.sleep(min(MONITOR_INTERVAL, max(0.0, self.deadline - time.monotonic())))
+        conn.close()
+
+    # ========== RUN ==========
+
+    async def run(self) -> Dict:
+        self.deadline = time.monotonic() + self.duration
+        started = time.monotonic()
+        rng = random.Random(42)
+        users = [self.driver(driver, random.Random(rng.random())) for driver in self.drivers]
+        users += [self.customer(i, random.Random(rng.random())) for i in range(self.customers)]
+        users += [self.dashboard(random.Random(rng.random())) for _ in range(self.dashboards)]
+        await asyncio.gather(self.monitor(), *users)
+        return self.report(time.monotonic() - started)
+
+    def report(self, seconds: float) -> Dict:
+        endpoints = self.stats.endpoints(seconds)
+        samples = self.engine_samples
+        return {
+            'config': {'drivers': len(self.drivers), 'customers': self.customers, 'dashboards': self.dashboards,
+                       'duration': self.duration, 'speed': self.speed},
+            'seconds': round(seconds, 1),
+            'requests': sum(e['requests'] for e in endpoints),
+            'errors': sum(e['errors'] for e in endpoints),
+            'rejected': sum(e['rejected'] for e in endpoints),
+            'rps': round(sum(e['requests'] for e in endpoints) / seconds, 1),
+            'orders_per_minute': round(self.stats.counters['orders'] * 60 / seconds, 1),
+            'deliveries_per_minute': round(self.stats.counters['deliveries'] * 60 / seconds, 1),
+            'endpoints': endpoints,
+            'engine': {
+                'max_pending_tasks': max((s['pending_tasks'] for s in samples), default=None),
+                'max_oldest_pending_age_seconds': max((s['oldest_pending_age_seconds'] or 0 for s in samples),
+                                                      default=None),
+                'max_cycle_ms': max((s['max_cycle_ms'] or 0 for s in samples), default=None),
+                'max_event_lag': max((s['event_lag'] for s in samples), default=None),
+                'samples': samples,
+            },
+        }
+
+
+# ============================================
+# STARTUP
+# ============================================
+
+if __name__ == "__main__":
+    import argparse
+
+    parser = argparse.ArgumentParser(description='Load test a running logistik_api')
+    parser.add_argument('--host', default='127.0.0.1')
+    parser.add_argument('--port', type=int, default=5000)
+    parser.add_argument('--drivers', type=int, default=50, help='Simulated drivers (seeded in the DB)')
+    parser.add_argument('--customers', type=int, default=20, help='Simulated customers')
+    parser.add_argument('--dashboards', type=int, default=2, help='Polling admin dashboards')
+    parser.add_argument('--duration', type=float, default=60, help='Seconds')
+    parser.add_argument('--speed', type=float, default=10, help='Time compression of think times')
+    parser.add_argument('--engine', action='store_true', help='Run workflow_engine.py alongside')
+    parser.add_argument('--json', action='store_true', help='Machine-readable output')
+    args = parser.parse_args()
+
+    drivers = seed_drivers(LogisticsDB(), args.drivers)
+    engine = None
+    if args.engine:
+        engine = subprocess.Popen([sys.executable, str(PROJECT_ROOT / 'workflow_engine.py')],
+                                  cwd=str(PROJECT_ROOT), stdout=subprocess.DEVNULL,
+                                  env=dict(os.environ, LOGISTIK_LOG_LEVEL='WARNING'))
+    try:
+        result = asyncio.run(LoadTest(args.host, args.port, drivers, args.customers, args.dashboards,
+                                      args.duration, args.speed).run())
+    finally:
+        if engine:
+            engine.terminate()
+            engine.wait(timeout=10)
+
+    if args.json:
+        print(json.dumps(result, indent=2))
+    else:
+        print("=" * 96)
+        print(f"🔥 LOAD TEST {result['seconds']}s: {len(drivers)} drivers, {args.customers} customers, "
+              f"{args.dashboards} dashboards (speed x{args.speed})")
+        print("=" * 96)
+        print(f"{'Endpoint':36} {'req':>7} {'err':>5} {'429':>5} {'rps':>7} "
+              f"{'p50':>7} {'p95':>7} {'p99':>7} {'max':>7}")
+        for e in result['endpoints']:
+            print(f"{e['endpoint']:36} {e['requests']:>7} {e['errors']:>5} {e['rejected']:>5} {e['rps']:>7} "
+                  f"{e['p50_ms']:>7} {e['p95_ms']:>7} {e['p99_ms']:>7} {e['max_ms']:>7}")
+        print(f"\n📦 {result['requests']} requests ({result['rps']}/s), {result['errors']} errors, "
+              f"{result['rejected']} rejected")
+        print(f"🚚 {result['orders_per_minute']} orders/min, {result['deliveries_per_minute']} deliveries/min")
+        engine_stats = result['engine']
+        print(f"⚙️  Engine: max {engine_stats['max_pending_tasks']} pending tasks, oldest "
+              f"{engine_stats['max_oldest_pending_age_seconds']}s, cycle {engine_stats['max_cycle_ms']}ms, "
+              f"event lag {engine_stats['max_event_lag']}")
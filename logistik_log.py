@@ -0,0 +1,68 @@
+#!/usr/bin/env python3
+"""
+Structured Logging - Level-controlled key=value log lines
+Hot paths (workflow engine per task) log events instead of printing:
+
+    log = get_logger('engine')
+    log.debug('task', agent='comms', task_id=42, title='Notify ...')
+
+    2026-10-19T14:03:11 DEBUG engine task agent=comms task_id=42 title="Notify ..."
+
+Level: log_level (LOGISTIK_LOG_LEVEL), default INFO. One line per event
+on stdout; START_SYSTEM streams child output into rotating files.
+"""
+
+import logging
+import sys
+from logistik_config import CONFIG
+
+_handler = None
+
+
+def _value(value) -> str:
+    text = str(value)
+    if not text or any(c in text for c in ' ="\n'):
+        return '"' + text.replace('\\', '\\\\').replace('"', '\\"').replace('\n', '\\n') + '"'
+    return text
+
+
+class StructuredLogger:
+    """logging.Logger wrapper: log.info(event, **fields)"""
+
+    def __init__(self, logger: logging.Logger):
+        self.logger = logger
+
+    def _log(self, level: int, event: str, fields):
+        if self.logger.isEnabledFor(level):  # no formatting for suppressed levels
+            parts = [event] + [f"{key}={_value(value)}" for key, value in fields.items()]
+            self.logger.log(level, ' '.join(parts))
+
+    def debug(self, event: str, **fields):
+        self._log(logging.DEBUG, event, fields)
+
+    def info(self, event: str, **fields):
+        self._log(logging.INFO, event, fields)
+
+    def warning(self, event: str, **fields):
+        self._log(logging.WARNING, event, fields)
+
+    def error(self, event: str, **fields):
+        self._log(logging.ERROR, event, fields)
+
+    def is_enabled(self, level: int) -> bool:
+        return self.logger.isEnabledFor(level)
+
+
+def get_logger(name: str) -> StructuredLogger:
+    """Logger under 'logistik.<name>', stdout handler installed once"""
+    global _handler
+    root = logging.getLogger('logistik')
+    if _handler is None:
+        _handler = logging.StreamHandler(sys.stdout)
+        _handler.setFormatter(logging.Formatter('%(asctime)s %(levelname)s %(name)s %(message)s',
+                                                datefmt='%Y-%m-%dT%H:%M:%S'))
+        root.addHandler(_handler)
+        root.setLevel(str(CONFIG['log_level']).upper())
+        root.propagate = False
+    logger = logging.getLogger(f'logistik.{name}')
+    return StructuredLogger(logger)
@@ -0,0 +1,264 @@
+#!/usr/bin/env python3
+"""
+Schema Migrations - Versioned, transactional schema upgrades
+The schema version lives in PRAGMA user_version (read from the DB header,
+constant time), the history in `schema_migrations`.
+
+All pending migrations run in ONE transaction. Migrations marked
+`background` only create indexes on large tables: they are recorded
+during migrate() and built afterwards by build_background_indexes(),
+so startup does not wait for them.
+
+Adding a schema change: update logistik_db_schema.sql (fresh installs)
+AND append an idempotent Migration here (existing DBs).
+
+Run: python logistik_migrations.py [--status]
+"""
+
+import sqlite3
+import threading
+from datetime import datetime
+from pathlib import Path
+from typing import Callable, Dict, List, Sequence
+from logistik_db import LogisticsDB
+from logistik_dispatch import OUTBOX_COLUMNS, OUTBOX_INDEX
+from logistik_invoices import DOCUMENT_COLUMNS, DOCUMENT_INDEX
+from logistik_billing import (BILLING_RUNS_TABLE, UNINVOICED_INDEX, ORDER_INVOICE_INDEX,
+                              INVOICE_RUN_INDEX, INVOICE_ORDER_INDEX)
+from logistik_sequences import SEQUENCES_TABLE
+from logistik_search import FTS_INDEXES, fts_ddl
+from logistik_archive import ARCHIVE_RULES
+from logistik_ingest import INGEST_APPLIED_TABLE
+from logistik_sync import SYNC_DDL
+from logistik_events import EVENTS_DDL, EVENTS_ENTITY_INDEX, recreate_update_triggers
+from logistik_payroll import PAYROLL_DDL
+from logistik_eta import ETA_STATS_TABLE
+from logistik_supervisor import ENGINE_WORKERS_TABLE, TASK_CLAIM_COLUMNS
+from logistik_health import BACKLOG_INDEX
+
+SCHEMA_FILE = Path(__file__).parent / 'logistik_db_schema.sql'
+
+MIGRATIONS_TABLE = """
+CREATE TABLE IF NOT EXISTS schema_migrations (
+  version INTEGER PRIMARY KEY,
+  name TEXT NOT NULL,
+  background BOOLEAN DEFAULT 0,
+  applied_at TIMESTAMP -- NULL: background index not built yet
+)
+"""
+
+
+class Migration:
+    """One schema step: `apply(conn)` or background index statements"""
+
+    def __init__(self, version: int, name: str, apply: Callable = None,
+                 background: Sequence[str] = ()):
+        self.version = version
+        self.name = name
+        self.apply = apply
+        self.background = list(background)
+
+
+# ============================================
+# HELPERS
+# ============================================
+
+def split_sql(script: str) -> List[str]:
+    """Split SQL script into statements (trigger bodies stay intact)"""
+    statements, buf = [], ''
+    for line in script.splitlines(keepends=True):
+        buf += line
+        if sqlite3.complete_statement(buf):
+            if buf.strip():
+                statements.append(buf.strip())
+            buf = ''
+    return statements
+
+
+def add_columns(conn, table: str, columns: Dict[str, str], *ddl: str):
+    """Add missing columns, then run extra DDL (indexes, tables)"""
+    existing = {row[1] for row in conn.execute(f"PRAGMA table_info({table})")}
+    for column, decl in columns.items():
+        if column not in existing:
+            conn.execute(f"ALTER TABLE {table} ADD COLUMN {column} {decl}")
+    for statement in ddl:
+        conn.execute(statement)
+
+
+def table_exists(conn, name: str) -> bool:
+    return conn.execute("SELECT 1 FROM sqlite_master WHERE type='table' AND name=?",
+                        (name,)).fetchone() is not None
+
+
+# ============================================
+# MIGRATIONS
+# ============================================
+
+def _baseline(conn):
+    """Empty DB: full schema from logistik_db_schema.sql"""
+    if table_exists(conn, 'orders'):
+        return
+    for statement in split_sql(SCHEMA_FILE.read_text(encoding='utf-8')):
+        if statement.upper().startswith('PRAGMA AUTO_VACUUM'):
+            continue  # set before BEGIN, see migrate()
+        conn.execute(statement)
+
+
+def _search_indexes(conn):
+    for name in FTS_INDEXES:
+        missing = not table_exists(conn, f"{name}_fts")
+        for statement in fts_ddl(name):
+            conn.execute(statement)
+        if missing:
+            conn.execute(f"INSERT INTO {name}_fts({name}_fts) VALUES ('rebuild')")
+
+
+def _updated_at(conn):
+    """orders/drivers had no updated_at, but LogisticsDB.update() sets it"""
+    for table, initial in (('orders', 'COALESCE(delivery_time, pickup_time, assigned_at, created_at)'),
+                           ('drivers', 'COALESCE(last_active, created_at)')):
+        columns = {row[1] for row in conn.execute(f"PRAGMA table_info({table})")}
+        if 'updated_at' not in columns:
+            # ALTER TABLE cannot use a CURRENT_TIMESTAMP default
+            conn.execute(f"ALTER TABLE {table} ADD COLUMN updated_at TIMESTAMP")
+            conn.execute(f"UPDATE {table} SET updated_at = {initial}")
+
+
+MIGRATIONS = [
+    Migration(1, 'baseline schema', _baseline),
+    Migration(2, 'outbound dispatcher columns',
+              lambda conn: add_columns(conn, 'messages', OUTBOX_COLUMNS, OUTBOX_INDEX)),
+    Migration(3, 'invoice documents',
+              lambda conn: add_columns(conn, 'documents', DOCUMENT_COLUMNS, DOCUMENT_INDEX)),
+    Migration(4, 'billing runs', lambda conn: (
+        add_columns(conn, 'orders', {'invoice_id': 'INTEGER'}, UNINVOICED_INDEX, ORDER_INVOICE_INDEX),
+        add_columns(conn, 'invoices', {'billing_run_id': 'INTEGER'}, BILLING_RUNS_TABLE,
+                    INVOICE_RUN_INDEX, INVOICE_ORDER_INDEX),
+    )),
+    Migration(5, 'sequences', lambda conn: conn.execute(SEQUENCES_TABLE)),
+    Migration(6, 'full-text search', _search_indexes),
+    Migration(7, 'archive selection indexes',
+              background=[sql for _, indexes in ARCHIVE_RULES.values() for sql in indexes]),
+    Migration(8, 'orders/drivers updated_at', _updated_at),
+    Migration(9, 'ingestion idempotency keys', lambda conn: conn.execute(INGEST_APPLIED_TABLE)),
+    Migration(10, 'driver order change log', lambda conn: add_columns(conn, 'orders', {}, *SYNC_DDL)),
+    Migration(11, 'event log', lambda conn: add_columns(conn, 'orders', {}, *EVENTS_DDL)),
+    Migration(12, 'driver payroll', lambda conn: add_columns(conn, 'expenses', {}, *PAYROLL_DDL)),
+    Migration(13, 'eta statistics', lambda conn: conn.execute(ETA_STATS_TABLE)),
+    Migration(14, 'engine workers', lambda conn: conn.execute(ENGINE_WORKERS_TABLE)),
+    Migration(15, 'task backlog index', background=[BACKLOG_INDEX]),
+    Migration(16, 'event entity index', background=[EVENTS_ENTITY_INDEX]),
+    Migration(17, 'events for reported order/invoice columns', recreate_update_triggers),
+    Migration(18, 'task claims', lambda conn: add_columns(conn, 'tasks', TASK_CLAIM_COLUMNS)),
+]
+
+LATEST_VERSION = max(m.version for m in MIGRATIONS)
+
+
+# ============================================
+# RUNNER
+# ============================================
+
+def schema_version(db: LogisticsDB) -> int:
+    """Current schema version (constant time: DB header)"""
+    conn = db.connect()
+    try:
+        return conn.execute("PRAGMA user_version").fetchone()[0]
+    finally:
+        conn.close()
+
+
+def is_ready(db: LogisticsDB) -> bool:
+    """Readiness: all migrations applied (background indexes may still build)"""
+    return schema_version(db) >= LATEST_VERSION
+
+
+def migrate(db: LogisticsDB) -> List[int]:
+    """Apply all pending migrations in one transaction, return applied versions"""
+    conn = db.connect()
+    conn.isolation_level = None
+    try:
+        if conn.execute("PRAGMA user_version").fetchone()[0] >= LATEST_VERSION:
+            return []
+
+        # auto_vacuum only takes effect before the first table is created
+        if not table_exists(conn, 'orders'):
+            conn.execute("PRAGMA auto_vacuum = INCREMENTAL")
+
+        conn.execute("BEGIN IMMEDIATE")
+        try:
+            # Re-read under the write lock: another process may have migrated
+            current = conn.execute("PRAGMA user_version").fetchone()[0]
+            conn.execute(MIGRATIONS_TABLE)
+            applied = []
+            for migration in MIGRATIONS:
+                if migration.version <= current:
+                    continue
+                if migration.apply:
+                    migration.apply(conn)
+                conn.execute("""
+                    INSERT OR REPLACE INTO schema_migrations (version, name, background, applied_at)
+                    VALUES (?, ?, ?, ?)
+                """, (migration.version, migration.name, bool(migration.background),
+                      None if migration.background else datetime.now().isoformat()))
+                applied.append(migration.version)
+            conn.execute(f"PRAGMA user_version = {LATEST_VERSION}")
+            conn.execute("COMMIT")
+            return applied
+        except BaseException:
+            conn.execute("ROLLBACK")
+            raise
+    finally:
+        conn.close()
+
+
+def build_background_indexes(db: LogisticsDB) -> List[int]:
+    """Build recorded-but-unbuilt background indexes, one transaction each"""
+    by_version = {m.version: m for m in MIGRATIONS}
+    pending = db.query("""
+        SELECT version FROM schema_migrations
+        WHERE background = 1 AND applied_at IS NULL ORDER BY version
+    """)
+    built = []
+    for row in pending:
+        migration = by_version.get(row['version'])
+        if not migration:
+            continue
+        with db.transaction() as conn:
+            for statement in migration.background:
+                conn.execute(statement)
+            conn.execute("UPDATE schema_migrations SET applied_at=? WHERE version=?",
+                         (datetime.now().isoformat(), migration.version))
+        built.append(migration.version)
+    return built
+
+
+def start_background_indexes(db: LogisticsDB) -> threading.Thread:
+    """Build background indexes in a daemon thread"""
+    thread = threading.Thread(target=build_background_indexes, args=(db,),
+                              name='index-builder', daemon=True)
+    thread.start()
+    return thread
+
+
+# ============================================
+# STARTUP
+# ============================================
+
+if __name__ == "__main__":
+    import argparse
+
+    parser = argparse.ArgumentParser(description='Apply schema migrations')
+    parser.add_argument('--status', action='store_true', help='Show version, apply nothing')
+    args = parser.parse_args()
+
+    db = LogisticsDB()
+    print(f"💾 Database: {db.db_path}")
+    print(f"   Schema version: {schema_version(db)} (latest: {LATEST_VERSION})")
+
+    if not args.status:
+        applied = migrate(db)
+        print(f"✅ Applied migrations: {applied or 'none'}")
+        built = build_background_indexes(db)
+        if built:
+            print(f"✅ Built background indexes: {built}")
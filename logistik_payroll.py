@@ -0,0 +1,311 @@
+#!/usr/bin/env python3
+"""
+Driver Payroll - Wages for all drivers of a pay period in one pass
+Per driver and period [start, end):
+    deliveries   delivered orders (paid to the driver of the completed
+                 assignment if there is one, else orders.assigned_driver_id)
+    gross        deliveries * PAY_PER_DELIVERY + revenue * COMMISSION_RATE
+    deductions   driver expenses (expense_date in the period)
+    net          gross - deductions
+Aggregation is set-based SQL (one GROUP BY per input table). Large fleets
+split the period into day slices computed by a process pool; the partial
+sums are merged and written in one transaction to `driver_payroll`.
+
+Re-runs of a period are incremental: only drivers whose inputs changed
+since the last run (order_changes, new expenses, finished assignments)
+are recomputed. Edited expense amounts need --full.
+
+Run: python logistik_payroll.py [--period-start 2026-10-12 --period-end 2026-10-19] [--full] [--workers 4]
+"""
+
+import json
+import os
+import sqlite3
+from concurrent.futures import ProcessPoolExecutor
+from datetime import date, datetime, timedelta
+from typing import Dict, List, Optional, Sequence, Tuple
+from logistik_db import LogisticsDB
+
+PAY_PER_DELIVERY = 4.50
+COMMISSION_RATE = 0.12  # of delivered order value (gross)
+PARALLEL_MIN_DRIVERS = 500  # smaller fleets: one query is faster than starting a pool
+
+PAYROLL_RUNS_TABLE = """
+CREATE TABLE IF NOT EXISTS payroll_runs (
+  id INTEGER PRIMARY KEY AUTOINCREMENT,
+  period_start DATE NOT NULL,
+  period_end DATE NOT NULL, -- exclusive
+  status TEXT DEFAULT 'running', -- running, completed (one transaction: no partial runs)
+  incremental BOOLEAN DEFAULT 0,
+  drivers INTEGER DEFAULT 0, -- drivers recomputed by this run
+  deliveries INTEGER DEFAULT 0,
+  net_total DECIMAL(10, 2) DEFAULT 0, -- whole period after this run
+  change_seq INTEGER, -- order_changes position the run has seen
+  expense_id INTEGER, -- highest expenses.id seen
+  assignment_id INTEGER, -- highest driver_assignments.id seen
+  started_at TIMESTAMP DEFAULT CURRENT_TIMESTAMP,
+  finished_at TIMESTAMP,
+  duration_ms INTEGER
+)
+"""
+
+DRIVER_PAYROLL_TABLE = """
+CREATE TABLE IF NOT EXISTS driver_payroll (
+  period_start DATE NOT NULL,
+  period_end DATE NOT NULL,
+  driver_id INTEGER NOT NULL,
+  deliveries INTEGER DEFAULT 0,
+  failed INTEGER DEFAULT 0, -- failed assignments (unpaid)
+  revenue DECIMAL(10, 2) DEFAULT 0,
+  gross DECIMAL(10, 2) DEFAULT 0,
+  deductions DECIMAL(10, 2) DEFAULT 0,
+  net DECIMAL(10, 2) DEFAULT 0,
+  run_id INTEGER, -- payroll run that last computed this row
+  computed_at TIMESTAMP DEFAULT CURRENT_TIMESTAMP,
+  PRIMARY KEY(period_start, period_end, driver_id)
+) WITHOUT ROWID
+"""
+
+EXPENSES_DATE_INDEX = "CREATE INDEX IF NOT EXISTS idx_expenses_date ON expenses(expense_date, driver_id)"
+ASSIGNMENTS_ORDER_INDEX = """
+CREATE INDEX IF NOT EXISTS idx_driver_assignments_order ON driver_assignments(order_id, status)
+"""
+
+PAYROLL_DDL = [PAYROLL_RUNS_TABLE, DRIVER_PAYROLL_TABLE, EXPENSES_DATE_INDEX, ASSIGNMENTS_ORDER_INDEX]
+
+# The status IN (...) term matches the partial idx_orders_closed (used for the date
+# range once ANALYZE statistics exist); :drivers is a JSON list of ids or NULL (all)
+AGGREGATE_SQL = """
+WITH paid AS (
+  SELECT COALESCE((SELECT a.driver_id FROM driver_assignments a
+                   WHERE a.order_id = o.id AND a.status = 'completed'
+                   ORDER BY a.id DESC LIMIT 1), o.assigned_driver_id) AS driver_id,
+         o.total_price
+  FROM orders o
+  WHERE o.status IN ('delivered', 'cancelled') AND o.status = 'delivered'
+    AND COALESCE(o.delivery_time, o.created_at) >= :start
+    AND COALESCE(o.delivery_time, o.created_at) < :end
+),
+picked AS (
+  SELECT value AS driver_id FROM json_each(:drivers)
+)
+SELECT driver_id, 'deliveries' AS metric, COUNT(*) AS n, COALESCE(SUM(total_price), 0) AS amount
+  FROM paid WHERE driver_id IS NOT NULL
+   AND (:drivers IS NULL OR driver_id IN (SELECT driver_id FROM picked))
+  GROUP BY driver_id
+UNION ALL
+SELECT driver_id, 'failed', COUNT(*), 0
+  FROM driver_assignments
+  WHERE status = 'failed'
+    AND COALESCE(completed_at, started_at, assigned_at) >= :start
+    AND COALESCE(completed_at, started_at, assigned_at) < :end
+    AND (:drivers IS NULL OR driver_id IN (SELECT driver_id FROM picked))
+  GROUP BY driver_id
+UNION ALL
+SELECT driver_id, 'expenses', COUNT(*), COALESCE(SUM(amount), 0)
+  FROM expenses
+  WHERE expense_date >= :start AND expense_date < :end AND driver_id IS NOT NULL
+    AND (:drivers IS NULL OR driver_id IN (SELECT driver_id FROM picked))
+  GROUP BY driver_id
+"""
+
+
+def previous_week(today: date = None) -> Tuple[date, date]:
+    """Default pay period: last Monday-to-Monday week [start, end)"""
+    today = today or date.today()
+    end = today - timedelta(days=today.weekday())
+    return end - timedelta(days=7), end
+
+
+def aggregate(dsn: str, uri: bool, start: str, end: str,
+              drivers: Optional[Sequence[int]] = None) -> Dict[int, List[float]]:
+    """{driver_id: [deliveries, revenue, failed, expenses]} for [start, end)
+
+    Module-level so process pool workers can run it on their own connection.
+    """
+    conn = sqlite3.connect(dsn, uri=uri)
+    try:
+        totals: Dict[int, List[float]] = {}
+        params = {'start': start, 'end': end,
+                  'drivers': json.dumps(list(drivers)) if drivers is not None else None}
+        for driver_id, metric, n, amount in conn.execute(AGGREGATE_SQL, params):
+            entry = totals.setdefault(driver_id, [0, 0.0, 0, 0.0])
+            if metric == 'deliveries':
+                entry[0] += n
+                entry[1] += amount
+            elif metric == 'failed':
+                entry[2] += n
+            else:
+                entry[3] += amount
+        return totals
+    finally:
+        conn.close()
+
+
+class PayrollRun:
+    """Payroll for one pay period, full or incremental"""
+
+    def __init__(self, db: LogisticsDB = None, pay_per_delivery: float = PAY_PER_DELIVERY,
+                 commission_rate: float = COMMISSION_RATE, workers: Optional[int] = None):
+        self.db = db or LogisticsDB()
+        self.pay_per_delivery = pay_per_delivery
+        self.commission_rate = commission_rate
+        self.workers = workers  # None: pool for large fleets, 1: never
+
+    def _cursors(self) -> Dict[str, int]:
+        row = self.db.query("""
+            SELECT (SELECT COALESCE(MAX(seq), 0) FROM order_changes) AS change_seq,
+                   (SELECT COALESCE(MAX(id), 0) FROM expenses) AS expense_id,
+                   (SELECT COALESCE(MAX(id), 0) FROM driver_assignments) AS assignment_id
+        """)[0]
+        return {key: row[key] for key in ('change_seq', 'expense_id', 'assignment_id')}
+
+    def _last_run(self, period_start: str, period_end: str) -> Optional[Dict]:
+        rows = self.db.query("""
+            SELECT * FROM payroll_runs
+            WHERE period_start = ? AND period_end = ? AND status = 'completed'
+            ORDER BY id DESC LIMIT 1
+        """, (period_start, period_end))
+        return rows[0] if rows else None
+
+    def _changed_drivers(self, last: Dict) -> Optional[List[int]]:
+        """Drivers with new inputs since `last` run, None if that can't be told (full run)"""
+        floor = self.db.query("SELECT MIN(seq) AS seq FROM order_changes")[0]['seq']
+        if floor is not None and floor > (last['change_seq'] or 0) + 1:
+            return None  # change log pruned past the last run
+        rows = self.db.query("""
+            SELECT driver_id FROM order_changes WHERE seq > :seq
+            UNION SELECT driver_id FROM expenses WHERE id > :expense AND driver_id IS NOT NULL
+            UNION SELECT driver_id FROM driver_assignments
+                  WHERE id > :assignment OR completed_at >= :since
+        """, {'seq': last['change_seq'] or 0, 'expense': last['expense_id'] or 0,
+              'assignment': last['assignment_id'] or 0, 'since': last['started_at']})
+        return sorted(row['driver_id'] for row in rows)
+
+    def _slices(self, start: str, end: str, parts: int) -> List[Tuple[str, str]]:
+        first, last = date.fromisoformat(start), date.fromisoformat(end)
+        days = max((last - first).days, 1)
+        step = max(days // parts, 1)
+        bounds = [first + timedelta(days=d) for d in range(0, days, step)] + [last]
+        return [(a.isoformat(), b.isoformat()) for a, b in zip(bounds, bounds[1:])]
+
+    def _aggregate(self, start: str, end: str, drivers: Optional[List[int]]) -> Tuple[Dict, int]:
+        """Totals per driver, via process pool for large fleets; returns (totals, workers used)"""
+        workers = self.workers
+        if workers is None:
+            fleet = len(drivers) if drivers is not None else \
+                self.db.query("SELECT COUNT(*) AS n FROM drivers")[0]['n']
+            workers = min(os.cpu_count() or 1, 8) if fleet >= PARALLEL_MIN_DRIVERS else 1
+        slices = self._slices(start, end, workers)
+        if workers <= 1 or self.db.in_memory or len(slices) == 1:
+            return aggregate(self.db._dsn, self.db.in_memory, start, end, drivers), 1
+
+        totals: Dict[int, List[float]] = {}
+        with ProcessPoolExecutor(max_workers=min(workers, len(slices))) as pool:
+            parts = pool.map(aggregate, *zip(*[(self.db._dsn, False, a, b, drivers) for a, b in slices]))
+            for part in parts:
+                for driver_id, values in part.items():
+                    entry = totals.setdefault(driver_id, [0, 0.0, 0, 0.0])
+                    for i, value in enumerate(values):
+                        entry[i] += value
+        return totals, min(workers, len(slices))
+
+    def run(self, period_start: Optional[str] = None, period_end: Optional[str] = None,
+            full: bool = False) -> Dict:
+        """Compute (changed) driver wages for the period and store them"""
+        if not period_start or not period_end:
+            start, end = previous_week()
+            period_start, period_end = period_start or start.isoformat(), period_end or end.isoformat()
+
+        started = datetime.now()
+        cursors = self._cursors()  # before reading: later changes are picked up next run
+        last = None if full else self._last_run(period_start, period_end)
+        drivers = self._changed_drivers(last) if last else None
+        incremental = drivers is not None
+
+        result = {'period_start': period_start, 'period_end': period_end,
+                  'incremental': incremental, 'drivers': 0, 'deliveries': 0, 'workers': 0}
+        totals: Dict[int, List[float]] = {}
+        if drivers != []:
+            totals, result['workers'] = self._aggregate(period_start, period_end, drivers)
+
+        rows = []
+        for driver_id, (deliveries, revenue, failed, expenses) in sorted(totals.items()):
+            gross = round(deliveries * self.pay_per_delivery + revenue * self.commission_rate, 2)
+            deductions = round(expenses, 2)
+            rows.append((period_start, period_end, driver_id, deliveries, failed, round(revenue, 2),
+                         gross, deductions, round(gross - deductions, 2)))
+        result['drivers'] = len(rows)
+        result['deliveries'] = sum(row[3] for row in rows)
+
+        with self.db.transaction() as conn:
+            run_id = conn.execute("""
+                INSERT INTO payroll_runs (period_start, period_end, incremental, drivers, deliveries,
+                                          change_seq, expense_id, assignment_id, started_at)
+                VALUES (?, ?, ?, ?, ?, ?, ?, ?, ?)
+            """, (period_start, period_end, incremental, result['drivers'], result['deliveries'],
+                  cursors['change_seq'], cursors['expense_id'], cursors['assignment_id'],
+                  started.isoformat())).lastrowid
+
+            # Recomputed drivers without any activity left lose their row
+            if incremental:
+                conn.execute("""
+                    DELETE FROM driver_payroll WHERE period_start = ? AND period_end = ?
+                      AND driver_id IN (SELECT value FROM json_each(?))
+                """, (period_start, period_end, json.dumps(drivers)))
+            else:
+                conn.execute("DELETE FROM driver_payroll WHERE period_start = ? AND period_end = ?",
+                             (period_start, period_end))
+            conn.executemany(f"""
+                INSERT INTO driver_payroll (period_start, period_end, driver_id, deliveries, failed,
+                                            revenue, gross, deductions, net, run_id)
+                VALUES (?, ?, ?, ?, ?, ?, ?, ?, ?, {int(run_id)})
+            """, rows)
+
+            net_total = conn.execute("""
+                SELECT ROUND(COALESCE(SUM(net), 0), 2) FROM driver_payroll
+                WHERE period_start = ? AND period_end = ?
+            """, (period_start, period_end)).fetchone()[0]
+            duration_ms = int((datetime.now() - started).total_seconds() * 1000)
+            conn.execute("""
+                UPDATE payroll_runs SET status='completed', net_total=?, finished_at=?, duration_ms=?
+                WHERE id=?
+            """, (net_total, datetime.now().isoformat(), duration_ms, run_id))
+
+        result.update({'run_id': run_id, 'net_total': net_total,
+                       'seconds': round((datetime.now() - started).total_seconds(), 3)})
+        return result
+
+    def get_payroll(self, period_start: str, period_end: str, driver_id: int = None) -> List[Dict]:
+        """Stored wages of a period (one driver or all)"""
+        sql = "SELECT * FROM driver_payroll WHERE period_start = ? AND period_end = ?"
+        params: Tuple = (period_start, period_end)
+        if driver_id is not None:
+            sql += " AND driver_id = ?"
+            params += (driver_id,)
+        return self.db.query(sql + " ORDER BY driver_id", params)
+
+
+# ============================================
+# STARTUP
+# ============================================
+
+if __name__ == "__main__":
+    import argparse
+    from logistik_migrations import migrate
+
+    parser = argparse.ArgumentParser(description='Driver payroll for a pay period')
+    parser.add_argument('--period-start', help='First day (YYYY-MM-DD, default: last Monday week)')
+    parser.add_argument('--period-end', help='Day after the period (exclusive)')
+    parser.add_argument('--full', action='store_true', help='Recompute all drivers')
+    parser.add_argument('--workers', type=int, help='Processes (default: auto for large fleets)')
+    args = parser.parse_args()
+
+    db = LogisticsDB()
+    migrate(db)
+    stats = PayrollRun(db, workers=args.workers).run(args.period_start, args.period_end, full=args.full)
+
+    print(f"💵 Payroll {stats['period_start']} → {stats['period_end']} "
+          f"({'incremental' if stats['incremental'] else 'full'}, {stats['workers']} workers)")
+    print(f"✅ {stats['drivers']} drivers recomputed, {stats['deliveries']} deliveries, "
+          f"net total €{stats['net_total']:.2f} in {stats['seconds']}s")
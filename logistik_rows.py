@@ -0,0 +1,86 @@
+#!/usr/bin/env python3
+"""
+Compact Rows - Tuple-based row objects instead of one dict per row
+A row type is generated once per result shape (e.g. `SELECT * FROM orders`)
+and shares its column index. Instances are plain tuples (no per-row dict),
+but still read like dicts: row['status'], row.get('notes'), dict(row).
+
+Conversion to real dicts happens only at the JSON boundary (jsonable()).
+"""
+
+from typing import Any, Dict, Tuple
+
+_row_types: Dict[Tuple[str, ...], type] = {}
+
+
+class CompactRow(tuple):
+    """Immutable row with dict-style read access"""
+
+    __slots__ = ()
+    _fields: Tuple[str, ...] = ()
+    _index: Dict[str, int] = {}
+
+    def __getitem__(self, key):
+        if isinstance(key, str):
+            try:
+                return tuple.__getitem__(self, self._index[key])
+            except KeyError:
+                raise KeyError(key) from None
+        return tuple.__getitem__(self, key)
+
+    def __getattr__(self, name):
+        try:
+            return tuple.__getitem__(self, self._index[name])
+        except KeyError:
+            raise AttributeError(name) from None
+
+    def __contains__(self, key):
+        return key in self._index
+
+    def get(self, key: str, default: Any = None) -> Any:
+        pos = self._index.get(key)
+        return default if pos is None else tuple.__getitem__(self, pos)
+
+    def keys(self) -> Tuple[str, ...]:
+        return self._fields
+
+    def values(self) -> tuple:
+        return tuple(self)
+
+    def items(self):
+        return zip(self._fields, self)
+
+    def to_dict(self) -> Dict[str, Any]:
+        return dict(zip(self._fields, self))
+
+    def __repr__(self):
+        return f"{type(self).__name__}({self.to_dict()!r})"
+
+
+def row_type(columns: Tuple[str, ...], name: str = 'Row') -> type:
+    """Row class for a column tuple (cached per shape)"""
+    cls = _row_types.get(columns)
+    if cls is None:
+        index = {column: pos for pos, column in enumerate(columns)}  # last duplicate wins, like dict()
+        cls = type(name, (CompactRow,), {'__slots__': (), '_fields': columns, '_index': index})
+        _row_types[columns] = cls
+    return cls
+
+
+def compact_rows(cursor, rows: list, name: str = 'Row') -> list:
+    """Wrap fetched tuples (connection without row_factory) into compact rows"""
+    if not rows:
+        return []
+    cls = row_type(tuple(d[0] for d in cursor.description), name)
+    return [tuple.__new__(cls, row) for row in rows]
+
+
+def jsonable(obj: Any) -> Any:
+    """Convert compact rows (also nested in dicts/lists) to dicts for JSON"""
+    if isinstance(obj, CompactRow):
+        return obj.to_dict()
+    if isinstance(obj, dict):
+        return {key: jsonable(value) for key, value in obj.items()}
+    if isinstance(obj, (list, tuple)):
+        return [jsonable(value) for value in obj]
+    return obj
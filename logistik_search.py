@@ -0,0 +1,152 @@
+#!/usr/bin/env python3
+"""
+Full-Text Search - FTS5 indexes over orders, customers and messages
+External-content FTS5 tables are kept in sync by triggers; update
+triggers only fire when an indexed text column changes, so status
+updates on orders or delivery updates on messages cost nothing extra.
+
+bm25 ranks depend on each table's size and document lengths, so they are
+not comparable across indexes: every hit gets score = rank / best rank of
+its own index (1.0 = best match of that type) and results are merged by
+that score.
+
+Run: python logistik_search.py "hauptstr berlin"
+     python logistik_search.py --rebuild
+"""
+
+import re
+from typing import Dict, List
+from logistik_db import LogisticsDB
+
+# name -> (content table, indexed columns, title column for results)
+FTS_INDEXES = {
+    'orders': ('orders', ['order_number', 'pickup_address', 'delivery_address',
+                          'parcel_description', 'pickup_contact_name', 'delivery_contact_name'],
+               'order_number'),
+    'customers': ('customers', ['name', 'company_name', 'email', 'phone', 'address', 'city'],
+                  'name'),
+    'messages': ('messages', ['message_text'], 'message_text'),
+}
+
+# unicode61 + remove_diacritics: "Muller" finds "Müller"; prefix index for fragments
+FTS_OPTIONS = "tokenize='unicode61 remove_diacritics 2', prefix='2 3'"
+
+
+def fts_ddl(name: str) -> List[str]:
+    """CREATE statements for one FTS table + its sync triggers"""
+    table, columns, _ = FTS_INDEXES[name]
+    fts = f"{name}_fts"
+    cols = ', '.join(columns)
+    new_vals = ', '.join(f"new.{c}" for c in columns)
+    old_vals = ', '.join(f"old.{c}" for c in columns)
+    return [
+        f"CREATE VIRTUAL TABLE IF NOT EXISTS {fts} USING fts5({cols}, "
+        f"content='{table}', content_rowid='id', {FTS_OPTIONS})",
+        f"""CREATE TRIGGER IF NOT EXISTS {fts}_ai AFTER INSERT ON {table} BEGIN
+              INSERT INTO {fts}(rowid, {cols}) VALUES (new.id, {new_vals});
+            END""",
+        f"""CREATE TRIGGER IF NOT EXISTS {fts}_ad AFTER DELETE ON {table} BEGIN
+              INSERT INTO {fts}({fts}, rowid, {cols}) VALUES ('delete', old.id, {old_vals});
+            END""",
+        f"""CREATE TRIGGER IF NOT EXISTS {fts}_au AFTER UPDATE OF {cols} ON {table} BEGIN
+              INSERT INTO {fts}({fts}, rowid, {cols}) VALUES ('delete', old.id, {old_vals});
+              INSERT INTO {fts}(rowid, {cols}) VALUES (new.id, {new_vals});
+            END""",
+    ]
+
+
+def build_match(text: str) -> str:
+    """User input -> FTS5 query: every word as quoted prefix term (AND)"""
+    terms = re.findall(r"\w+", text or '')
+    return ' '.join(f'"{term}"*' for term in terms)
+
+
+class SearchIndex:
+    """Ranked, paginated search across orders, customers and messages"""
+
+    def __init__(self, db: LogisticsDB = None):
+        self.db = db or LogisticsDB()
+
+    def _search_one(self, conn, name: str, match: str, limit: int) -> List[Dict]:
+        table, _, title = FTS_INDEXES[name]
+        extra = ", t.order_id" if name == 'messages' else ""
+        rows = conn.execute(f"""
+            SELECT f.rowid AS id, f.rank AS rank, t.{title} AS title{extra},
+                   snippet({name}_fts, -1, '[', ']', '…', 12) AS snippet
+            FROM {name}_fts f JOIN {table} t ON t.id = f.rowid
+            WHERE {name}_fts MATCH ?
+            ORDER BY f.rank
+            LIMIT ?
+        """, (match, limit)).fetchall()
+        hits = [dict(row, type=name) for row in rows]
+        best = hits[0]['rank'] if hits else 0
+        for hit in hits:
+            # bm25 is negative (lower = better); ~0 when the terms are in every row
+            hit['score'] = round(hit['rank'] / best, 4) if best < 0 else 1.0
+        return hits
+
+    def search(self, text: str, types: List[str] = None, page: int = 1,
+               per_page: int = 20) -> Dict:
+        """Best matches first (bm25 normalised per index); each index uses its own top-k scan"""
+        types = [t for t in (types or FTS_INDEXES) if t in FTS_INDEXES]
+        match = build_match(text)
+        page = max(1, page)
+        per_page = max(1, min(per_page, 100))
+        if not match or not types:
+            return {'query': text, 'results': [], 'page': page, 'per_page': per_page}
+
+        # Top (page * per_page) of each index is enough to build the page
+        window = page * per_page
+        conn = self.db.connect()
+        try:
+            hits = [hit for name in types for hit in self._search_one(conn, name, match, window + 1)]
+        finally:
+            conn.close()
+
+        hits.sort(key=lambda hit: (-hit['score'], types.index(hit['type']), hit['rank']))
+        start = (page - 1) * per_page
+        return {
+            'query': text,
+            'results': hits[start:start + per_page],
+            'page': page,
+            'per_page': per_page,
+            'has_more': len(hits) > start + per_page,
+        }
+
+    def rebuild(self):
+        """Rebuild all FTS indexes from their content tables"""
+        with self.db.transaction() as conn:
+            for name in FTS_INDEXES:
+                conn.execute(f"INSERT INTO {name}_fts({name}_fts) VALUES ('rebuild')")
+                conn.execute(f"INSERT INTO {name}_fts({name}_fts) VALUES ('optimize')")
+
+
+# ============================================
+# STARTUP
+# ============================================
+
+if __name__ == "__main__":
+    import argparse
+    import time
+    from logistik_migrations import migrate
+
+    parser = argparse.ArgumentParser(description='Full-text search over orders/customers/messages')
+    parser.add_argument('query', nargs='?', help='Search text')
+    parser.add_argument('--rebuild', action='store_true', help='Rebuild all FTS indexes')
+    parser.add_argument('--type', action='append', help='orders, customers, messages')
+    args = parser.parse_args()
+
+    db = LogisticsDB()
+    migrate(db)
+    index = SearchIndex(db)
+
+    if args.rebuild:
+        started = time.time()
+        index.rebuild()
+        print(f"✅ Search indexes rebuilt in {time.time() - started:.1f}s")
+
+    if args.query:
+        result = index.search(args.query, types=args.type)
+        for hit in result['results']:
+            print(f"  [{hit['type']}] #{hit['id']} {hit['title']}: {hit['snippet']}")
+        print(f"🔎 {len(result['results'])} results for '{args.query}'")
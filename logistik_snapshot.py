@@ -0,0 +1,166 @@
+#!/usr/bin/env python3
+"""
+Analytics Snapshot - Read-only copy of the DB for admin/analytics reads
+A background thread copies the live DB with the SQLite online backup API
+into logistik_snapshot.db (temp file + atomic rename) whenever a commit
+is detected (PRAGMA data_version, no table scans). Bursts are coalesced:
+a refresh waits `refresh_delay` seconds after the first change.
+
+Heavy reports (dashboard summary, invoice lists, ...) then read the
+snapshot and never hold locks on the live DB. Staleness = time since the
+first change the snapshot does not contain yet; above `max_staleness`
+(LOGISTIK_SNAPSHOT_MAX_STALENESS) reads go to the live DB again.
+
+Run: python logistik_snapshot.py [--once]
+"""
+
+import os
+import sqlite3
+import threading
+import time
+from pathlib import Path
+from typing import Dict, Optional
+from logistik_config import CONFIG
+from logistik_db import LogisticsDB
+
+
+class SnapshotDB(LogisticsDB):
+    """LogisticsDB API (queries only) on the read-only snapshot file"""
+
+    def __init__(self, path: str, source: LogisticsDB):
+        self.db_path = path
+        self.in_memory = False
+        self.compact_rows = source.compact_rows
+        self.archive_path = source.archive_path
+        self.sequences = None  # read-only: no number allocation
+        self._dsn = f"file:{path}?mode=ro"
+
+    def connect(self) -> sqlite3.Connection:
+        conn = sqlite3.connect(self._dsn, uri=True)
+        conn.row_factory = sqlite3.Row
+        return conn
+
+
+class Snapshotter:
+    """Keeps the snapshot fresh, decides whether reads may use it"""
+
+    def __init__(self, db: LogisticsDB = None, path: str = None,
+                 max_staleness: float = None, refresh_delay: float = 5.0,
+                 check_interval: float = 1.0):
+        self.db = db or LogisticsDB()
+        self.max_staleness = CONFIG['snapshot_max_staleness'] if max_staleness is None else max_staleness
+        self.refresh_delay = refresh_delay
+        self.check_interval = check_interval
+        self.enabled = not self.db.in_memory
+        self.path = str(path or CONFIG['snapshot_path'] or
+                        Path(str(self.db.db_path)).with_name(f"{Path(str(self.db.db_path)).stem}_snapshot.db"))
+        self.snapshot: Optional[SnapshotDB] = None
+        self.taken_at: Optional[float] = None  # wall clock of the last refresh
+        self.dirty_since: Optional[float] = None  # first change not in the snapshot
+        self.refreshes = 0
+        self.last_duration = 0.0
+        self._lock = threading.Lock()
+
+    def refresh(self) -> float:
+        """Copy live DB -> snapshot now, return seconds taken"""
+        started = time.time()
+        tmp = f"{self.path}.tmp"
+        source = self.db.connect()
+        dest = sqlite3.connect(tmp)
+        try:
+            source.backup(dest)  # one step: consistent copy, short read lock
+            dest.execute("PRAGMA journal_mode=DELETE")  # read-only opens need no -wal/-shm
+        finally:
+            dest.close()
+            source.close()
+        os.replace(tmp, self.path)  # open readers keep the old file
+        with self._lock:
+            self.snapshot = SnapshotDB(self.path, self.db)
+            self.taken_at = started
+            self.refreshes += 1
+            self.last_duration = time.time() - started
+            # Commits after `started` are detected by the next data_version check
+            if self.dirty_since is not None and self.dirty_since <= started:
+                self.dirty_since = None
+        return self.last_duration
+
+    def staleness(self) -> Optional[float]:
+        """Seconds the snapshot lags behind the live DB (None: no snapshot)"""
+        with self._lock:
+            if self.snapshot is None:
+                return None
+            return time.time() - self.dirty_since if self.dirty_since else 0.0
+
+    def reader(self) -> Optional[SnapshotDB]:
+        """Snapshot if within the staleness bound, else None (use the live DB)"""
+        lag = self.staleness()
+        if lag is None or lag > self.max_staleness:
+            return None
+        return self.snapshot
+
+    def status(self) -> Dict:
+        lag = self.staleness()
+        return {
+            'enabled': self.enabled,
+            'path': self.path,
+            'taken_at': self.taken_at,
+            'staleness_seconds': round(lag, 1) if lag is not None else None,
+            'max_staleness_seconds': self.max_staleness,
+            'refreshes': self.refreshes,
+            'last_refresh_seconds': round(self.last_duration, 3),
+        }
+
+    def run(self, stop: threading.Event):
+        """Watch PRAGMA data_version, refresh after changes (coalesced)"""
+        monitor = self.db.connect()  # data_version changes when OTHER connections commit
+        try:
+            version = None
+            while not stop.is_set():
+                try:
+                    current = monitor.execute("PRAGMA data_version").fetchone()[0]
+                    now = time.time()
+                    if version is None or current != version:
+                        version = current
+                        with self._lock:
+                            if self.dirty_since is None:
+                                self.dirty_since = now
+                    dirty = self.dirty_since
+                    if self.snapshot is None or (dirty and now - dirty >= self.refresh_delay):
+                        self.refresh()
+                except sqlite3.Error as e:
+                    print(f"⚠️ Snapshot refresh failed: {e}")
+                stop.wait(self.check_interval)
+        finally:
+            monitor.close()
+
+    def start(self) -> Optional[threading.Event]:
+        """Refresh in a daemon thread, return its stop event (None for :memory:)"""
+        if not self.enabled:
+            return None
+        stop = threading.Event()
+        threading.Thread(target=self.run, args=(stop,), name='snapshotter', daemon=True).start()
+        return stop
+
+
+# ============================================
+# STARTUP
+# ============================================
+
+if __name__ == "__main__":
+    import argparse
+
+    parser = argparse.ArgumentParser(description='Maintain the analytics snapshot DB')
+    parser.add_argument('--once', action='store_true', help='Refresh once, then exit')
+    args = parser.parse_args()
+
+    snapshotter = Snapshotter(LogisticsDB())
+    print(f"📸 Snapshot: {snapshotter.path} (max staleness {snapshotter.max_staleness}s)")
+    if args.once:
+        print(f"✅ Refreshed in {snapshotter.refresh():.2f}s")
+    else:
+        stop = threading.Event()
+        try:
+            snapshotter.run(stop)
+        except KeyboardInterrupt:
+            stop.set()
+            print("\n👋 Snapshotter stopped")
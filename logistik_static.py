@@ -0,0 +1,171 @@
+#!/usr/bin/env python3
+"""
+Static Assets - Dashboards served from memory
+dashboard/ and jarvis_dashboard/ are read once at startup:
+
+    precompressed   gzip and deflate at level 9 next to the raw bytes
+                    (encoding picked like logistik_http.negotiate)
+    strong ETags    content hash per representation, If-None-Match -> 304
+    fingerprints    name.<hash>.ext (e.g. /dashboard/app.3f2a91c0.js),
+                    Cache-Control: public, max-age=1 year, immutable;
+                    src/href references in HTML files are rewritten to
+                    the fingerprinted names, so only the HTML itself
+                    (Cache-Control: no-cache) is revalidated per load
+
+reload=True (development: API with code reloader) rescans the
+directories at most every RELOAD_INTERVAL seconds and rebuilds a root
+when a file changed; otherwise files are never touched again.
+"""
+
+import gzip
+import hashlib
+import mimetypes
+import re
+import threading
+import time
+import zlib
+from pathlib import Path
+from typing import Dict, Optional, Tuple
+from flask import Response, abort, request
+from logistik_http import COMPRESS_MIN_BYTES, compressible, negotiate
+
+FINGERPRINT_LENGTH = 8
+IMMUTABLE = 'public, max-age=31536000, immutable'
+REVALIDATE = 'no-cache'
+RELOAD_INTERVAL = 1.0  # seconds between directory scans in development
+REFERENCE = re.compile(r'''((?:src|href)\s*=\s*["'])([^"'#?:]+)(["'])''')
+
+
+def fingerprinted(name: str, digest: str) -> str:
+    """'js/app.js' -> 'js/app.<hash>.js'"""
+    stem, dot, ext = name.rpartition('.')
+    if not dot or '/' in ext:
+        return f"{name}.{digest[:FINGERPRINT_LENGTH]}"
+    return f"{stem}.{digest[:FINGERPRINT_LENGTH]}.{ext}"
+
+
+class Asset:
+    """One file: raw + precompressed bodies, ETag per representation"""
+
+    def __init__(self, name: str, data: bytes):
+        self.name = name
+        self.mimetype = mimetypes.guess_type(name)[0] or 'application/octet-stream'
+        self.digest = hashlib.sha256(data).hexdigest()
+        self.fingerprint = fingerprinted(name, self.digest)
+        self.bodies: Dict[Optional[str], bytes] = {None: data}
+        if len(data) >= COMPRESS_MIN_BYTES and compressible(self.mimetype):
+            self.bodies['gzip'] = gzip.compress(data, compresslevel=9, mtime=0)
+            self.bodies['deflate'] = zlib.compress(data, 9)
+
+    def etag(self, encoding: Optional[str]) -> str:
+        tag = self.digest[:16]
+        return f'"{tag}-{encoding}"' if encoding else f'"{tag}"'
+
+
+class StaticAssets:
+    """URL prefix -> directory, all files in memory"""
+
+    def __init__(self, roots: Dict[str, Path], reload: bool = False):
+        self.roots = {prefix: Path(path) for prefix, path in roots.items()}
+        self.reload = reload
+        self._assets: Dict[str, Dict[str, Asset]] = {}
+        self._stamps: Dict[str, Dict[str, Tuple[int, int]]] = {}
+        self._scanned = 0.0
+        self._lock = threading.Lock()
+        for prefix in self.roots:
+            self._load(prefix)
+
+    # ========== LOADING ==========
+
+    def _scan(self, prefix: str) -> Dict[str, Tuple[int, int]]:
+        root = self.roots[prefix]
+        if not root.is_dir():
+            return {}
+        stamps = {}
+        for path in root.rglob('*'):
+            if path.is_file() and not path.name.startswith('.'):
+                stat = path.stat()
+                stamps[path.relative_to(root).as_posix()] = (stat.st_mtime_ns, stat.st_size)
+        return stamps
+
+    def _load(self, prefix: str):
+        """Read, fingerprint and compress one directory (HTML last: it references the rest)"""
+        root = self.roots[prefix]
+        stamps = self._scan(prefix)
+        names = sorted(stamps, key=lambda name: name.endswith(('.html', '.htm')))
+        assets: Dict[str, Asset] = {}
+        for name in names:
+            data = (root / name).read_bytes()
+            if name.endswith(('.html', '.htm')):
+                data = self._rewrite(data, name, assets)
+            asset = Asset(name, data)
+            assets[name] = assets[asset.fingerprint] = asset
+        self._assets[prefix] = assets
+        self._stamps[prefix] = stamps
+
+    @staticmethod
+    def _rewrite(html: bytes, name: str, assets: Dict[str, Asset]) -> bytes:
+        """Point relative src/href of known assets at their fingerprinted names"""
+        base = name.rpartition('/')[0]
+
+        def replace(match):
+            target = match.group(2).strip()
+            asset = assets.get(f"{base}/{target}" if base else target)
+            if target.startswith('/') or asset is None:
+                return match.group(0)
+            head, slash, _ = target.rpartition('/')
+            return f"{match.group(1)}{head}{slash}{asset.fingerprint.rpartition('/')[2]}{match.group(3)}"
+
+        try:
+            text = html.decode('utf-8')
+        except UnicodeDecodeError:
+            return html
+        return REFERENCE.sub(replace, text).encode('utf-8')
+
+    def _check_reload(self):
+        if not self.reload or time.monotonic() - self._scanned < RELOAD_INTERVAL:
+            return
+        with self._lock:
+            self._scanned = time.monotonic()
+            for prefix in self.roots:
+                if self._scan(prefix) != self._stamps.get(prefix):
+                    self._load(prefix)
+
+    # ========== SERVING ==========
+
+    def url(self, prefix: str, name: str) -> str:
+        """Fingerprinted URL for templates / API responses"""
+        self._check_reload()
+        asset = self._assets[prefix].get(name)
+        return f"/{prefix}/{asset.fingerprint if asset else name}"
+
+    def response(self, prefix: str, name: str) -> Response:
+        """Serve prefix/name for the current request (404 if unknown)"""
+        self._check_reload()
+        asset = self._assets.get(prefix, {}).get(name)
+        if asset is None:
+            abort(404)
+        encoding = negotiate(request.headers.get('Accept-Encoding', ''))
+        if encoding not in asset.bodies:
+            encoding = None
+        etag = asset.etag(encoding)
+
+        if etag in request.headers.get('If-None-Match', ''):
+            response = Response(status=304)
+        else:
+            response = Response(asset.bodies[encoding], mimetype=asset.mimetype)
+            if encoding:
+                response.headers['Content-Encoding'] = encoding
+        response.headers['ETag'] = etag
+        response.headers['Cache-Control'] = IMMUTABLE if name == asset.fingerprint else REVALIDATE
+        if len(asset.bodies) > 1:
+            response.vary.add('Accept-Encoding')
+        return response
+
+    def stats(self) -> Dict:
+        files = {asset.name: asset for assets in self._assets.values() for asset in assets.values()}
+        return {
+            'files': len(files),
+            'bytes': sum(len(asset.bodies[None]) for asset in files.values()),
+            'gzip_bytes': sum(len(asset.bodies.get('gzip', asset.bodies[None])) for asset in files.values()),
+        }
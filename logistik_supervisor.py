@@ -0,0 +1,413 @@
+#!/usr/bin/env python3
+"""
+Process Supervisor - Child processes of START_SYSTEM, sharded engine workers
+Every child (API, gateway, dispatcher, engine workers) is a ManagedProcess:
+
+    output     stdout+stderr drained by a thread into <log_dir>/<name>.log
+               (rotating), so a chatty child never blocks on a full pipe
+    restarts   exponential backoff, counter resets after STABLE_AFTER
+    probes     readiness until it passes once, liveness every PROBE_INTERVAL
+               (HTTP for API/gateway, heartbeat for engine workers);
+               LIVENESS_FAILURES in a row -> killed and restarted
+    usage      CPU % and RSS from /proc (Linux), restart counts
+
+Engine tasks are split into SHARDS by related_order_id (task id for tasks
+without an order): shard = COALESCE(related_order_id, id) % shard_count.
+All tasks of one order therefore stay on one worker, in order.
+
+    supervisor   spawns workflow_engine.py --worker engine-<i>, owns the
+                 shard map in `engine_workers`, restarts crashed workers
+                 with exponential backoff and moves the shards of a dead
+                 worker to the live ones until it is back
+    worker       re-reads its row (PK lookup) at the start of every cycle,
+                 processes only its shards, writes a heartbeat after it
+
+Shards > workers (SHARDS_PER_WORKER each) so a dead worker's load is
+spread over all survivors instead of doubling one of them; rebalancing
+keeps every shard on its owner unless it has to move. Worker-wide
+duties (batch assignment, maintenance) run on the owner of shard 0.
+Shards move at cycle boundaries: a worker that loses a shard may finish
+the cycle it is in.
+
+Run: python logistik_supervisor.py [--workers N]
+"""
+
+import json
+import logging
+import os
+import subprocess
+import sys
+import threading
+import time
+import urllib.error
+import urllib.request
+from logging.handlers import RotatingFileHandler
+from pathlib import Path
+from typing import Callable, Dict, List, Optional, Tuple
+from logistik_config import CONFIG
+from logistik_db import LogisticsDB
+
+PROJECT_ROOT = Path(__file__).parent
+WORKFLOW_FILE = PROJECT_ROOT / "workflow_engine.py"
+SHARDS_PER_WORKER = 4
+RESTART_BASE_DELAY = 1.0  # seconds, doubled per crash in a row
+RESTART_MAX_DELAY = 60.0
+STABLE_AFTER = 60.0  # seconds alive before the crash counter resets
+STARTUP_GRACE = 15.0  # seconds before liveness probes count
+PROBE_INTERVAL = 5.0
+LIVENESS_FAILURES = 3  # failed probes in a row before a kill
+HEARTBEAT_TIMEOUT = 120.0  # engine cycle every 10s; a stuck cycle shows up here
+LOG_MAX_BYTES = 10 * 2 ** 20
+LOG_BACKUPS = 5
+
+# Claim of a pending task by the worker handling it (workflow_engine.py claim())
+TASK_CLAIM_COLUMNS = {
+    'claimed_by': 'TEXT',  # '<worker>:<pid>'
+    'claimed_at': 'TIMESTAMP',
+}
+
+ENGINE_WORKERS_TABLE = """
+CREATE TABLE IF NOT EXISTS engine_workers (
+  worker TEXT PRIMARY KEY, -- 'engine-0', ... ('engine' = unsupervised single engine)
+  shards TEXT NOT NULL DEFAULT '[]', -- JSON list of owned shards
+  shard_count INTEGER NOT NULL DEFAULT 1,
+  pid INTEGER,
+  restarts INTEGER NOT NULL DEFAULT 0,
+  heartbeat_at REAL, -- unix time of the last finished cycle
+  cycles INTEGER NOT NULL DEFAULT 0,
+  last_cycle_ms REAL,
+  updated_at TIMESTAMP DEFAULT CURRENT_TIMESTAMP
+) WITHOUT ROWID
+"""
+
+
+def worker_shards(db: LogisticsDB, worker: str) -> Optional[Tuple[List[int], int]]:
+    """(shards, shard_count) assigned to worker, None if it is not supervised"""
+    rows = db.query("SELECT shards, shard_count FROM engine_workers WHERE worker = ?", (worker,))
+    if not rows:
+        return None
+    return json.loads(rows[0]['shards']), rows[0]['shard_count']
+
+
+def heartbeat(db: LogisticsDB, worker: str, cycle_ms: float):
+    """Record a finished engine cycle"""
+    db.execute("""
+        INSERT INTO engine_workers (worker, pid, heartbeat_at, cycles, last_cycle_ms)
+        VALUES (?, ?, ?, 1, ?)
+        ON CONFLICT(worker) DO UPDATE SET pid = excluded.pid, heartbeat_at = excluded.heartbeat_at,
+            cycles = cycles + 1, last_cycle_ms = excluded.last_cycle_ms, updated_at = CURRENT_TIMESTAMP
+    """, (worker, os.getpid(), time.time(), round(cycle_ms, 1)))
+
+
+def balance(shard_count: int, workers: List[str],
+            previous: Dict[str, List[int]] = None) -> Dict[str, List[int]]:
+    """Even shard split over workers, moving as few shards as possible"""
+    ordered = sorted(workers)
+    if not ordered:
+        return {}
+    base, extra = divmod(shard_count, len(ordered))
+    target = {worker: base + (1 if i < extra else 0) for i, worker in enumerate(ordered)}
+    result = {worker: [] for worker in ordered}
+    kept = set()
+    for worker in ordered:  # keep own shards up to the target
+        for shard in sorted((previous or {}).get(worker, [])):
+            if shard < shard_count and len(result[worker]) < target[worker]:
+                result[worker].append(shard)
+                kept.add(shard)
+    orphans = [shard for shard in range(shard_count) if shard not in kept]
+    for worker in ordered:  # dead workers' and surplus shards fill the gaps
+        while len(result[worker]) < target[worker]:
+            result[worker].append(orphans.pop(0))
+        result[worker].sort()
+    return result
+
+
+def proc_usage(pid: int) -> Optional[Tuple[float, int]]:
+    """(CPU seconds, RSS bytes) of a process from /proc, None where unavailable"""
+    try:
+        with open(f'/proc/{pid}/stat') as f:
+            fields = f.read().rsplit(')', 1)[1].split()  # fields from 'state' on
+    except (OSError, IndexError):
+        return None
+    cpu = (int(fields[11]) + int(fields[12])) / os.sysconf('SC_CLK_TCK')  # utime + stime
+    return cpu, int(fields[21]) * os.sysconf('SC_PAGE_SIZE')
+
+
+def http_probe(port: int, path: str = '/', timeout: float = 1.0) -> bool:
+    """Any HTTP answer below 500 counts as up"""
+    try:
+        with urllib.request.urlopen(f'http://127.0.0.1:{port}{path}', timeout=timeout) as response:
+            return response.status < 500
+    except urllib.error.HTTPError as e:
+        return e.code < 500
+    except OSError:
+        return False
+
+
+class ManagedProcess:
+    """One child process: output -> rotating log file, restarts with backoff, probes
+
+    liveness   callable, False LIVENESS_FAILURES times in a row -> killed and restarted
+    readiness  callable, checked until it passes once per start (default: alive = ready)
+    """
+
+    def __init__(self, name: str, argv: List[str], liveness: Callable[[], bool] = None,
+                 readiness: Callable[[], bool] = None, grace: float = STARTUP_GRACE,
+                 log_dir: str = None):
+        self.name = name
+        self.argv = argv
+        self.liveness = liveness
+        self.readiness = readiness
+        self.grace = grace  # seconds after start before liveness counts
+        self.proc: Optional[subprocess.Popen] = None
+        self.started_at = 0.0
+        self.crashes = 0  # in a row
+        self.restarts = 0
+        self.restart_at = 0.0  # next start attempt while down
+        self.ready = False
+        self.probe_failures = 0
+        self.last_probe = 0.0
+        self._cpu_sample: Optional[Tuple[float, float]] = None  # (wall, cpu seconds)
+
+        self.log = logging.getLogger(f'logistik_child.{name}')
+        self.log.propagate = False
+        if not self.log.handlers:
+            directory = Path(log_dir or CONFIG['log_dir'])
+            directory.mkdir(parents=True, exist_ok=True)
+            handler = RotatingFileHandler(directory / f'{name}.log', maxBytes=LOG_MAX_BYTES,
+                                          backupCount=LOG_BACKUPS, encoding='utf-8')
+            handler.setFormatter(logging.Formatter('%(asctime)s %(message)s'))
+            self.log.addHandler(handler)
+            self.log.setLevel(logging.INFO)
+
+    @property
+    def alive(self) -> bool:
+        return self.proc is not None and self.proc.poll() is None
+
+    def spawn(self) -> bool:
+        self.started_at = time.time()
+        self.ready = False
+        self.probe_failures = 0
+        self._cpu_sample = None
+        try:
+            self.proc = subprocess.Popen(
+                self.argv, cwd=str(PROJECT_ROOT),
+                stdout=subprocess.PIPE, stderr=subprocess.STDOUT,
+                env=dict(os.environ, PYTHONUNBUFFERED='1'),  # lines reach the log as they happen
+            )
+        except OSError as e:
+            self.log.info(f"[supervisor] start failed: {e}")
+            self.proc = None
+            self._backoff(time.time())
+            return False
+        # The pipe is always drained, a full pipe buffer would block the child
+        threading.Thread(target=self._pump, args=(self.proc.stdout,), name=f'log-{self.name}',
+                         daemon=True).start()
+        self.log.info(f"[supervisor] started pid {self.proc.pid}")
+        return True
+
+    def _pump(self, pipe):
+        for line in iter(pipe.readline, b''):
+            self.log.info(line.decode('utf-8', 'replace').rstrip())
+        pipe.close()
+
+    def exited(self, now: float) -> float:
+        """Process is gone: schedule the restart, return the delay"""
+        code = self.proc.returncode
+        self.proc = None
+        self.ready = False
+        if now - self.started_at >= STABLE_AFTER:
+            self.crashes = 0
+        delay = self._backoff(now)
+        self.log.info(f"[supervisor] exited ({code}), restart in {delay:.0f}s")
+        return delay
+
+    def _backoff(self, now: float) -> float:
+        self.crashes += 1
+        delay = min(RESTART_MAX_DELAY, RESTART_BASE_DELAY * 2 ** (self.crashes - 1))
+        self.restart_at = now + delay
+        return delay
+
+    def probe(self, now: float):
+        """Readiness until it passes, liveness after the grace period"""
+        self.last_probe = now
+        if not self.ready:
+            self.ready = self.readiness is None or _safe(self.readiness)
+        if self.liveness is None or now - self.started_at < self.grace:
+            return
+        if _safe(self.liveness):
+            self.probe_failures = 0
+            return
+        self.probe_failures += 1
+        if self.probe_failures >= LIVENESS_FAILURES:
+            self.log.info(f"[supervisor] liveness failed {self.probe_failures}x, killing pid {self.proc.pid}")
+            self.proc.kill()  # next check() sees the exit and restarts it
+
+    def usage(self) -> Dict:
+        """CPU % since the previous call and RSS of the running process"""
+        sample = proc_usage(self.proc.pid) if self.alive else None
+        if sample is None:
+            return {'cpu_percent': None, 'rss_mb': None}
+        now, (cpu, rss) = time.time(), sample
+        previous, self._cpu_sample = self._cpu_sample, (now, cpu)
+        percent = None
+        if previous and now > previous[0]:
+            percent = round((cpu - previous[1]) / (now - previous[0]) * 100, 1)
+        return {'cpu_percent': percent, 'rss_mb': round(rss / 2 ** 20, 1)}
+
+    def status(self) -> Dict:
+        return {'name': self.name, 'alive': self.alive, 'ready': self.ready,
+                'pid': self.proc.pid if self.alive else None, 'restarts': self.restarts,
+                'uptime': round(time.time() - self.started_at) if self.alive else 0,
+                **self.usage()}
+
+    def stop(self, timeout: float = 5):
+        if self.alive:
+            self.proc.terminate()
+            try:
+                self.proc.wait(timeout=timeout)
+            except subprocess.TimeoutExpired:
+                self.proc.kill()
+        self.proc = None
+
+
+def _safe(probe: Callable[[], bool]) -> bool:
+    try:
+        return bool(probe())
+    except Exception:
+        return False
+
+
+class Supervisor:
+    """Keeps a set of ManagedProcesses running; call check() every second"""
+
+    def __init__(self):
+        self.processes: Dict[str, ManagedProcess] = {}
+
+    def add(self, process: ManagedProcess) -> ManagedProcess:
+        self.processes[process.name] = process
+        return process
+
+    def start(self, name: str) -> bool:
+        return self.processes[name].spawn()
+
+    def check(self):
+        """Detect exits, restart due processes with backoff, run probes"""
+        now = time.time()
+        due = []
+        changed = False
+        for process in self.processes.values():
+            if process.proc is not None and not process.alive:
+                delay = process.exited(now)
+                print(f"   ⚠️  {process.name} exited, restart in {delay:.0f}s")
+                changed = True
+            elif process.proc is None and now >= process.restart_at:
+                process.restarts += 1
+                due.append(process)
+                changed = True
+            elif process.alive and now - process.last_probe >= PROBE_INTERVAL:
+                process.probe(now)
+        if changed:
+            self.membership_changed(now)
+        for process in due:
+            process.spawn()
+
+    def membership_changed(self, now: float):
+        """Hook: a process went down or is about to start"""
+
+    def status(self) -> List[Dict]:
+        return [process.status() for process in self.processes.values()]
+
+    def stop(self):
+        for process in self.processes.values():
+            if process.alive:
+                process.proc.terminate()
+        for process in self.processes.values():
+            process.stop()
+
+
+class EngineSupervisor(Supervisor):
+    """Engine workers: restarts, heartbeat liveness, shard rebalancing"""
+
+    def __init__(self, db: LogisticsDB = None, workers: int = None, shards_per_worker: int = SHARDS_PER_WORKER,
+                 log_dir: str = None):
+        super().__init__()
+        self.db = db or LogisticsDB()
+        count = workers or os.cpu_count() or 1
+        self.shard_count = count * shards_per_worker
+        self.assignment: Dict[str, List[int]] = {}
+        for i in range(count):
+            name = f'engine-{i}'
+            self.add(ManagedProcess(
+                name, [sys.executable, str(WORKFLOW_FILE), '--worker', name],
+                liveness=lambda name=name: self.heartbeat_age(name) < HEARTBEAT_TIMEOUT,
+                readiness=lambda name=name: self.heartbeat_age(name) < time.time() - self.processes[name].started_at,
+                grace=HEARTBEAT_TIMEOUT, log_dir=log_dir))
+
+    @property
+    def workers(self) -> List[ManagedProcess]:
+        return list(self.processes.values())
+
+    def heartbeat_age(self, worker: str) -> float:
+        """Seconds since the worker finished a cycle (inf if never)"""
+        rows = self.db.query("SELECT heartbeat_at FROM engine_workers WHERE worker = ?", (worker,))
+        if not rows or rows[0]['heartbeat_at'] is None:
+            return float('inf')
+        return time.time() - rows[0]['heartbeat_at']
+
+    def start_all(self) -> bool:
+        """Start all workers; True if at least one is running"""
+        self.db.execute("DELETE FROM engine_workers WHERE worker LIKE 'engine-%'")
+        self.rebalance(list(self.processes))
+        for worker in self.workers:
+            worker.spawn()
+        return any(worker.alive for worker in self.workers)
+
+    def membership_changed(self, now: float):
+        # Down workers' shards go to the live ones; a due restart gets its share before it starts
+        live = [w.name for w in self.workers if w.alive or (w.proc is None and now >= w.restart_at)]
+        self.rebalance(live)
+
+    def rebalance(self, live: List[str]):
+        assignment = balance(self.shard_count, live, self.assignment)
+        with self.db.transaction() as conn:
+            for worker in self.workers:
+                conn.execute("""
+                    INSERT INTO engine_workers (worker, shards, shard_count, restarts) VALUES (?, ?, ?, ?)
+                    ON CONFLICT(worker) DO UPDATE SET shards = excluded.shards,
+                        shard_count = excluded.shard_count, restarts = excluded.restarts,
+                        updated_at = CURRENT_TIMESTAMP
+                """, (worker.name, json.dumps(assignment.get(worker.name, [])), self.shard_count,
+                      worker.restarts))
+        if assignment != self.assignment and self.assignment:
+            print(f"   🔀 Shards rebalanced over {len(live)} workers")
+        self.assignment = assignment
+
+    def status(self) -> List[Dict]:
+        return [{**worker.status(), 'shards': self.assignment.get(worker.name, [])} for worker in self.workers]
+
+
+# ============================================
+# STARTUP
+# ============================================
+
+if __name__ == "__main__":
+    import argparse
+    from logistik_migrations import migrate
+
+    parser = argparse.ArgumentParser(description='Run supervised workflow engine workers')
+    parser.add_argument('--workers', type=int, default=None, help='Worker processes (default: CPU count)')
+    args = parser.parse_args()
+
+    db = LogisticsDB()
+    migrate(db)
+    supervisor = EngineSupervisor(db, workers=args.workers)
+    print(f"🚀 Engine supervisor: {len(supervisor.workers)} workers, {supervisor.shard_count} shards")
+    supervisor.start_all()
+    try:
+        while True:
+            time.sleep(1)
+            supervisor.check()
+    except KeyboardInterrupt:
+        supervisor.stop()
+        print("\n✋ Engine workers stopped")
@@ -0,0 +1,134 @@
+#!/usr/bin/env python3
+"""
+Driver Sync - Delta sync of assigned orders for the driver app
+Triggers on `orders` append (driver_id, order_id) to `order_changes`
+whenever an order a driver sees is created, changed, reassigned or
+archived - for the new AND the previous driver. The sync token is the
+last change sequence number the app has seen.
+
+    first call:  snapshot (open orders + recently finished), token
+    later calls: only orders changed since the token, plus `removed` ids
+                 (reassigned to someone else or archived)
+
+Tokens older than the pruned log get a fresh snapshot (`full: true`).
+"""
+
+from typing import Dict, List, Optional
+from logistik_db import LogisticsDB
+
+SYNC_HISTORY_DAYS = 1  # finished orders still shown in a snapshot
+CHANGE_RETENTION_DAYS = 14  # older tokens fall back to a snapshot
+
+# What the driver app needs (no prices, customer or billing data)
+DRIVER_ORDER_COLUMNS = [
+    'id', 'order_number', 'status', 'priority',
+    'pickup_address', 'pickup_city', 'pickup_postal', 'pickup_contact_name',
+    'pickup_contact_phone', 'pickup_notes', 'pickup_time_window',
+    'delivery_address', 'delivery_city', 'delivery_postal', 'delivery_contact_name',
+    'delivery_contact_phone', 'delivery_notes', 'delivery_time_window',
+    'parcel_description', 'weight_kg', 'dimensions_cm', 'fragile', 'requires_signature',
+    'deadline', 'assigned_at', 'pickup_time', 'delivery_time',
+]
+
+CHANGES_TABLE = """
+CREATE TABLE IF NOT EXISTS order_changes (
+  seq INTEGER PRIMARY KEY AUTOINCREMENT, -- sync token
+  driver_id INTEGER NOT NULL,
+  order_id INTEGER NOT NULL,
+  changed_at TIMESTAMP DEFAULT CURRENT_TIMESTAMP
+)
+"""
+CHANGES_INDEX = "CREATE INDEX IF NOT EXISTS idx_order_changes_driver ON order_changes(driver_id, seq)"
+
+_watched = ', '.join(['assigned_driver_id'] + DRIVER_ORDER_COLUMNS[1:])
+
+CHANGE_TRIGGERS = [
+    """CREATE TRIGGER IF NOT EXISTS order_changes_ai AFTER INSERT ON orders
+         WHEN new.assigned_driver_id IS NOT NULL BEGIN
+           INSERT INTO order_changes (driver_id, order_id) VALUES (new.assigned_driver_id, new.id);
+         END""",
+    f"""CREATE TRIGGER IF NOT EXISTS order_changes_au AFTER UPDATE OF {_watched} ON orders BEGIN
+           INSERT INTO order_changes (driver_id, order_id)
+             SELECT new.assigned_driver_id, new.id WHERE new.assigned_driver_id IS NOT NULL;
+           INSERT INTO order_changes (driver_id, order_id)
+             SELECT old.assigned_driver_id, old.id WHERE old.assigned_driver_id IS NOT NULL
+               AND old.assigned_driver_id IS NOT new.assigned_driver_id;
+         END""",
+    """CREATE TRIGGER IF NOT EXISTS order_changes_ad AFTER DELETE ON orders
+         WHEN old.assigned_driver_id IS NOT NULL BEGIN
+           INSERT INTO order_changes (driver_id, order_id) VALUES (old.assigned_driver_id, old.id);
+         END""",
+]
+
+SYNC_DDL = [CHANGES_TABLE, CHANGES_INDEX] + CHANGE_TRIGGERS
+
+
+def parse_token(token) -> Optional[int]:
+    try:
+        return int(token) if token not in (None, '') else None
+    except (TypeError, ValueError):
+        return None
+
+
+class DriverSync:
+    """Snapshot + delta queries over `order_changes`"""
+
+    def __init__(self, db: LogisticsDB = None):
+        self.db = db or LogisticsDB()
+
+    def _current(self, conn) -> int:
+        row = conn.execute("SELECT seq FROM sqlite_sequence WHERE name='order_changes'").fetchone()
+        return row[0] if row else 0
+
+    def _rows(self, conn, sql: str, params: Dict) -> List[Dict]:
+        return [dict(row) for row in conn.execute(sql, params)]
+
+    def sync(self, driver_id: int, token=None) -> Dict:
+        """Orders for the driver app: snapshot without/with stale token, else delta"""
+        since = parse_token(token)
+        columns = ', '.join(f"o.{c}" for c in DRIVER_ORDER_COLUMNS)
+        params = {'driver': driver_id, 'since': since}
+        conn = self.db.connect()
+        conn.isolation_level = None
+        try:
+            conn.execute("BEGIN")  # token and rows from one consistent read
+            current = self._current(conn)
+            floor = conn.execute("SELECT MIN(seq) FROM order_changes").fetchone()[0] or current + 1
+            full = since is None or since + 1 < floor or since > current
+
+            if full:
+                orders = self._rows(conn, f"""
+                    SELECT {columns} FROM orders o
+                    WHERE o.assigned_driver_id = :driver
+                      AND (o.status NOT IN ('delivered', 'cancelled', 'failed')
+                           -- delivery_time is local ISO ('T'), updated_at UTC (CURRENT_TIMESTAMP)
+                           OR julianday(o.delivery_time) >= julianday('now', 'localtime', '-{SYNC_HISTORY_DAYS} days')
+                           OR (o.delivery_time IS NULL
+                               AND julianday(o.updated_at) >= julianday('now', '-{SYNC_HISTORY_DAYS} days')))
+                    ORDER BY o.deadline
+                """, params)
+                removed = []
+            else:
+                changed = "SELECT order_id FROM order_changes WHERE driver_id = :driver AND seq > :since"
+                orders = self._rows(conn, f"""
+                    SELECT {columns} FROM orders o
+                    WHERE o.assigned_driver_id = :driver AND o.id IN ({changed})
+                    ORDER BY o.deadline
+                """, params)
+                kept = {order['id'] for order in orders}
+                removed = sorted({row[0] for row in conn.execute(changed, params)} - kept)
+            conn.execute("COMMIT")
+        finally:
+            conn.close()
+
+        return {
+            'orders': orders,
+            'removed': removed,
+            'full': full,
+            'sync_token': str(current),
+        }
+
+    def prune(self, days: int = CHANGE_RETENTION_DAYS) -> int:
+        """Drop old change rows (their tokens get a snapshot next time)"""
+        return self.db.execute("DELETE FROM order_changes WHERE changed_at < datetime('now', ?)",
+                               (f'-{days} days',))
@@ -0,0 +1,150 @@
+#!/usr/bin/env python3
+"""
+Single Writer - One write connection per process, group commit
+LogisticsDB.insert/update/execute hand their statement to a WriteQueue
+instead of opening their own write transaction. One writer thread takes
+everything that queued up while the previous commit ran and applies it in
+ONE transaction (each write in its own SAVEPOINT, so a failing write only
+fails its own caller). Callers block on a Future for their result.
+
+    in-process writers   never compete for the lock (one connection)
+    other processes      WAL + busy timeout; BEGIN IMMEDIATE is retried
+                         with exponential backoff (retry_busy) if still busy
+
+Multi-statement transactions (db.transaction()) keep their own connection
+and use the same busy retry.
+"""
+
+import queue
+import random
+import sqlite3
+import threading
+import time
+from concurrent.futures import Future
+from typing import Any, Callable, Dict, Optional
+
+MAX_BATCH = 256  # writes per group commit
+RETRY_ATTEMPTS = 6
+RETRY_BASE_DELAY = 0.02  # seconds, doubled per attempt (+ jitter)
+
+
+def is_busy(error: Exception) -> bool:
+    """SQLITE_BUSY / SQLITE_LOCKED ('database is locked', 'database table is locked')"""
+    return isinstance(error, sqlite3.OperationalError) and 'locked' in str(error)
+
+
+def retry_busy(fn: Callable[[], Any], attempts: int = RETRY_ATTEMPTS, base_delay: float = RETRY_BASE_DELAY):
+    """Call fn(), retry with backoff while the DB stays locked after the busy timeout"""
+    for attempt in range(attempts):
+        try:
+            return fn()
+        except sqlite3.OperationalError as e:
+            if not is_busy(e) or attempt == attempts - 1:
+                raise
+            time.sleep(base_delay * (2 ** attempt) * (0.5 + random.random()))
+
+
+class WriteQueue:
+    """Writer thread: queued writes -> one transaction per batch -> futures"""
+
+    def __init__(self, db, max_batch: int = MAX_BATCH):
+        self.db = db
+        self.max_batch = max_batch
+        self._queue: 'queue.Queue' = queue.Queue()
+        self._thread: Optional[threading.Thread] = None
+        self._start_lock = threading.Lock()
+        self.batches = 0
+        self.writes = 0
+        self.largest_batch = 0
+        self.latency_ms = 0.0  # queue wait + commit of recent batches (moving average)
+        self.latency_at = 0.0  # monotonic time of the last batch
+
+    def submit(self, fn: Callable[[sqlite3.Connection], Any]) -> Future:
+        """Queue fn(conn); the future resolves after the batch has committed"""
+        if self._thread is None:
+            self._start()
+        future = Future()
+        self._queue.put((fn, future, time.monotonic()))
+        return future
+
+    def run(self, fn: Callable[[sqlite3.Connection], Any]) -> Any:
+        """submit() and wait for the result (re-raises the write's exception)"""
+        if threading.current_thread() is self._thread:
+            raise RuntimeError("Nested write from inside the writer thread")
+        return self.submit(fn).result()
+
+    def stats(self) -> Dict:
+        return {
+            'queued': self._queue.qsize(),
+            'batches': self.batches,
+            'writes': self.writes,
+            'avg_batch': round(self.writes / self.batches, 1) if self.batches else 0,
+            'largest_batch': self.largest_batch,
+            'latency_ms': round(self.latency_ms, 1),
+            'latency_age': round(time.monotonic() - self.latency_at, 1) if self.latency_at else None,
+        }
+
+    def _start(self):
+        with self._start_lock:
+            if self._thread is None:
+                thread = threading.Thread(target=self._loop, name='db-writer', daemon=True)
+                thread.start()
+                self._thread = thread
+
+    def _loop(self):
+        conn = None  # opened (again) by _commit
+        while True:
+            batch = [self._queue.get()]  # block for the first write...
+            while len(batch) < self.max_batch:  # ...then take whatever queued up meanwhile
+                try:
+                    batch.append(self._queue.get_nowait())
+                except queue.Empty:
+                    break
+            queued_at = batch[0][2]
+            batch = [(fn, future) for fn, future, _ in batch if future.set_running_or_notify_cancel()]
+            if batch:
+                conn = self._commit(conn, batch)
+                self._observe((time.monotonic() - queued_at) * 1000)
+
+    def _observe(self, latency_ms: float):
+        """Oldest write of the batch: submit -> committed"""
+        self.latency_ms = latency_ms if not self.latency_at else 0.8 * self.latency_ms + 0.2 * latency_ms
+        self.latency_at = time.monotonic()
+
+    def _commit(self, conn: Optional[sqlite3.Connection], batch) -> Optional[sqlite3.Connection]:
+        results = []
+        try:
+            if conn is None:
+                conn = self.db.connect()
+                conn.isolation_level = None  # BEGIN/COMMIT/SAVEPOINT managed here
+            retry_busy(lambda: conn.execute("BEGIN IMMEDIATE"))
+            for fn, _ in batch:
+                conn.execute("SAVEPOINT write")
+                try:
+                    results.append((True, fn(conn)))
+                    conn.execute("RELEASE write")
+                except Exception as e:
+                    conn.execute("ROLLBACK TO write")
+                    conn.execute("RELEASE write")
+                    results.append((False, e))
+            conn.execute("COMMIT")
+        except Exception as e:
+            # Nothing of this batch is durable: fail every caller, reconnect next time
+            if conn is not None:
+                try:
+                    conn.close()
+                except sqlite3.Error:
+                    pass
+            for _, future in batch:
+                future.set_exception(e)
+            return None
+
+        self.batches += 1
+        self.writes += len(batch)
+        self.largest_batch = max(self.largest_batch, len(batch))
+        for (_, future), (ok, value) in zip(batch, results):
+            if ok:
+                future.set_result(value)
+            else:
+                future.set_exception(value)
+        return conn
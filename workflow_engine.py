@@ -4,19 +4,52 @@ Workflow Engine - Orchestrates agent tasks based on events
 Monitors DB for pending tasks and triggers appropriate agents
 """
 
+import os
 import time
 import json
 from datetime import datetime, timedelta
-from typing import Dict, List
+from typing import Dict, List, Optional
 from logistik_db import LogisticsDB
+from logistik_config import CONFIG
+from logistik_assignment import BatchAssigner
+from logistik_billing import BillingRun, previous_month
+from logistik_payroll import PayrollRun
+from logistik_archive import Archiver
+from logistik_sync import DriverSync
+from logistik_eta import EtaService
+from logistik_events import EventLog
+from logistik_supervisor import worker_shards, heartbeat
+from logistik_log import get_logger
+
+ARCHIVE_INTERVAL = timedelta(hours=6)  # Hot/cold archival + incremental vacuum
+BILLING_CHECK_INTERVAL = timedelta(hours=1)  # Closed billing period without a run?
+CLAIM_TIMEOUT = timedelta(minutes=10)  # older claims are free again (claiming worker died mid-task)
+
+# Task types whose handler completes or cancels the task; only these are claimed,
+# the rest (no-op handlers, dispatcher escalations) stay pending by design
+CLOSED_BY_HANDLER = {'send_email', 'billing_run', 'calculate_driver_wage', 'notify_customer', 'notify_driver'}
+
+log = get_logger('engine')  # per-task lines at DEBUG (LOGISTIK_LOG_LEVEL)
 
 class WorkflowEngine:
     """Orchestrates multi-agent workflows"""
     
-    def __init__(self):
-        self.db = LogisticsDB()
+    def __init__(self, db: LogisticsDB = None, assignment_mode: str = None, worker: str = None):
+        self.db = db or LogisticsDB(compact_rows=True)
+        self.worker = worker  # supervised worker name (logistik_supervisor.py), None = all tasks
+        self.claimant = f"{worker or 'engine'}:{os.getpid()}"  # tasks.claimed_by
+        self.shards = None  # owned shards of COALESCE(related_order_id, id) % shard_count
+        self.shard_count = 1
+        self.assignment_mode = assignment_mode or CONFIG['assignment_mode']  # 'batch' or 'single'
+        self.assigner = BatchAssigner(self.db)
+        self.eta = EtaService(self.db)  # learns from deliveries, API processes only read
         self.running = False
         self.last_check = datetime.now()
+        self.last_archive = None
+        self.last_billing_check = None
+        self.billed_period = None  # period_end handled by run_billing()
+        self.task_events = None  # cursor on the event log, see process_tasks()
+        self.idle = False  # last scan found no pending tasks
     
     def start(self):
         """Start the workflow engine (runs in background)"""
@@ -26,7 +59,14 @@ class WorkflowEngine:
         
         try:
             while self.running:
+                started = time.perf_counter()
+                self.refresh_shards()
+                if self.owns_shared_duties:
+                    self.run_assignment()
                 self.process_tasks()
+                if self.owns_shared_duties:
+                    self.run_maintenance()
+                heartbeat(self.db, self.worker or 'engine', (time.perf_counter() - started) * 1000)
                 time.sleep(10)  # Check every 10 seconds
         except KeyboardInterrupt:
             self.stop()
@@ -36,33 +76,185 @@ class WorkflowEngine:
         self.running = False
         print("\n✋ Workflow Engine stopped")
     
+    def refresh_shards(self):
+        """Supervised worker: pick up the current shard assignment (one PK lookup)"""
+        if self.worker is None:
+            return
+        assigned = worker_shards(self.db, self.worker)
+        shards, shard_count = assigned if assigned else (None, 1)
+        if (shards, shard_count) != (self.shards, self.shard_count):
+            log.info('shards', worker=self.worker, shards=shards, shard_count=shard_count)
+            self.shards, self.shard_count = shards, shard_count
+            self.idle = False  # new shards may have pending tasks
+    
+    @property
+    def owns_shared_duties(self) -> bool:
+        """Batch assignment and maintenance run once: on the owner of shard 0"""
+        return self.shards is None or 0 in self.shards
+    
+    def pending_tasks(self) -> List[Dict]:
+        """Pending tasks of the owned shards"""
+        if self.shards is None:
+            return self.db.get_pending_tasks()
+        if not self.shards:
+            return []
+        return self.db.query("""
+            SELECT * FROM tasks
+            WHERE status = 'pending' AND COALESCE(related_order_id, id) % ? IN (SELECT value FROM json_each(?))
+            ORDER BY deadline
+        """, (self.shard_count, json.dumps(self.shards)))
+    
+    def claim(self, tasks: List[Dict]) -> List[Dict]:
+        """Set claimed_by/claimed_at, one guarded UPDATE per task; only tasks this worker got
+        
+        A worker on an outdated shard map (or a second engine) sees the same
+        pending rows; whoever claims first handles the task. Status is not
+        touched, so claims write no events (tasks_events_au).
+        """
+        if not tasks:
+            return []
+        with self.db.transaction() as conn:
+            claimed = {task['id'] for task in tasks if conn.execute("""
+                UPDATE tasks SET claimed_by = ?, claimed_at = CURRENT_TIMESTAMP
+                WHERE id = ? AND status = 'pending'
+                  AND (claimed_by IS NULL OR claimed_by = ? OR claimed_at < datetime('now', ?))
+            """, (self.claimant, task['id'], self.claimant,
+                  f"-{int(CLAIM_TIMEOUT.total_seconds())} seconds")).rowcount}
+        return [task for task in tasks if task['id'] in claimed]
+    
+    def release(self, tasks: List[Dict]):
+        """Drop our claim on tasks the handler left open (any worker may retry them)"""
+        if tasks:
+            self.db.execute("""
+                UPDATE tasks SET claimed_by = NULL, claimed_at = NULL
+                WHERE claimed_by = ? AND status = 'pending' AND id IN (SELECT value FROM json_each(?))
+            """, (self.claimant, json.dumps([task['id'] for task in tasks])))
+    
+    def _left_to_batch(self, task: Dict) -> bool:
+        """assign_driver in batch mode is closed by run_assignment() (pending rows only)"""
+        return task['task_type'] == 'assign_driver' and self.assignment_mode == 'batch'
+    
+    def run_maintenance(self):
+        """ETA learning, billing for closed periods; archive, prune sync log, compact events every ARCHIVE_INTERVAL"""
+        try:
+            self.eta.refresh()  # incremental, at most every REFRESH_INTERVAL
+        except Exception as e:
+            log.error('eta_refresh_failed', error=e)
+        self.run_billing()
+        if self.last_archive and datetime.now() - self.last_archive < ARCHIVE_INTERVAL:
+            return
+        self.last_archive = datetime.now()
+        
+        try:
+            stats = Archiver(self.db).run(max_batches=50)
+            log.info('archived', messages=stats['messages'], tasks=stats['tasks'], orders=stats['orders'],
+                     seconds=stats['seconds'])
+            DriverSync(self.db).prune()  # old sync tokens get a snapshot
+            log.info('events_compacted', events=EventLog(self.db).compact())
+        except Exception as e:
+            log.error('archiving_failed', error=e)
+    
+    def run_billing(self):
+        """Invoice the last closed period once (no completed billing_runs row yet)"""
+        start, end = previous_month()
+        if self.billed_period == end:
+            return
+        if self.last_billing_check and datetime.now() - self.last_billing_check < BILLING_CHECK_INTERVAL:
+            return
+        self.last_billing_check = datetime.now()
+        try:
+            done = self.db.query("SELECT 1 FROM billing_runs WHERE period_end = ? AND status = 'completed' LIMIT 1",
+                                 (end.isoformat(),))
+            if not done:
+                self._billing(start.isoformat(), end.isoformat())
+            self.billed_period = end
+        except Exception as e:
+            log.error('billing_run_failed', period_end=end, error=e)
+    
+    def _billing(self, period_start: str = None, period_end: str = None) -> Dict:
+        """Dry run first (logged), real run only if it succeeded and found orders"""
+        billing = BillingRun(self.db)
+        preview = billing.run(period_start, period_end, dry_run=True)
+        log.info('billing_dry_run', period_start=preview['period_start'], period_end=preview['period_end'],
+                 invoices=preview['invoices'], orders=preview['orders'],
+                 total_amount=f"{preview['total_amount']:.2f}")
+        if not preview['orders']:
+            return preview
+        stats = billing.run(preview['period_start'], preview['period_end'])
+        log.info('billing_run', run_id=stats.get('run_id'), invoices=stats['invoices'], orders=stats['orders'],
+                 seconds=stats['seconds'], orders_per_sec=stats['orders_per_sec'])
+        return stats
+    
+    def run_assignment(self):
+        """Batch mode: assign all pending orders to online drivers in one cycle"""
+        if self.assignment_mode != 'batch':
+            return
+        try:
+            stats = self.assigner.run()
+        except Exception as e:
+            log.error('batch_assignment_failed', error=e)
+            return
+        if stats['assigned']:
+            log.info('batch_assignment', assigned=stats['assigned'], orders=stats['orders'],
+                     drivers=stats['drivers'], method=stats['method'], seconds=stats['seconds'])
+    
     def process_tasks(self):
-        """Process all pending tasks"""
+        """Process all pending tasks (no table scan while tasks are unchanged)"""
+        if self.task_events is None:
+            name = f'workflow_engine:{self.worker}' if self.worker else 'workflow_engine'
+            self.task_events = EventLog(self.db).consumer(name, entities=['tasks'])
+        events = self.task_events.poll(limit=1000)
+        if not events and self.idle:
+            if self.task_events.scanned > self.task_events.position:
+                self.task_events.commit(self.task_events.scanned)  # skip order/invoice events
+            return
         
         # Get pending tasks grouped by agent
-        pending_tasks = self.db.get_pending_tasks()
+        pending_tasks = self.pending_tasks()
+        self.idle = not pending_tasks
+        if self.task_events.scanned > self.task_events.position:
+            self.task_events.commit(self.task_events.scanned)  # past skipped order/invoice events too
         
         if not pending_tasks:
             return
         
+        # Claim tasks that get closed before handling them; skip those another worker holds
+        claimed = self.claim([task for task in pending_tasks if task['task_type'] in CLOSED_BY_HANDLER])
+        claimed_ids = {task['id'] for task in claimed}
+        
         # Group by assigned_to
         tasks_by_agent = {}
         for task in pending_tasks:
+            if task['task_type'] in CLOSED_BY_HANDLER and task['id'] not in claimed_ids:
+                continue
             agent = task['assigned_to']
             if agent not in tasks_by_agent:
                 tasks_by_agent[agent] = []
             tasks_by_agent[agent].append(task)
         
         # Route to appropriate handler
-        for agent, tasks in tasks_by_agent.items():
-            if agent == 'secretary':
-                self._handle_secretary_tasks(tasks)
-            elif agent == 'accounting':
-                self._handle_accounting_tasks(tasks)
-            elif agent == 'scheduler':
-                self._handle_scheduler_tasks(tasks)
-            elif agent == 'comms':
-                self._handle_comms_tasks(tasks)
+        try:
+            for agent, tasks in tasks_by_agent.items():
+                if agent == 'secretary':
+                    self._handle_secretary_tasks(tasks)
+                elif agent == 'accounting':
+                    self._handle_accounting_tasks(tasks)
+                elif agent == 'scheduler':
+                    self._handle_scheduler_tasks(tasks)
+                elif agent == 'comms':
+                    self._handle_comms_tasks(tasks)
+        finally:
+            self.release(claimed)
+    
+    def _queue_for_task(self, task: Dict, **message) -> Optional[int]:
+        """Queue message + complete task in one transaction; no address: task cancelled, nothing queued"""
+        if not (message.get('to_address') or '').strip():
+            self.db.update('tasks', task['id'], {'status': 'cancelled',
+                                                 'notes': f"No {message['channel']} address for {message['to_type']}"})
+            log.warning('no_address', task_id=task['id'], to_type=message['to_type'], to_id=message['to_id'],
+                        channel=message['channel'])
+            return None
+        return self.db.queue_message(**message, complete_task_id=task['id'])
     
     # ============================================
     # SECRETARY TASKS
@@ -73,7 +265,7 @@ class WorkflowEngine:
         for task in tasks:
             task_type = task['task_type']
             
-            print(f"📋 SECRETARY: {task['title']} (priority: {task['priority']})")
+            log.debug('task', agent='secretary', task_id=task['id'], title=task['title'], priority=task['priority'])
             
             if task_type == 'send_email':
                 self._task_send_confirmation_email(task)
@@ -109,10 +301,18 @@ class WorkflowEngine:
         Logistics Team
         """
         
-        print(f"  📧 Email an {customer['email']}")
-        
-        # In real system, this would call email API
-        # self.send_email(customer['email'], "Bestellung bestätigt", email_content)
+        # Queue for the outbound dispatcher (logistik_dispatch.py)
+        if self._queue_for_task(
+            task,
+            order_id=order['id'],
+            to_type='customer',
+            to_id=customer['id'],
+            to_address=customer['email'],
+            message_text=email_content,
+            channel='email',
+            subject="Bestellung bestätigt"
+        ):
+            log.debug('email_queued', order_id=order['id'], to=customer['email'])
     
     def _task_send_thankyou_email(self, task: Dict):
         """Send thank you after delivery"""
@@ -122,12 +322,12 @@ class WorkflowEngine:
         if not order or not customer:
             return
         
-        print(f"  📧 Thank you email an {customer['email']}")
+        log.debug('thankyou_email', order_id=order['id'], to=customer['email'])
     
     def _task_prepare_contract(self, task: Dict):
         """Prepare customer contract"""
         customer = self.db.get_customer(task['related_customer_id'])
-        print(f"  📄 Contract prepared for {customer['name']}")
+        log.debug('contract_prepared', customer_id=customer['id'])
     
     # ============================================
     # ACCOUNTING TASKS
@@ -138,7 +338,7 @@ class WorkflowEngine:
         for task in tasks:
             task_type = task['task_type']
             
-            print(f"💰 ACCOUNTING: {task['title']}")
+            log.debug('task', agent='accounting', task_id=task['id'], title=task['title'], priority=task['priority'])
             
             if task_type == 'create_invoice':
                 self._task_create_invoice(task)
@@ -146,6 +346,8 @@ class WorkflowEngine:
                 self._task_send_payment_reminder(task)
             elif task_type == 'calculate_driver_wage':
                 self._task_calculate_driver_wage(task)
+            elif task_type == 'billing_run':
+                self._task_billing_run(task)
     
     def _task_create_invoice(self, task: Dict):
         """Create invoice for delivered order"""
@@ -162,16 +364,29 @@ class WorkflowEngine:
             due_days=30
         )
         
-        print(f"  💵 Invoice #{invoice_id} created for order #{order['id']}")
+        log.info('invoice_created', invoice_id=invoice_id, order_id=order['id'])
+    
+    def _task_billing_run(self, task: Dict):
+        """Consolidated invoicing for last period (one invoice per customer)"""
+        self._billing()
+        self.db.complete_task(task['id'])
     
     def _task_send_payment_reminder(self, task: Dict):
         """Send payment reminder for overdue invoice"""
-        print(f"  ⚠️ Payment reminder task: {task['title']}")
+        log.debug('payment_reminder', task_id=task['id'], title=task['title'])
     
     def _task_calculate_driver_wage(self, task: Dict):
-        """Calculate driver daily/weekly wage"""
-        driver = self.db.get_driver(task['related_driver_id'])
-        print(f"  💵 Wage calculated for {driver['name']}")
+        """Payroll for last week: all drivers in one pass (incremental re-runs)"""
+        payroll = PayrollRun(self.db)
+        stats = payroll.run()
+        self.db.complete_task(task['id'])
+        
+        log.info('payroll', period_start=stats['period_start'], period_end=stats['period_end'],
+                 drivers=stats['drivers'], net_total=f"{stats['net_total']:.2f}", seconds=stats['seconds'])
+        if task.get('related_driver_id'):
+            for row in payroll.get_payroll(stats['period_start'], stats['period_end'], task['related_driver_id']):
+                log.info('driver_payroll', driver_id=row['driver_id'], deliveries=row['deliveries'],
+                         gross=f"{row['gross']:.2f}", deductions=f"{row['deductions']:.2f}", net=f"{row['net']:.2f}")
     
     # ============================================
     # SCHEDULER TASKS
@@ -181,8 +396,10 @@ class WorkflowEngine:
         """Handle scheduler agent tasks"""
         for task in tasks:
             task_type = task['task_type']
+            if self._left_to_batch(task):
+                continue  # left to run_assignment() (order still waiting for a driver)
             
-            print(f"📅 SCHEDULER: {task['title']} (priority: {task['priority']})")
+            log.debug('task', agent='scheduler', task_id=task['id'], title=task['title'], priority=task['priority'])
             
             if task_type == 'assign_driver':
                 self._task_assign_driver(task)
@@ -202,14 +419,14 @@ class WorkflowEngine:
         drivers = self.db.get_active_drivers()
         
         if not drivers:
-            print(f"  ⚠️ No drivers available for order #{order['id']}")
+            log.warning('no_drivers', order_id=order['id'])
             return
         
         best_driver = drivers[0]  # In real system, calculate optimal
         
         self.db.assign_order(order['id'], best_driver['id'])
         
-        print(f"  🚗 Order #{order['id']} assigned to {best_driver['name']}")
+        log.debug('order_assigned', order_id=order['id'], driver_id=best_driver['id'])
         
         # Create notification task for COMMS
         self.db.create_task(
@@ -224,14 +441,14 @@ class WorkflowEngine:
     def _task_send_daily_reminder(self, task: Dict):
         """Send daily reminder to drivers"""
         drivers = self.db.get_active_drivers()
-        print(f"  📢 Daily reminder sent to {len(drivers)} drivers")
+        log.debug('daily_reminder', drivers=len(drivers))
     
     def _task_check_overdue(self, task: Dict):
         """Check for overdue orders and flag them"""
         overdue = self.db.get_overdue_orders()
         
         if overdue:
-            print(f"  ⚠️ {len(overdue)} overdue orders detected!")
+            log.warning('overdue_orders', count=len(overdue))
             
             # Create escalation task
             for order in overdue:
@@ -252,7 +469,7 @@ class WorkflowEngine:
         for task in tasks:
             task_type = task['task_type']
             
-            print(f"💬 COMMS: {task['title']}")
+            log.debug('task', agent='comms', task_id=task['id'], title=task['title'], priority=task['priority'])
             
             if task_type == 'notify_customer':
                 self._task_notify_customer(task)
@@ -271,8 +488,16 @@ class WorkflowEngine:
         
         message = f"Update für Bestellung #{order['order_number']}: Status = {order['status']}"
         
-        # In real system, send SMS/email
-        print(f"  📱 SMS/Email to {customer['phone']}: {message}")
+        if self._queue_for_task(
+            task,
+            order_id=order['id'],
+            to_type='customer',
+            to_id=customer['id'],
+            to_address=customer['phone'],
+            message_text=message,
+            channel='sms'
+        ):
+            log.debug('sms_queued', order_id=order['id'], to=customer['phone'])
     
     def _task_notify_driver(self, task: Dict):
         """Notify driver about new assignment"""
@@ -284,13 +509,21 @@ class WorkflowEngine:
         
         message = f"Neue Order: #{order['order_number']}, Pickup: {order['pickup_address']}"
         
-        # In real system, send SMS/WhatsApp
-        print(f"  💬 WhatsApp to {driver['name']} ({driver['phone']}): {message}")
+        if self._queue_for_task(
+            task,
+            order_id=order['id'],
+            to_type='driver',
+            to_id=driver['id'],
+            to_address=driver['phone'],
+            message_text=message,
+            channel='whatsapp'
+        ):
+            log.debug('whatsapp_queued', order_id=order['id'], driver_id=driver['id'])
     
     def _task_send_status_update(self, task: Dict):
         """Send status update to customer"""
         order = self.db.get_order(task['related_order_id'])
-        print(f"  ✅ Status update sent for order #{order['id']}")
+        log.debug('status_update', order_id=order['id'])
     
     # ============================================
     # DISPATCHER ESCALATIONS
@@ -298,9 +531,7 @@ class WorkflowEngine:
     
     def handle_dispatcher_escalation(self, task: Dict):
         """Handle critical escalations (complex decisions)"""
-        print(f"\n🔴 DISPATCHER ESCALATION: {task['title']}")
-        print(f"   Priority: {task['priority']}")
-        print(f"   Task: {task}")
+        log.warning('escalation', task_id=task['id'], title=task['title'], priority=task['priority'])
         
         # This is where human (or GPT-5.2) makes decision
         # In real system, would call OpenClaw with context
@@ -339,13 +570,23 @@ class WorkflowEngine:
 # ============================================
 
 if __name__ == "__main__":
-    engine = WorkflowEngine()
+    import argparse
+    from logistik_migrations import migrate
+    
+    parser = argparse.ArgumentParser(description='Workflow engine')
+    parser.add_argument('--worker', default=None,
+                        help='Supervised worker name, processes only its shards (see logistik_supervisor.py)')
+    args = parser.parse_args()
+    
+    engine = WorkflowEngine(worker=args.worker)
+    migrate(engine.db)
     
     # Print startup info
     print("=" * 50)
-    print("🚚 LOGISTICS WORKFLOW ENGINE")
+    print(f"🚚 LOGISTICS WORKFLOW ENGINE{f' ({args.worker})' if args.worker else ''}")
     print("=" * 50)
-    engine.print_summary()
+    if not args.worker:
+        engine.print_summary()
     print("\nStarting automation...\n")
     
     # Start processing